@@ -37,7 +37,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 genreButtons: document.querySelectorAll('.genre-btn'),
                 remixButton: document.getElementById('remixButton'),
                 remixWaveform: document.getElementById('remixWaveform'),
-                loadingOverlay: document.getElementById('loadingOverlay')
+                loadingOverlay: document.getElementById('loadingOverlay'),
+                loadingMessage: document.getElementById('loadingMessage')
             };
             
             this.initWaveSurfer();
@@ -161,8 +162,11 @@ document.addEventListener('DOMContentLoaded', () => {
                     })
                 });
                 
-                const data = await response.json();
-                this.currentAudioUrl = data.url;
+                const job = await response.json();
+                if (!response.ok) {
+                    throw new Error(job.detail || 'Failed to submit remix');
+                }
+                this.currentAudioUrl = await this.waitForJob(job.events_url);
                 
                 // Load and display waveform
                 await this.wavesurfer.load(this.currentAudioUrl);
@@ -173,8 +177,33 @@ document.addEventListener('DOMContentLoaded', () => {
                 alert('Failed to create remix. Please try again.');
             } finally {
                 this.elements.loadingOverlay.classList.remove('active');
+                this.elements.loadingMessage.textContent = 'Creating your track...';
             }
         }
+        
+        waitForJob(eventsUrl) {
+            // Follow the job's progress until it produces a result URL
+            return new Promise((resolve, reject) => {
+                const source = new EventSource(eventsUrl);
+                source.onmessage = (event) => {
+                    const job = JSON.parse(event.data);
+                    if (job.status === 'completed') {
+                        source.close();
+                        resolve(job.result);
+                    } else if (job.status === 'failed') {
+                        source.close();
+                        reject(new Error(job.error));
+                    } else {
+                        const counter = job.total ? ` ${job.current}/${job.total}` : '';
+                        this.elements.loadingMessage.textContent = `Creating your track: ${job.stage}${counter}`;
+                    }
+                };
+                source.onerror = () => {
+                    source.close();
+                    reject(new Error('Lost connection to remix job'));
+                };
+            });
+        }
     }
 
     // Create page functionality
@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from services.pcm_cache import pcm_cache
+
+ANALYSIS_SR = 11025
+N_FFT = 2048
+# About 86 onset frames per second, fine enough to resolve tempo to ~1 BPM near 120
+HOP_LENGTH = 128
+
+PITCH_CLASSES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# Krumhansl-Kessler key profiles, tonic first
+MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+# librosa >= 0.10 moved tempo estimation to librosa.feature
+_estimate_tempo = getattr(librosa.feature, "tempo", None) or librosa.beat.tempo
+
+
+def estimate_key(chroma: np.ndarray) -> Dict:
+    """Best matching major or minor key for a (12, frames) chromagram"""
+    profile = chroma.mean(axis=1)
+    best = (-2.0, 0, "major")
+    for mode, template in (("major", MAJOR_PROFILE), ("minor", MINOR_PROFILE)):
+        for tonic in range(12):
+            score = np.corrcoef(profile, np.roll(template, tonic))[0, 1]
+            if np.isfinite(score) and score > best[0]:
+                best = (float(score), tonic, mode)
+    return {"key": PITCH_CLASSES[best[1]], "mode": best[2], "key_confidence": best[0]}
+
+
+def analyze_signal(segments: List[np.ndarray], sr: int = ANALYSIS_SR) -> Dict:
+    """
+    Tempo and key of mono audio from one STFT per segment
+
+    The same magnitude spectrogram feeds the onset envelope (for the tempo)
+    and the chromagram (for the key).
+
+    Args:
+        segments: Mono signals at `sr`, e.g. excerpts of one track
+        sr: Sample rate of the segments
+
+    Returns:
+        tempo (BPM), key (pitch class), mode ("major" or "minor") and
+        key_confidence (profile correlation)
+    """
+    onsets, chromas = [], []
+    for y in segments:
+        if len(y) < N_FFT:
+            continue
+        S = np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH))
+        onsets.append(librosa.onset.onset_strength(S=librosa.amplitude_to_db(S, ref=np.max),
+                                                   sr=sr, hop_length=HOP_LENGTH))
+        chromas.append(librosa.feature.chroma_stft(S=S ** 2, sr=sr, n_fft=N_FFT,
+                                                   hop_length=HOP_LENGTH))
+    if not onsets:
+        raise ValueError("Audio is too short to analyze")
+
+    tempo = _estimate_tempo(onset_envelope=np.concatenate(onsets), sr=sr, hop_length=HOP_LENGTH)
+    return {"tempo": float(np.atleast_1d(tempo)[0]),
+            **estimate_key(np.concatenate(chromas, axis=1))}
+
+
+def excerpt_starts(duration: float, excerpts: int, excerpt_seconds: float) -> List[float]:
+    """Start times of `excerpts` evenly spaced excerpts, avoiding the very start and end"""
+    if excerpts * excerpt_seconds >= duration:
+        return [0.0]
+    step = duration / (excerpts + 1)
+    return [max(0.0, min(duration - excerpt_seconds, step * (i + 1) - excerpt_seconds / 2))
+            for i in range(excerpts)]
+
+
+class AudioAnalyzer:
+    def __init__(self, cache_dir: str, excerpts: Optional[int] = None,
+                 excerpt_seconds: float = 20.0):
+        """
+        Tempo and key analysis with results cached by content hash
+
+        Audio is downmixed and resampled to ANALYSIS_SR before one STFT pass
+        computes both estimates. With `excerpts`, only that many evenly
+        spaced excerpts of `excerpt_seconds` are decoded and analyzed, which
+        keeps the cost independent of the track length. Results are stored
+        as JSON files named after the SHA-256 of the audio and the analysis
+        settings, so copies of the same audio are analyzed once. Audio is
+        decoded directly rather than through the serving PCM cache, so
+        analyzing a whole dataset does not evict the sources of remixes.
+        The cache directory is created with the first stored result.
+
+        Args:
+            cache_dir: Directory holding the cached results
+            excerpts: Number of excerpts to analyze, or None for the whole track
+            excerpt_seconds: Length of each excerpt
+        """
+        self.cache_dir = Path(cache_dir)
+        self.excerpts = excerpts
+        self.excerpt_seconds = excerpt_seconds
+        self._memory: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def analyze(self, path: str) -> Dict:
+        """Tempo and key of an audio file, from the cache when possible"""
+        settings = f"{ANALYSIS_SR}_{HOP_LENGTH}_{self.excerpts or 'full'}_{self.excerpt_seconds:g}"
+        key = f"{pcm_cache.content_hash(path)}_{settings}"
+        with self._lock:
+            cached = self._memory.get(key)
+        if cached is not None:
+            return dict(cached)
+
+        entry = self.cache_dir / f"{key}.json"
+        result = None
+        if entry.exists():
+            try:
+                with open(entry) as f:
+                    result = json.load(f)
+            except ValueError:
+                result = None
+        if result is None:
+            result = analyze_signal(self._segments(path))
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            # Unique across the processes of analyze_directory
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=str(self.cache_dir))
+            with os.fdopen(fd, "w") as f:
+                json.dump(result, f)
+            os.replace(tmp_path, entry)
+
+        with self._lock:
+            self._memory[key] = result
+        return dict(result)
+
+    def tempo(self, path: str) -> float:
+        return self.analyze(path)["tempo"]
+
+    def key(self, path: str) -> str:
+        return self.analyze(path)["key"]
+
+    def _segments(self, path: str) -> List[np.ndarray]:
+        """Mono audio at ANALYSIS_SR, whole or as excerpts"""
+        try:
+            info = sf.info(path)
+        except RuntimeError:
+            info = None
+
+        if info is None or not self.excerpts:
+            y, _ = librosa.load(path, sr=ANALYSIS_SR)
+            if not self.excerpts:
+                return [np.asarray(y)]
+            starts = excerpt_starts(len(y) / ANALYSIS_SR, self.excerpts, self.excerpt_seconds)
+            length = int(self.excerpt_seconds * ANALYSIS_SR)
+            return [np.asarray(y[int(s * ANALYSIS_SR):int(s * ANALYSIS_SR) + length]) for s in starts]
+
+        # Seek to each excerpt and decode only it
+        segments = []
+        length = int(self.excerpt_seconds * info.samplerate)
+        with sf.SoundFile(path) as f:
+            for start in excerpt_starts(info.frames / info.samplerate, self.excerpts,
+                                        self.excerpt_seconds):
+                f.seek(int(start * info.samplerate))
+                y = f.read(length, dtype="float32", always_2d=True).mean(axis=1)
+                segments.append(librosa.resample(y, orig_sr=info.samplerate, target_sr=ANALYSIS_SR))
+        return segments
+
+
+audio_analyzer = AudioAnalyzer(
+    os.environ.get("ANALYSIS_CACHE_DIR", "cache/analysis"),
+    excerpts=int(os.environ["ANALYSIS_EXCERPTS"]) if os.environ.get("ANALYSIS_EXCERPTS") else None
+)
+
+
+def _analyze_file(path: str, cache_dir: str, excerpts: Optional[int], excerpt_seconds: float) -> Dict:
+    return AudioAnalyzer(cache_dir, excerpts, excerpt_seconds).analyze(path)
+
+
+def analyze_directory(input_dir: str, cache_dir: str, pattern: str = "**/*.wav",
+                      workers: Optional[int] = None, excerpts: Optional[int] = None,
+                      excerpt_seconds: float = 20.0) -> Dict[str, Dict]:
+    """
+    Analyze every matching file of a directory in a process pool
+
+    Returns:
+        Result per file path relative to `input_dir`; files that failed
+        map to {"error": message}
+    """
+    files = sorted(p for p in Path(input_dir).glob(pattern) if p.is_file())
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_analyze_file, str(path), cache_dir, excerpts, excerpt_seconds): path
+                   for path in files}
+        for done, future in enumerate(as_completed(futures), 1):
+            name = str(futures[future].relative_to(input_dir))
+            try:
+                results[name] = future.result()
+                print(f"[{done}/{len(files)}] {name}: {results[name]['tempo']:.1f} BPM, "
+                      f"{results[name]['key']} {results[name]['mode']}")
+            except Exception as e:
+                results[name] = {"error": str(e)}
+                print(f"Error analyzing {name}: {str(e)}")
+    return dict(sorted(results.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimate tempo and key of every track in a directory")
+    parser.add_argument("--input", type=str, required=True,
+                      help="Directory of audio files, e.g. a genre dataset")
+    parser.add_argument("--pattern", type=str, default="**/*.wav",
+                      help="Glob selecting the files to analyze")
+    parser.add_argument("--output", type=str, default=None,
+                      help="JSON file receiving the results (default: print only)")
+    parser.add_argument("--cache-dir", type=str,
+                      default=os.environ.get("ANALYSIS_CACHE_DIR", "cache/analysis"),
+                      help="Directory of cached results")
+    parser.add_argument("--workers", type=int, default=None,
+                      help="Analysis processes (default: one per CPU)")
+    parser.add_argument("--excerpts", type=int, default=None,
+                      help="Analyze only this many evenly spaced excerpts per track")
+    parser.add_argument("--excerpt-seconds", type=float, default=20.0,
+                      help="Length of each excerpt")
+
+    args = parser.parse_args()
+    results = analyze_directory(args.input, args.cache_dir, args.pattern, args.workers,
+                                args.excerpts, args.excerpt_seconds)
+    if args.output:
+        tmp_path = Path(args.output).with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(results, f, indent=1)
+        os.replace(tmp_path, args.output)
+        print(f"Saved {len(results)} results to {args.output}")
@@ -5,11 +5,45 @@ from pathlib import Path
 import os
 import tempfile
 import torch
-from models.music_model import MusicGenerationModel
+from collections import deque
+from typing import Callable, Dict, Iterator, Optional, Tuple, Union
+from services.model_registry import ModelRegistry
+from services.inference_scheduler import InferenceScheduler
+from services.executors import configure_torch_threads, run_stage
+from services.pcm_cache import pcm_cache
+from services.audio_analysis import audio_analyzer
+
+# Called as progress(stage, current, total); current/total are None for
+# stages without countable work
+ProgressCallback = Callable[[str, Optional[int], Optional[int]], None]
 
 class AudioProcessor:
-    def __init__(self):
-        self.models = {}
+    def __init__(self, window_size: int = 65536, window_overlap: int = 8192,
+                 max_batch_size: int = 8, max_batch_wait_ms: float = 5.0,
+                 max_resident_bytes: Optional[int] = None,
+                 precision: Union[str, Dict[str, str]] = "fp32",
+                 backend: str = "eager"):
+        """
+        Args:
+            window_size: Number of samples the model sees per forward pass
+                (matches the trainer's segment length)
+            window_overlap: Number of samples shared by consecutive windows
+                and crossfaded with overlap-add
+            max_batch_size: Maximum number of windows, across all requests,
+                stacked into one forward pass
+            max_batch_wait_ms: Maximum time a window waits for its batch to fill
+            max_resident_bytes: Cap on the weights kept in memory; least
+                recently used genres are unloaded beyond it
+            precision: Inference precision ("fp32", "int8" or "bf16") for
+                all genres, or a per-genre mapping
+            backend: Inference backend: "eager", "torchscript" or
+                "onnxruntime" (the latter two need export_model.py output)
+        """
+        if not 0 <= window_overlap < window_size:
+            raise ValueError("window_overlap must be in [0, window_size)")
+        if window_size % 8 != 0:
+            raise ValueError("window_size must be a multiple of 8")
+
         self.genre_to_idx = {
             "Rock": 0,
             "Electro": 1,
@@ -17,56 +51,76 @@ class AudioProcessor:
             "Hip-Hop": 3,
             "Lo-Fi": 4
         }
-        self._load_models()
+        self.window_size = window_size
+        self.window_overlap = window_overlap
+        self.max_batch_size = max_batch_size
+        configure_torch_threads()
 
-    def _load_models(self):
-        """Load pre-trained models for each genre"""
+        # Models are loaded on first use
         models_dir = Path(__file__).parent.parent / "models" / "trained"
-        
+        self.registry = ModelRegistry(str(models_dir), self.genre_to_idx.keys(),
+                                      max_resident_bytes=max_resident_bytes,
+                                      precision=precision,
+                                      backend=backend)
         for genre in self.genre_to_idx.keys():
-            model_path = models_dir / genre.lower() / "latest.pt"
-            if model_path.exists():
-                model = MusicGenerationModel()
-                model.load_state_dict(torch.load(str(model_path)))
-                model.eval()
-                self.models[genre] = model
-            else:
+            if not self.registry.available(genre):
                 print(f"Warning: No trained model found for {genre}")
 
+        self.scheduler = InferenceScheduler(
+            self.registry.get,
+            self.genre_to_idx,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_batch_wait_ms
+        )
+
+    def has_model(self, genre: str) -> bool:
+        """Whether a trained model exists for a genre"""
+        return self.registry.available(genre)
+
+    def model_checksum(self, genre: str) -> str:
+        """Return the checksum of the weights currently on disk for a genre"""
+        return self.registry.checksum(genre)
+
+    def model_precision(self, genre: str) -> str:
+        """Return the inference precision configured for a genre"""
+        return self.registry.precision_for(genre)
+
     @staticmethod
     def get_supported_genres():
         """Return list of supported genres"""
         return ["Rock", "Electro", "Jazz", "Hip-Hop", "Lo-Fi"]
 
-    async def generate_remix(self, audio_path: str, target_genre: str, output_dir: str) -> str:
+    async def generate_remix(self, audio_path: str, target_genre: str, output_dir: str,
+                             progress: Optional[ProgressCallback] = None,
+                             output_name: Optional[str] = None) -> str:
         """
         Generate a remix in the target genre using the trained model
+
+        Args:
+            audio_path: Source audio file
+            target_genre: Genre to remix into
+            output_dir: Directory to save the remix
+            progress: Optional callback receiving (stage, current, total)
+            output_name: File name within output_dir (default:
+                remix_<source stem>_<genre>.wav); concurrent renders of one
+                source must use distinct names
         """
         # Create output directory if it doesn't exist
         output_path = Path(output_dir)
         output_path.mkdir(exist_ok=True)
 
-        # Load and preprocess the input audio
-        y, sr = librosa.load(audio_path, sr=44100)
-        
-        # Convert to torch tensor
-        input_tensor = torch.FloatTensor(y).unsqueeze(0)  # Add channel dimension
-        
         # Get the appropriate model
-        if target_genre not in self.models:
+        if not self.has_model(target_genre):
             raise ValueError(f"No trained model available for genre {target_genre}")
-        
-        model = self.models[target_genre]
-        genre_idx = torch.tensor([self.genre_to_idx[target_genre]])
-        
-        # Generate remix
-        with torch.no_grad():
-            output_tensor = model.generate(input_tensor, genre_idx)
-            output_audio = output_tensor.squeeze().numpy()
-        
-        # Save the output
-        output_file = output_path / f"remix_{Path(audio_path).stem}_{target_genre}.wav"
-        sf.write(str(output_file), output_audio, sr)
+
+        # Load and preprocess the input audio
+        if progress:
+            progress("decoding", None, None)
+        y, sr = await self.load_audio(audio_path)
+
+        # Run windowed inference and save the output
+        output_file = output_path / (output_name or f"remix_{Path(audio_path).stem}_{target_genre}.wav")
+        await run_stage("inference", self._render, y, sr, target_genre, output_file, progress)
 
         return str(output_file)
 
@@ -79,20 +133,138 @@ class AudioProcessor:
         output_path.mkdir(exist_ok=True)
 
         # Load and preprocess the input audio
-        y, sr = librosa.load(audio_path, sr=44100)
-        
+        y, sr = await self.load_audio(audio_path)
+
         # For now, just use the Lo-Fi model as base
-        input_tensor = torch.FloatTensor(y).unsqueeze(0)
-        model = self.models["Lo-Fi"]
-        genre_idx = torch.tensor([self.genre_to_idx["Lo-Fi"]])
-        
-        # Generate base track
-        with torch.no_grad():
-            output_tensor = model.generate(input_tensor, genre_idx)
-            output_audio = output_tensor.squeeze().numpy()
-        
-        # Save the output
         output_file = output_path / f"creation_{Path(audio_path).stem}.wav"
-        sf.write(str(output_file), output_audio, sr)
+        await run_stage("inference", self._render, y, sr, "Lo-Fi", output_file)
 
         return str(output_file)
+
+    async def load_audio(self, audio_path: str) -> Tuple[np.ndarray, int]:
+        """Decode a source file to mono float32 at the model sample rate"""
+        return await run_stage("decode", pcm_cache.load, audio_path, 44100)
+
+    def _render(self, y: np.ndarray, sr: int, genre: str, output_file: Path,
+                progress: Optional[ProgressCallback] = None):
+        """Run windowed inference over a waveform and write it block by block"""
+        for _ in self.render_blocks(y, sr, genre, output_file, progress):
+            pass
+
+    def render_blocks(self, y: np.ndarray, sr: int, genre: str, output_file: Path,
+                      progress: Optional[ProgressCallback] = None) -> Iterator[np.ndarray]:
+        """
+        Write the remix to `output_file` and yield each block once it is written
+
+        Lets callers stream audio to a client while the complete file is
+        still produced. The file is only complete once the generator is
+        exhausted.
+        """
+        with sf.SoundFile(str(output_file), "w", samplerate=sr, channels=1) as f:
+            for block in self.iter_remix_blocks(y, genre, progress):
+                f.write(block)
+                yield block
+            if progress:
+                progress("encoding", None, None)
+
+    def iter_remix_blocks(self, y: np.ndarray, genre: str,
+                          progress: Optional[ProgressCallback] = None) -> Iterator[np.ndarray]:
+        """
+        Run the genre model over fixed-size windows and yield finished audio
+
+        The waveform is split into `window_size` windows that advance by
+        `window_size - window_overlap` samples. Each window goes through the
+        model on its own, so memory and latency per window are constant and
+        the total cost grows linearly with the track length. Windows are
+        handed to the shared inference scheduler, which batches them with
+        windows from other in-flight requests for the same genre. Overlapping
+        regions are crossfaded with weighted overlap-add. Blocks are yielded
+        as soon as no later window can contribute to them.
+
+        Args:
+            y: Mono waveform at the model sample rate
+            genre: Target genre
+            progress: Optional callback receiving ("inferring", done, total)
+                after every window
+
+        Yields:
+            Consecutive float32 blocks that together cover len(y) samples
+        """
+        window = self.window_size
+        overlap = self.window_overlap
+        hop = window - overlap
+        weights = self._crossfade_weights()
+        total = len(y)
+        num_windows = self._num_windows(total)
+
+        # Running sums for the samples the current window can still touch
+        acc = np.zeros(window, dtype=np.float32)
+        norm = np.zeros(window, dtype=np.float32)
+
+        for done, (start, output) in enumerate(self._infer_windows(y, genre), 1):
+            acc += output * weights
+            norm += weights
+            if progress:
+                progress("inferring", done, num_windows)
+
+            # Everything before the next window's start is final
+            remaining = total - start
+            if remaining <= window:
+                yield acc[:remaining] / norm[:remaining]
+                return
+
+            yield acc[:hop] / norm[:hop]
+            acc[:overlap] = acc[hop:]
+            norm[:overlap] = norm[hop:]
+            acc[overlap:] = 0.0
+            norm[overlap:] = 0.0
+
+    def _infer_windows(self, y: np.ndarray, genre: str) -> Iterator[Tuple[int, np.ndarray]]:
+        """Submit windows ahead to the scheduler and yield their outputs in order"""
+        window = self.window_size
+        hop = window - self.window_overlap
+        in_flight = deque()
+
+        for start in range(0, self._num_windows(len(y)) * hop, hop):
+            segment = y[start:start + window]
+            if len(segment) < window:
+                segment = np.pad(segment, (0, window - len(segment)))
+            segment = np.ascontiguousarray(segment, dtype=np.float32)
+            in_flight.append((start, self.scheduler.submit(genre, segment)))
+
+            # Keep up to one batch of this request's windows queued
+            if len(in_flight) >= self.max_batch_size:
+                start, future = in_flight.popleft()
+                yield start, future.result()
+
+        while in_flight:
+            start, future = in_flight.popleft()
+            yield start, future.result()
+
+    def _num_windows(self, length: int) -> int:
+        """Number of windows needed to cover `length` samples"""
+        # The last window is the first one that reaches the end of the input
+        hop = self.window_size - self.window_overlap
+        return 1 + max(0, -(-(length - self.window_size) // hop))
+
+    def _crossfade_weights(self) -> np.ndarray:
+        """Window weights that fade in and out over the overlap region"""
+        weights = np.ones(self.window_size, dtype=np.float32)
+        if self.window_overlap:
+            # Strictly positive ramp so the first and last samples still count
+            ramp = np.linspace(0.0, 1.0, self.window_overlap + 2, dtype=np.float32)[1:-1]
+            weights[:self.window_overlap] = ramp
+            weights[-self.window_overlap:] = ramp[::-1]
+        return weights
+
+    def get_tempo(self, audio_path: str) -> float:
+        """Tempo in BPM of an audio file (analysis is cached by content)"""
+        return audio_analyzer.tempo(audio_path)
+
+    def get_key(self, audio_path: str) -> str:
+        """Key of an audio file as a pitch class such as "C" or "F#" """
+        return audio_analyzer.key(audio_path)
+
+    def get_inference_stats(self):
+        """Return batch-size and queue-wait statistics of the inference scheduler"""
+        return self.scheduler.stats()
@@ -0,0 +1,127 @@
+import argparse
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing as mp
+from typing import Dict, List, Optional
+
+import torch
+
+from models.music_model import MusicGenerationModel
+
+# Attention strategies compared by default, as MusicGenerationModel arguments
+STRATEGIES = {
+    "full": {"attention": "full"},
+    "local": {"attention": "local", "window_size": 512},
+    "local+downsample": {"attention": "local", "window_size": 512, "downsample": 4},
+}
+
+
+def measure_forward(config: Dict, num_samples: int, batch_size: int = 1, repeats: int = 3,
+                    backward: bool = False) -> Dict:
+    """
+    Latency and peak memory of the model on one input length
+
+    Meant to run in a fresh process: on CPU the peak is the growth of the
+    process's peak resident set over the model's own footprint.
+    """
+    torch.manual_seed(0)
+    model = MusicGenerationModel(**config)
+    model.train(backward)
+    x = torch.randn(batch_size, 1, num_samples)
+    style_idx = torch.zeros(batch_size, dtype=torch.long)
+
+    def run():
+        if backward:
+            model.zero_grad(set_to_none=True)
+            model(x, style_idx).square().mean().backward()
+        else:
+            with torch.no_grad():
+                model(x, style_idx)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    run()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        run()
+    elapsed = time.perf_counter() - start
+    peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 1024
+    return {"ms": 1000.0 * elapsed / repeats, "peak_bytes": peak}
+
+
+def benchmark_attention(seconds: List[float], strategies: Dict[str, Dict] = None,
+                        sample_rate: int = 44100, batch_size: int = 1, repeats: int = 3,
+                        backward: bool = False) -> Dict[str, List[Optional[Dict]]]:
+    """
+    Compare attention strategies over growing input durations
+
+    Every measurement runs in its own process so peak memory is not
+    inherited from an earlier, larger run. A strategy that runs out of
+    memory is reported as None for that length and skipped for longer ones.
+
+    Returns:
+        Per strategy, one result (or None) per duration
+    """
+    strategies = strategies or STRATEGIES
+    ctx = mp.get_context("spawn")
+    results = {}
+    for name, config in strategies.items():
+        results[name] = []
+        failed = False
+        for duration in seconds:
+            # Whole encoder tokens, so every strategy sees the same length
+            num_samples = int(duration * sample_rate) // 8 * 8
+            result = None
+            if not failed:
+                try:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                        result = pool.submit(measure_forward, config, num_samples, batch_size,
+                                             repeats, backward).result()
+                except (BrokenProcessPool, RuntimeError, MemoryError) as e:
+                    print(f"Warning: {name} failed at {duration:g}s: {str(e) or type(e).__name__}")
+                    failed = True
+            results[name].append(result)
+            if result is not None:
+                print(f"{name:<18} {duration:>7.1f}s  {num_samples // 8:>8} tokens  "
+                      f"{result['ms']:>10.1f} ms  peak {result['peak_bytes'] / 2**20:>8.0f} MiB")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency and peak memory of attention strategies versus input length")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[1, 2, 4, 8, 16, 30],
+                      help="Input durations to measure")
+    parser.add_argument("--strategies", type=str, nargs="+", default=list(STRATEGIES),
+                      choices=list(STRATEGIES), help="Strategies to compare")
+    parser.add_argument("--window-size", type=int, default=512,
+                      help="Tokens per window for local attention")
+    parser.add_argument("--downsample", type=int, default=4,
+                      help="Token reduction of the downsampled strategy")
+    parser.add_argument("--batch-size", type=int, default=1,
+                      help="Inputs per forward pass")
+    parser.add_argument("--repeats", type=int, default=3,
+                      help="Timed passes per measurement")
+    parser.add_argument("--backward", action="store_true",
+                      help="Time a training step (forward and backward) instead of inference")
+
+    args = parser.parse_args()
+    strategies = {}
+    for name in args.strategies:
+        config = dict(STRATEGIES[name])
+        if config["attention"] == "local":
+            config["window_size"] = args.window_size
+        if "downsample" in config:
+            config["downsample"] = args.downsample
+        strategies[name] = config
+    results = benchmark_attention(args.seconds, strategies, batch_size=args.batch_size,
+                                  repeats=args.repeats, backward=args.backward)
+
+    print(f"\n{'seconds':>8}" + "".join(f"{name:>22}" for name in strategies))
+    for i, duration in enumerate(args.seconds):
+        row = f"{duration:>8g}"
+        for name in strategies:
+            result = results[name][i]
+            row += f"{'OOM':>22}" if result is None else \
+                f"{result['ms']:>10.0f} ms {result['peak_bytes'] / 2**20:>6.0f} MiB"
+        print(row)
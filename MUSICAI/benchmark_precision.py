@@ -0,0 +1,128 @@
+import argparse
+import multiprocessing as mp
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import librosa
+import numpy as np
+import torch
+import torch.nn as nn
+
+from services.audio_processor import AudioProcessor
+from services.model_registry import ModelRegistry
+from services.precision import PRECISIONS, compare_outputs, model_nbytes
+
+def _clip_batches(clips: List[np.ndarray], window_size: int, batch_size: int):
+    windows = []
+    for y in clips:
+        for start in range(0, len(y) - window_size + 1, window_size):
+            windows.append(y[start:start + window_size])
+    windows = np.stack(windows).astype(np.float32)
+    return [torch.from_numpy(windows[i:i + batch_size]).unsqueeze(1)
+            for i in range(0, len(windows), batch_size)]
+
+
+def _run(model: nn.Module, batches, style: int) -> np.ndarray:
+    outputs = []
+    with torch.no_grad():
+        for x in batches:
+            style_idx = torch.full((x.shape[0],), style, dtype=torch.long)
+            outputs.append(model(x, style_idx).reshape(x.shape[0], -1).numpy())
+    return np.concatenate(outputs)
+
+
+def measure_precision(models_dir: str, genre: str, precision: str, batches, style: int,
+                      repeats: int = 3) -> Dict:
+    """
+    Outputs, latency and memory of one precision
+
+    Meant to run in a fresh process: ru_maxrss is a process-wide high-water
+    mark, so a precision measured after another would report no growth.
+    """
+    registry = ModelRegistry(models_dir, [genre], precision=precision)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    model = registry.get(genre)
+
+    # Warm up once, then time
+    output = _run(model, batches[:1], style)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        output = _run(model, batches, style)
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "output": output,
+        "seconds": elapsed,
+        "weight_bytes": model_nbytes(model),
+        "peak_rss_growth_kb": rss_after - rss_before,
+    }
+
+
+def benchmark_precisions(models_dir: str, genre: str, clip_paths: List[str],
+                         precisions: List[str] = PRECISIONS, window_size: int = 65536,
+                         batch_size: int = 4, repeats: int = 3) -> Dict[str, Dict]:
+    """
+    Compare reduced-precision inference against fp32 on reference clips
+
+    Every precision is measured in its own process, so its peak memory
+    includes loading its model and is not masked by an earlier run.
+
+    Args:
+        models_dir: Directory with <genre>/latest.pt checkpoints
+        genre: Genre whose model to evaluate
+        clip_paths: Reference audio clips
+        precisions: Precisions to evaluate; fp32 is always the reference
+        window_size: Samples per model window
+        batch_size: Windows per forward pass
+        repeats: Timed passes over the clips per precision
+
+    Returns:
+        Per-precision SNR, MAE, latency per window and memory figures
+    """
+    genre_to_idx = {g: i for i, g in enumerate(AudioProcessor.get_supported_genres())}
+    clips = [librosa.load(path, sr=44100)[0] for path in clip_paths]
+    batches = _clip_batches(clips, window_size, batch_size)
+    num_windows = sum(x.shape[0] for x in batches)
+
+    ctx = mp.get_context("spawn")
+    results = {}
+    reference = None
+    for precision in ["fp32"] + [p for p in precisions if p != "fp32"]:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            measured = pool.submit(measure_precision, models_dir, genre, precision, batches,
+                                   genre_to_idx[genre], repeats).result()
+
+        output = measured.pop("output")
+        if reference is None:
+            reference = output
+        results[precision] = {
+            **compare_outputs(reference, output),
+            "ms_per_window": 1000.0 * measured.pop("seconds") / (repeats * num_windows),
+            **measured,
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare reduced-precision inference against fp32")
+    parser.add_argument("--models-dir", type=str, required=True,
+                      help="Directory containing <genre>/latest.pt checkpoints")
+    parser.add_argument("--genre", type=str, required=True,
+                      help="Genre model to evaluate")
+    parser.add_argument("--clips", type=str, nargs="+", required=True,
+                      help="Reference audio clips")
+    parser.add_argument("--precisions", type=str, nargs="+", default=list(PRECISIONS),
+                      choices=PRECISIONS, help="Precisions to compare")
+    parser.add_argument("--batch-size", type=int, default=4,
+                      help="Windows per forward pass")
+
+    args = parser.parse_args()
+    results = benchmark_precisions(args.models_dir, args.genre, args.clips,
+                                   args.precisions, batch_size=args.batch_size)
+
+    print(f"{'precision':<10}{'SNR (dB)':>10}{'MAE':>12}{'ms/window':>12}{'weights (MB)':>14}{'RSS growth (MB)':>17}")
+    for precision, r in results.items():
+        print(f"{precision:<10}{r['snr_db']:>10.1f}{r['mae']:>12.2e}{r['ms_per_window']:>12.1f}"
+              f"{r['weight_bytes'] / 2**20:>14.1f}{r['peak_rss_growth_kb'] / 1024:>17.1f}")
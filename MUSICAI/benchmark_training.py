@@ -0,0 +1,310 @@
+import argparse
+import copy
+import itertools
+import os
+import time
+from typing import Dict, List
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader
+from torch.utils.data.distributed import DistributedSampler
+
+from services.model_trainer import GenreModelTrainer, MusicDataset, dataloader_kwargs
+from services.train_distributed import init_process_group
+from services.training_orchestrator import available_cores, split_cores
+
+
+def _batches(dataloader: DataLoader, num_batches: int):
+    """Yield `num_batches` batches, starting new epochs as needed"""
+    produced = 0
+    while produced < num_batches:
+        for batch in dataloader:
+            yield batch
+            produced += 1
+            if produced == num_batches:
+                return
+
+
+def measure_loader(dataset, config: Dict, num_batches: int = 50) -> float:
+    """
+    Samples per second delivered by a DataLoader alone
+
+    Worker startup is included, and the data is read over more than one
+    epoch when it is small, so persistent workers are credited correctly.
+    """
+    dataloader = DataLoader(dataset, batch_size=config["batch_size"], shuffle=True,
+                            **dataloader_kwargs(config))
+    samples = 0
+    start = time.perf_counter()
+    for batch in _batches(dataloader, num_batches):
+        samples += batch.shape[0]
+    return samples / (time.perf_counter() - start)
+
+
+def measure_training(trainer: GenreModelTrainer, dataset, config: Dict,
+                     num_batches: int = 20) -> float:
+    """Samples per second of the full training step fed by a DataLoader"""
+    model = trainer._create_model().to(trainer.device)
+    optimizer = torch.optim.Adam(model.parameters())
+    dataloader = DataLoader(dataset, batch_size=config["batch_size"], shuffle=True,
+                            **dataloader_kwargs(config))
+
+    samples = 0
+    start = None
+    for batch in _batches(dataloader, num_batches + 1):
+        optimizer.zero_grad()
+        loss = trainer._training_step(model, batch.to(trainer.device, non_blocking=True))
+        loss.backward()
+        optimizer.step()
+        loss.item()
+        if start is None:
+            # The first step pays for allocator and kernel warm-up
+            start = time.perf_counter()
+            continue
+        samples += batch.shape[0]
+    return samples / (time.perf_counter() - start)
+
+
+def sweep_loader_configs(trainer: GenreModelTrainer, genre: str, workers: List[int],
+                         prefetch_factors: List[int], batch_sizes: List[int],
+                         num_batches: int = 50, full_step: bool = True) -> List[Dict]:
+    """
+    Measure every DataLoader configuration in the grid
+
+    Prefetching and persistent workers only apply with worker processes,
+    so they are not varied for num_workers=0.
+
+    Returns:
+        One result per configuration with its loader and full-step
+        throughput, fastest first
+    """
+    dataset = MusicDataset(str(trainer.datasets_dir / genre))
+    configs = []
+    for batch_size, num_workers in itertools.product(batch_sizes, workers):
+        if num_workers == 0:
+            configs.append({"batch_size": batch_size, "num_workers": 0,
+                            "prefetch_factor": 2, "persistent_workers": False})
+            continue
+        for prefetch_factor, persistent in itertools.product(prefetch_factors, [False, True]):
+            configs.append({"batch_size": batch_size, "num_workers": num_workers,
+                            "prefetch_factor": prefetch_factor, "persistent_workers": persistent})
+
+    results = []
+    for config in configs:
+        config["pin_memory"] = torch.cuda.is_available()
+        loader = measure_loader(dataset, config, num_batches)
+        step = measure_training(trainer, dataset, config, max(1, num_batches // 2)) if full_step else None
+        results.append({**config, "loader_samples_per_sec": loader, "step_samples_per_sec": step})
+        print(f"batch {config['batch_size']:>4}  workers {config['num_workers']:>3}  "
+              f"prefetch {config['prefetch_factor']:>2}  persistent {str(config['persistent_workers']):<5}  "
+              f"loader {loader:>9.1f}/s  step " + (f"{step:>9.1f}/s" if step is not None else "      n/a"))
+
+    key = "step_samples_per_sec" if full_step else "loader_samples_per_sec"
+    return sorted(results, key=lambda r: r[key], reverse=True)
+
+
+def check_training_parity(trainer: GenreModelTrainer, genre: str, num_steps: int = 20,
+                          batch_size: int = 8, bf16: bool = True, compile_model: bool = False,
+                          accumulation_steps: int = 1, rtol: float = 0.05,
+                          lr: float = 1e-4) -> Dict:
+    """
+    Compare the loss curve of the fast training path against eager fp32
+
+    Two copies of one freshly initialized model train on the same batches.
+    The fast path splits every batch into `accumulation_steps` micro-batches,
+    so both runs take the same optimizer steps over the same data. Dropout
+    is disabled in both runs so they compute the same function. The step
+    size defaults below Adam's 1e-3, where this model's loss spikes early on
+    and bf16 round-off is amplified into diverging curves.
+
+    Returns:
+        Per-step losses of both runs, their largest relative difference and
+        the steps/sec of each run (compilation included)
+
+    Raises:
+        AssertionError if a step's loss differs by more than `rtol`
+    """
+    dataset = MusicDataset(str(trainer.datasets_dir / genre))
+    order = torch.randperm(len(dataset), generator=torch.Generator().manual_seed(0))
+    batches = [
+        torch.stack([dataset[int(order[(step * batch_size + i) % len(dataset)])]
+                     for i in range(batch_size)])
+        for step in range(num_steps)
+    ]
+    micro_batches = [micro for batch in batches for micro in batch.chunk(accumulation_steps)]
+
+    torch.manual_seed(0)
+    model = trainer._create_model()
+    for module in model.modules():
+        if isinstance(module, torch.nn.Dropout):
+            module.p = 0.0
+        elif isinstance(module, torch.nn.MultiheadAttention):
+            module.dropout = 0.0
+    fast_model = copy.deepcopy(model).to(trainer.device)
+    model = model.to(trainer.device)
+    style_idx = trainer.style_index(genre)
+
+    start = time.perf_counter()
+    losses, _ = trainer.run_epoch(model, torch.optim.Adam(model.parameters(), lr=lr), batches, style_idx)
+    eager = torch.stack(losses).float().cpu()
+    eager_seconds = time.perf_counter() - start
+
+    step_fn = torch.compile(trainer._training_step) if compile_model else None
+    start = time.perf_counter()
+    losses, _ = trainer.run_epoch(fast_model, torch.optim.Adam(fast_model.parameters(), lr=lr),
+                                  micro_batches, style_idx, step_fn, bf16, accumulation_steps)
+    fast = torch.stack(losses).float().cpu().reshape(num_steps, -1).mean(dim=1)
+    fast_seconds = time.perf_counter() - start
+
+    rel_diff = float(((fast - eager).abs() / eager.abs().clamp_min(1e-12)).max())
+    result = {
+        "eager_losses": eager.tolist(),
+        "fast_losses": fast.tolist(),
+        "max_rel_diff": rel_diff,
+        "eager_steps_per_sec": num_steps / eager_seconds,
+        "fast_steps_per_sec": num_steps / fast_seconds,
+    }
+    if rel_diff > rtol:
+        raise AssertionError(f"Fast path loss differs from eager fp32 by {rel_diff:.3f} (> {rtol})")
+    return result
+
+
+def _scaling_worker(rank: int, world_size: int, master_port: int, core_slots: List[List[int]],
+                    base_dir: str, genre: str, batch_size: int, num_batches: int, results):
+    init_process_group(rank, world_size, master_port=master_port,
+                       cores=core_slots[rank % len(core_slots)])
+    try:
+        trainer = GenreModelTrainer(base_dir)
+        dataset = MusicDataset(str(trainer.datasets_dir / genre))
+        sampler = DistributedSampler(dataset, num_replicas=world_size, rank=rank, seed=0)
+        dataloader = DataLoader(dataset, batch_size=batch_size, sampler=sampler)
+        # Read up front, so only compute and gradient all-reduce are timed
+        batches = list(_batches(dataloader, num_batches + 1))
+
+        torch.manual_seed(0)
+        model = DistributedDataParallel(trainer._create_model())
+        optimizer = torch.optim.Adam(model.parameters(), lr=1e-4)
+        style_idx = trainer.style_index(genre)
+        trainer.run_epoch(model, optimizer, batches[:1], style_idx)
+
+        dist.barrier()
+        start = time.perf_counter()
+        trainer.run_epoch(model, optimizer, batches[1:], style_idx)
+        dist.barrier()
+        if rank == 0:
+            results.put(world_size * batch_size * num_batches / (time.perf_counter() - start))
+    finally:
+        dist.destroy_process_group()
+
+
+def measure_scaling(trainer: GenreModelTrainer, genre: str, world_sizes: List[int] = (1, 2, 4, 8),
+                    batch_size: int = 8, num_batches: int = 10,
+                    master_port: int = 29510) -> List[Dict]:
+    """
+    Data-parallel training throughput over gloo at several world sizes
+
+    Every rank runs on this machine with its own share of the cores and a
+    fixed per-rank batch size, so the ideal is samples/sec growing linearly
+    with the ranks until the cores run out. Batches are read before timing.
+
+    Returns:
+        Per world size its samples/sec and its efficiency relative to
+        linear scaling of the first world size
+    """
+    cores = available_cores()
+    ctx = mp.get_context("spawn")
+    results = []
+    for world_size in world_sizes:
+        if world_size > len(cores):
+            print(f"Warning: {world_size} ranks share {len(cores)} cores")
+        queue = ctx.SimpleQueue()
+        mp.spawn(_scaling_worker, nprocs=world_size, join=True,
+                 args=(world_size, master_port, split_cores(cores, world_size),
+                       str(trainer.base_dir), genre, batch_size, num_batches, queue))
+        samples_per_sec = queue.get()
+        base = results[0]["samples_per_sec"] / results[0]["world_size"] if results else samples_per_sec / world_size
+        results.append({"world_size": world_size, "samples_per_sec": samples_per_sec,
+                        "efficiency": samples_per_sec / (base * world_size)})
+        print(f"ranks {world_size:>3}  {samples_per_sec:>9.1f} samples/s  "
+              f"efficiency {results[-1]['efficiency']:.0%}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark and tune the training input pipeline")
+    parser.add_argument("--base-dir", type=str, required=True,
+                      help="Base directory containing datasets; the tuned loader_config.json is written here")
+    parser.add_argument("--genre", type=str, required=True,
+                      help="Genre dataset to read")
+    parser.add_argument("--workers", type=int, nargs="+",
+                      default=sorted({0, 2, 4, os.cpu_count() or 1}),
+                      help="num_workers values to try")
+    parser.add_argument("--prefetch-factors", type=int, nargs="+", default=[2, 4],
+                      help="prefetch_factor values to try")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 32, 64],
+                      help="Batch sizes to try")
+    parser.add_argument("--num-batches", type=int, default=50,
+                      help="Batches read per measurement")
+    parser.add_argument("--loader-only", action="store_true",
+                      help="Skip the full training step measurement")
+    parser.add_argument("--dry-run", action="store_true",
+                      help="Report results without writing loader_config.json")
+    parser.add_argument("--parity", action="store_true",
+                      help="Check the fast training path against eager fp32 instead of tuning the loader")
+    parser.add_argument("--bf16", action="store_true",
+                      help="Parity check: use bf16 autocast")
+    parser.add_argument("--compile", action="store_true",
+                      help="Parity check: compile the training step")
+    parser.add_argument("--accumulation-steps", type=int, default=1,
+                      help="Parity check: micro-batches per optimizer step")
+    parser.add_argument("--rtol", type=float, default=0.05,
+                      help="Parity check: maximum relative loss difference per step")
+    parser.add_argument("--lr", type=float, default=1e-4,
+                      help="Parity check: Adam learning rate")
+    parser.add_argument("--scaling", action="store_true",
+                      help="Measure data-parallel training throughput at several world sizes instead of tuning the loader")
+    parser.add_argument("--world-sizes", type=int, nargs="+", default=[1, 2, 4, 8],
+                      help="Scaling benchmark: numbers of ranks to try")
+    parser.add_argument("--batch-size", type=int, default=8,
+                      help="Scaling benchmark: batch size per rank")
+
+    args = parser.parse_args()
+    trainer = GenreModelTrainer(args.base_dir)
+
+    if args.scaling:
+        measure_scaling(trainer, args.genre, args.world_sizes, args.batch_size,
+                        args.num_batches)
+        raise SystemExit(0)
+    if args.parity:
+        try:
+            result = check_training_parity(trainer, args.genre, bf16=args.bf16,
+                                           compile_model=args.compile,
+                                           accumulation_steps=args.accumulation_steps,
+                                           rtol=args.rtol, lr=args.lr)
+        except AssertionError as e:
+            print(f"Parity check failed: {str(e)}")
+            raise SystemExit(1)
+        for step, (eager, fast) in enumerate(zip(result["eager_losses"], result["fast_losses"])):
+            print(f"step {step + 1:>3}  eager {eager:.6f}  fast {fast:.6f}")
+        print(f"Max relative difference {result['max_rel_diff']:.4f}; "
+              f"eager {result['eager_steps_per_sec']:.2f} steps/s, "
+              f"fast {result['fast_steps_per_sec']:.2f} steps/s")
+        raise SystemExit(0)
+    results = sweep_loader_configs(trainer, args.genre, args.workers, args.prefetch_factors,
+                                   args.batch_sizes, args.num_batches, not args.loader_only)
+
+    best = results[0]
+    if best["step_samples_per_sec"] is not None:
+        bottleneck = "loader" if best["loader_samples_per_sec"] < 1.2 * best["step_samples_per_sec"] else "model"
+        print(f"\nBottleneck: {bottleneck} (loader {best['loader_samples_per_sec']:.1f}/s, "
+              f"training step {best['step_samples_per_sec']:.1f}/s)")
+
+    config = {k: best[k] for k in ("batch_size", "num_workers", "prefetch_factor",
+                                   "persistent_workers", "pin_memory")}
+    print(f"Best configuration: {config}")
+    if not args.dry_run:
+        trainer.save_loader_config(config)
+        print(f"Saved {trainer.base_dir / 'loader_config.json'}")
@@ -0,0 +1,198 @@
+import math
+import os
+import queue
+import random
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import torch
+from torch.utils.data.distributed import DistributedSampler
+
+_CHECKPOINT_NAME = re.compile(r"checkpoint_epoch_(\d+)(?:_batch_(\d+))?\.pt$")
+
+
+def checkpoint_name(epoch: int, batch: Optional[int] = None) -> str:
+    """File name of the checkpoint after `epoch` epochs, or `batch` batches into it"""
+    if batch is None:
+        return f"checkpoint_epoch_{epoch}.pt"
+    return f"checkpoint_epoch_{epoch}_batch_{batch}.pt"
+
+
+def checkpoint_order(path: Path) -> Tuple[int, float]:
+    """Sort key placing a finished epoch after all its mid-epoch checkpoints"""
+    match = _CHECKPOINT_NAME.search(Path(path).name)
+    if match is None:
+        return (-1, -1)
+    epoch, batch = match.groups()
+    return (int(epoch), math.inf if batch is None else int(batch))
+
+
+def list_checkpoints(directory: Path):
+    """Checkpoints in a directory, oldest first"""
+    paths = [p for p in Path(directory).glob("checkpoint_epoch_*.pt") if _CHECKPOINT_NAME.search(p.name)]
+    return sorted(paths, key=checkpoint_order)
+
+
+def latest_checkpoint(directory: Path) -> Optional[Path]:
+    checkpoints = list_checkpoints(directory)
+    return checkpoints[-1] if checkpoints else None
+
+
+def promote_checkpoint(checkpoint_path: Path, target: Path):
+    """
+    Atomically publish a checkpoint's weights as a serving model file
+
+    Only the epoch, model weights and model config are kept, so the file
+    loads with weights_only=True and stays memory-mappable for the model
+    registry, which rebuilds the architecture from the config.
+    """
+    checkpoint = torch.load(str(checkpoint_path), map_location="cpu", weights_only=False)
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_suffix(".tmp")
+    torch.save({
+        "epoch": checkpoint["epoch"],
+        "model_state_dict": checkpoint["model_state_dict"],
+        "model_config": checkpoint.get("model_config") or {},
+    }, str(tmp_path))
+    os.replace(tmp_path, target)
+
+
+def snapshot(state: Any) -> Any:
+    """
+    Copy every tensor in a nested state to CPU memory
+
+    The copy is what gets written, so training can keep updating the live
+    tensors while a checkpoint is saved in the background.
+    """
+    if isinstance(state, torch.Tensor):
+        return state.detach().to("cpu", copy=True)
+    if isinstance(state, dict):
+        return {key: snapshot(value) for key, value in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(snapshot(value) for value in state)
+    return state
+
+
+def rng_state() -> Dict:
+    state = {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state: Dict):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+class CheckpointWriter:
+    def __init__(self, directory: str, keep: int = 3):
+        """
+        Write checkpoints atomically on a background thread
+
+        `save` snapshots the state to CPU and returns; the write goes to a
+        temporary file that replaces the target only once complete. At most
+        one checkpoint waits behind the one being written, so a slow disk
+        throttles training instead of piling up snapshots in memory. After
+        each write only the newest `keep` checkpoints are kept.
+
+        Args:
+            directory: Directory receiving checkpoint_epoch_*.pt files
+            keep: Checkpoints retained, or 0 to keep all
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.keep = keep
+        self._queue: "queue.Queue" = queue.Queue(maxsize=1)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, daemon=True, name="checkpoint-writer")
+        self._thread.start()
+
+    def save(self, state: Dict, epoch: int, batch: Optional[int] = None):
+        """Queue a snapshot of `state` for writing; raises an earlier write's error"""
+        self._raise_error()
+        self._queue.put((snapshot(state), self.directory / checkpoint_name(epoch, batch)))
+
+    def flush(self):
+        """Block until every queued checkpoint is on disk"""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                state, path = item
+                tmp_path = path.with_suffix(".tmp")
+                torch.save(state, str(tmp_path))
+                os.replace(tmp_path, path)
+                self._prune()
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _prune(self):
+        if self.keep <= 0:
+            return
+        for stale in list_checkpoints(self.directory)[:-self.keep]:
+            try:
+                stale.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise Exception(f"Checkpoint write failed: {str(error)}")
+
+
+class ResumableSampler(DistributedSampler):
+    def __init__(self, dataset, shuffle: bool = True, seed: int = 0,
+                 num_replicas: int = 1, rank: int = 0):
+        """
+        Epoch-seeded sampler that can resume partway through an epoch
+
+        The order of an epoch depends only on the seed and the epoch, so a
+        resumed run sees the same remaining samples as the interrupted one.
+
+        Args:
+            dataset: Dataset to sample
+            shuffle: Shuffle every epoch
+            seed: Base seed of the shuffle
+            num_replicas: Processes sharing the dataset
+            rank: This process's share
+        """
+        super().__init__(dataset, num_replicas=num_replicas, rank=rank,
+                         shuffle=shuffle, seed=seed)
+        self.start_index = 0
+
+    def set_start(self, index: int):
+        """Skip the first `index` samples of the current epoch, once"""
+        self.start_index = index
+
+    def __iter__(self) -> Iterator[int]:
+        indices = list(super().__iter__())[self.start_index:]
+        self.start_index = 0
+        return iter(indices)
+
+    def __len__(self) -> int:
+        return self.num_samples - self.start_index
@@ -1,32 +1,267 @@
 import asyncio
 import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
 from pathlib import Path
+from typing import Dict, List, Optional
+from services.executors import STAGE_LIMITS, io_executor
 from services.youtube import YouTubeService
 
-async def collect_all_genres(base_dir: str, songs_per_genre: int = 1000):
-    """Collect datasets for all supported genres"""
-    youtube_service = YouTubeService()
-    base_path = Path(base_dir)
-    
-    # Create base directory
-    base_path.mkdir(parents=True, exist_ok=True)
-    
-    # Collect each genre
-    genres = ["rock", "electro", "jazz", "hiphop", "lofi"]
-    for genre in genres:
-        print(f"\nCollecting dataset for {genre}...")
-        genre_dir = base_path / genre
-        
+# Seconds manifest changes may wait before they are written, batching the
+# rewrites of concurrent downloads into one
+MANIFEST_SAVE_DELAY = float(os.environ.get("MANIFEST_SAVE_DELAY", 2.0))
+
+GENRES = ["rock", "electro", "jazz", "hiphop", "lofi"]
+
+# Search queries used to find candidate videos, in order
+GENRE_QUERIES = {
+    "rock": ["rock music", "rock songs", "classic rock", "alternative rock", "indie rock", "hard rock"],
+    "electro": ["electro music", "electronic music", "electro house", "synthwave", "techno", "edm songs"],
+    "jazz": ["jazz music", "jazz standards", "smooth jazz", "bebop jazz", "jazz piano", "jazz fusion"],
+    "hiphop": ["hip hop music", "rap songs", "hip hop beats", "boom bap", "old school hip hop", "trap music"],
+    "lofi": ["lofi hip hop", "lofi beats", "chillhop", "lofi study music", "jazzy lofi", "lofi chill"],
+}
+
+
+class DownloadManifest:
+    def __init__(self, path: str):
+        """
+        On-disk record of every candidate video and its download state
+
+        Each item is keyed by video id and holds its genre, status
+        ("pending", "done" or "failed"), file path, size in bytes, SHA-256
+        checksum, attempt count and last error. Changes are written on a
+        timer thread at most MANIFEST_SAVE_DELAY seconds after they happen,
+        so the event loop never waits for the file. Writes are atomic, so a
+        crash never leaves it truncated and loses at most the last few
+        seconds of progress, which the next run redoes.
+
+        Args:
+            path: JSON file holding the manifest
+        """
+        self.path = Path(path)
+        self.items: Dict[str, Dict] = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                self.items = json.load(f).get("items", {})
+        self._lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+
+    def add(self, video_id: str, genre: str, title: str = "") -> bool:
+        """Register a candidate; returns False if it is already known"""
+        with self._lock:
+            if video_id in self.items:
+                return False
+            self.items[video_id] = {
+                "genre": genre,
+                "title": title,
+                "status": "pending",
+                "path": None,
+                "bytes": 0,
+                "checksum": None,
+                "attempts": 0,
+                "error": None,
+            }
+            self._schedule_save()
+        return True
+
+    def update(self, video_id: str, **fields):
+        with self._lock:
+            self.items[video_id].update(fields)
+            self._schedule_save()
+
+    def count(self, genre: str, status: str) -> int:
+        return sum(1 for item in self.items.values()
+                   if item["genre"] == genre and item["status"] == status)
+
+    def retryable(self, genre: str, max_attempts: int) -> List[str]:
+        """Pending items and failed items that still have attempts left"""
+        return [
+            video_id for video_id, item in self.items.items()
+            if item["genre"] == genre and item["status"] != "done"
+            and item["attempts"] < max_attempts
+        ]
+
+    def verify(self):
+        """Reset completed items whose file disappeared or changed size"""
+        with self._lock:
+            for item in self.items.values():
+                if item["status"] != "done":
+                    continue
+                path = item["path"]
+                if not path or not os.path.exists(path) or os.path.getsize(path) != item["bytes"]:
+                    item.update(status="pending", attempts=0, error="file missing")
+
+    def save(self):
+        """Write the manifest now, including changes still waiting for the timer"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            self._write()
+
+    def _schedule_save(self):
+        """Save after MANIFEST_SAVE_DELAY, once for all changes until then"""
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(MANIFEST_SAVE_DELAY, self._flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _flush(self):
+        with self._lock:
+            self._save_timer = None
+            self._write()
+
+    def _write(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"items": self.items}, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DatasetCollector:
+    def __init__(self, base_dir: str, songs_per_genre: int = 1000,
+                 per_genre_downloads: int = 4, max_attempts: int = 5,
+                 backoff_seconds: float = 5.0, manifest_path: Optional[str] = None):
+        """
+        Download a dataset for every genre concurrently
+
+        All genres collect at once. Downloads share the global "download"
+        stage limit (DOWNLOAD_CONCURRENCY) and each genre additionally holds
+        at most `per_genre_downloads` in flight, so one genre cannot starve
+        the others. A failed download is retried with exponential backoff
+        up to `max_attempts` times, after which a new candidate replaces it.
+
+        Args:
+            base_dir: Directory receiving one subdirectory per genre
+            songs_per_genre: Number of songs to collect per genre
+            per_genre_downloads: Concurrent downloads per genre
+            max_attempts: Download attempts per video, across restarts
+            backoff_seconds: Delay before the first retry, doubled each time
+            manifest_path: Manifest file, defaults to <base_dir>/manifest.json
+        """
+        self.base_path = Path(base_dir)
+        self.songs_per_genre = songs_per_genre
+        self.per_genre_downloads = per_genre_downloads
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.manifest = DownloadManifest(manifest_path or self.base_path / "manifest.json")
+        self.youtube_service = YouTubeService()
+
+    async def collect_all(self, genres: List[str] = GENRES) -> Dict[str, int]:
+        """
+        Collect all genres, skipping videos the manifest records as done
+
+        Returns:
+            Number of downloaded songs per genre
+        """
+        self.base_path.mkdir(parents=True, exist_ok=True)
+        self.manifest.verify()
+        self.manifest.save()
+
         try:
-            downloaded_files = await youtube_service.collect_genre_dataset(
-                genre=genre,
-                output_dir=str(genre_dir),
-                target_count=songs_per_genre
+            results = await asyncio.gather(
+                *(self.collect_genre(genre) for genre in genres), return_exceptions=True
             )
-            print(f"Successfully downloaded {len(downloaded_files)} {genre} songs")
-            
-        except Exception as e:
-            print(f"Error collecting {genre} dataset: {str(e)}")
+        finally:
+            # Write whatever the timer has not saved yet
+            self.manifest.save()
+        counts = {}
+        for genre, result in zip(genres, results):
+            if isinstance(result, Exception):
+                print(f"Error collecting {genre} dataset: {str(result)}")
+            counts[genre] = self.manifest.count(genre, "done")
+        return counts
+
+    async def collect_genre(self, genre: str) -> int:
+        """Download songs for one genre until the target count is reached"""
+        genre_dir = self.base_path / genre
+        genre_dir.mkdir(parents=True, exist_ok=True)
+        semaphore = asyncio.Semaphore(self.per_genre_downloads)
+        queries = list(GENRE_QUERIES.get(genre, [f"{genre} music"]))
+
+        done = self.manifest.count(genre, "done")
+        if done:
+            print(f"{genre}: {done} songs already downloaded")
+
+        while done < self.songs_per_genre:
+            needed = self.songs_per_genre - done
+            candidates = self.manifest.retryable(genre, self.max_attempts)
+            if len(candidates) < needed and queries:
+                await self._find_candidates(genre, queries.pop(0))
+                continue
+            if not candidates:
+                print(f"Warning: Ran out of {genre} candidates at {done} songs")
+                break
+
+            await asyncio.gather(*(
+                self._download(genre_dir, video_id, semaphore)
+                for video_id in candidates[:needed]
+            ))
+            done = self.manifest.count(genre, "done")
+
+        print(f"Successfully downloaded {done} {genre} songs")
+        return done
+
+    async def _find_candidates(self, genre: str, query: str):
+        results = await self.youtube_service.search_videos(query, self.songs_per_genre)
+        added = sum(self.manifest.add(video["id"], genre, video["title"]) for video in results)
+        print(f"{genre}: {added} new candidates from '{query}'")
+
+    async def _download(self, genre_dir: Path, video_id: str, semaphore: asyncio.Semaphore):
+        item = self.manifest.items[video_id]
+        while item["attempts"] < self.max_attempts:
+            try:
+                async with semaphore:
+                    path = await self.youtube_service.download_audio(video_id, str(genre_dir / video_id))
+                    loop = asyncio.get_running_loop()
+                    checksum = await loop.run_in_executor(io_executor, file_sha256, path)
+                self.manifest.update(
+                    video_id, status="done", path=path, bytes=os.path.getsize(path),
+                    checksum=checksum, attempts=item["attempts"] + 1, error=None
+                )
+                return
+            except Exception as e:
+                self.manifest.update(
+                    video_id, status="failed", attempts=item["attempts"] + 1, error=str(e)
+                )
+                if item["attempts"] < self.max_attempts:
+                    # Exponential backoff with jitter, outside the genre slot
+                    delay = self.backoff_seconds * 2 ** (item["attempts"] - 1)
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+        print(f"Warning: Giving up on {video_id} after {item['attempts']} attempts: {item['error']}")
+
+
+async def collect_all_genres(base_dir: str, songs_per_genre: int = 1000,
+                             per_genre_downloads: int = 4, max_attempts: int = 5):
+    """Collect datasets for all supported genres"""
+    collector = DatasetCollector(
+        base_dir, songs_per_genre,
+        per_genre_downloads=per_genre_downloads,
+        max_attempts=max_attempts
+    )
+    start = time.time()
+    counts = await collector.collect_all()
+    total_bytes = sum(item["bytes"] for item in collector.manifest.items.values()
+                      if item["status"] == "done")
+    elapsed = time.time() - start
+    print(f"\nCollected {sum(counts.values())} songs ({total_bytes / 1024 ** 2:.1f} MiB) "
+          f"in {elapsed:.0f}s")
+    return counts
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Collect music datasets from YouTube")
@@ -34,8 +269,21 @@ if __name__ == "__main__":
                       help="Base directory for downloading datasets")
     parser.add_argument("--songs-per-genre", type=int, default=1000,
                       help="Number of songs to collect per genre")
-    
+    parser.add_argument("--max-downloads", type=int, default=16,
+                      help="Concurrent downloads across all genres (raise IO_WORKERS beyond 16)")
+    parser.add_argument("--per-genre-downloads", type=int, default=6,
+                      help="Concurrent downloads per genre")
+    parser.add_argument("--max-attempts", type=int, default=5,
+                      help="Download attempts per video before it is replaced")
+
     args = parser.parse_args()
-    
-    # Run the async collection
-    asyncio.run(collect_all_genres(args.base_dir, args.songs_per_genre))
+
+    # The global limit is the shared download stage limit
+    STAGE_LIMITS["download"] = args.max_downloads
+
+    # Run the async collection; rerunning resumes from <base-dir>/manifest.json
+    asyncio.run(collect_all_genres(
+        args.base_dir, args.songs_per_genre,
+        per_genre_downloads=args.per_genre_downloads,
+        max_attempts=args.max_attempts
+    ))
@@ -1,6 +1,13 @@
 import os
 import argparse
+import hashlib
+import json
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Dict, List, Optional
 import requests
 import zipfile
 import tqdm
@@ -14,68 +21,284 @@ DATASET_URLS = {
     "lofi": "https://example.com/lofi_dataset.zip"
 }
 
-def download_file(url: str, target_path: Path, chunk_size: int = 8192):
-    """Download a file with progress bar"""
-    response = requests.get(url, stream=True)
-    total_size = int(response.headers.get('content-length', 0))
-    
-    with open(target_path, 'wb') as f, tqdm.tqdm(
+# Expected SHA-256 of each dataset zip, None to skip verification
+DATASET_CHECKSUMS: Dict[str, Optional[str]] = {genre: None for genre in DATASET_URLS}
+
+SEGMENT_SIZE = 8 * 1024 * 1024
+SEGMENT_RETRIES = 3
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _probe(session: requests.Session, url: str):
+    """Return (size, supports ranges, validator) for a URL"""
+    response = session.head(url, allow_redirects=True, timeout=30)
+    response.raise_for_status()
+    size = int(response.headers.get('content-length', 0))
+    ranged = response.headers.get('accept-ranges', '').lower() == 'bytes'
+    validator = response.headers.get('etag') or response.headers.get('last-modified')
+    return size, ranged, validator
+
+def _load_state(state_path: Path, url: str, size: int, validator: Optional[str]) -> Optional[Dict]:
+    """Resume state of a partial download, if it still matches the remote file"""
+    if not state_path.exists():
+        return None
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except ValueError:
+        return None
+    if (state.get('url'), state.get('size'), state.get('validator')) != (url, size, validator):
+        return None
+    return state
+
+def _save_state(state_path: Path, state: Dict):
+    tmp_path = state_path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+        # A recorded segment must survive a crash together with its data
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, state_path)
+
+def _download_stream(session: requests.Session, url: str, part_path: Path,
+                     pbar: tqdm.tqdm, chunk_size: int):
+    """Single-connection download for servers without range support"""
+    with session.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        with open(part_path, 'wb') as f:
+            for data in response.iter_content(chunk_size=chunk_size):
+                pbar.update(f.write(data))
+
+def _download_ranged(session: requests.Session, url: str, part_path: Path, state_path: Path,
+                     state: Dict, pbar: tqdm.tqdm, connections: int, chunk_size: int):
+    """Fetch the missing segments of `part_path` over parallel Range requests"""
+    size = state['size']
+    segment_size = state['segment_size']
+    num_segments = (size + segment_size - 1) // segment_size
+    lock = threading.Lock()
+
+    if not part_path.exists() or part_path.stat().st_size != size:
+        # The recorded segments are lost with the part file; start over
+        if state['done']:
+            print(f"Warning: {part_path} is missing or incomplete, downloading it again")
+            state['done'] = []
+            _save_state(state_path, state)
+        # Preallocate so every segment can be written at its offset
+        with open(part_path, 'wb') as f:
+            f.truncate(size)
+    done = set(state['done'])
+
+    pbar.update(sum(min(segment_size, size - i * segment_size) for i in done))
+
+    def fetch(index: int):
+        start = index * segment_size
+        end = min(start + segment_size, size) - 1
+        for attempt in range(SEGMENT_RETRIES):
+            written = 0
+            try:
+                headers = {'Range': f'bytes={start}-{end}'}
+                with session.get(url, headers=headers, stream=True, timeout=60) as response:
+                    if response.status_code != 206:
+                        raise Exception(f"Server ignored range request (HTTP {response.status_code})")
+                    with open(part_path, 'r+b') as f:
+                        f.seek(start)
+                        for data in response.iter_content(chunk_size=chunk_size):
+                            f.write(data)
+                            written += len(data)
+                            pbar.update(len(data))
+                        f.flush()
+                        os.fsync(f.fileno())
+                if written != end - start + 1:
+                    raise Exception(f"Segment {index} truncated at {written} bytes")
+                with lock:
+                    state['done'].append(index)
+                    _save_state(state_path, state)
+                return
+            except Exception:
+                # Discount the partial segment; it is fetched again from its start
+                pbar.update(-written)
+                if attempt == SEGMENT_RETRIES - 1:
+                    raise
+                time.sleep(2 ** attempt)
+
+    pending = [i for i in range(num_segments) if i not in done]
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        for future in as_completed([pool.submit(fetch, i) for i in pending]):
+            future.result()
+
+def download_file(url: str, target_path: Path, chunk_size: int = 65536, connections: int = 4,
+                  expected_sha256: Optional[str] = None,
+                  session: Optional[requests.Session] = None):
+    """
+    Download a file with progress bar
+
+    Servers that accept byte ranges are downloaded in SEGMENT_SIZE segments
+    over `connections` parallel requests into `<target>.part`. Completed
+    segments are recorded in `<target>.part.json`, so an interrupted download
+    resumes where it stopped as long as the remote file is unchanged. The
+    file is only moved to `target_path` once it is complete and, when
+    `expected_sha256` is given, verified.
+
+    Args:
+        url: File to download
+        target_path: Destination path
+        chunk_size: Bytes read per iteration of a response
+        connections: Parallel range requests
+        expected_sha256: Checksum to verify, or None
+        session: Requests session to reuse, e.g. one with custom adapters
+    """
+    session = session or requests.Session()
+    part_path = target_path.with_name(target_path.name + '.part')
+    state_path = target_path.with_name(target_path.name + '.part.json')
+
+    size, ranged, validator = _probe(session, url)
+    with tqdm.tqdm(
         desc=target_path.name,
-        total=total_size,
+        total=size,
         unit='iB',
         unit_scale=True,
         unit_divisor=1024,
     ) as pbar:
-        for data in response.iter_content(chunk_size=chunk_size):
-            size = f.write(data)
-            pbar.update(size)
+        if ranged and size:
+            state = _load_state(state_path, url, size, validator) or {
+                'url': url, 'size': size, 'validator': validator,
+                'segment_size': SEGMENT_SIZE, 'done': []
+            }
+            _save_state(state_path, state)
+            _download_ranged(session, url, part_path, state_path, state,
+                             pbar, connections, chunk_size)
+        else:
+            _download_stream(session, url, part_path, pbar, chunk_size)
+
+    if expected_sha256:
+        checksum = file_sha256(part_path)
+        if checksum != expected_sha256.lower():
+            part_path.unlink()
+            state_path.unlink(missing_ok=True)
+            raise Exception(f"Checksum mismatch for {url}: expected {expected_sha256}, got {checksum}")
+
+    os.replace(part_path, target_path)
+    state_path.unlink(missing_ok=True)
 
 def extract_dataset(zip_path: Path, extract_path: Path):
     """Extract a dataset zip file"""
+    # Extract next to the target and rename, so a partial extraction is never mistaken for a finished one
+    tmp_path = extract_path.with_name(extract_path.name + '.extracting')
+    shutil.rmtree(tmp_path, ignore_errors=True)
     with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(extract_path)
+        zip_ref.extractall(tmp_path)
+    os.replace(tmp_path, extract_path)
+
+def download_datasets(base_dir: str, genres: list = None, urls: Dict[str, str] = None,
+                      checksums: Dict[str, Optional[str]] = None, parallel_genres: int = 3,
+                      connections: int = 4, session: Optional[requests.Session] = None) -> List[str]:
+    """
+    Download and prepare datasets for specified genres
+
+    Up to `parallel_genres` genres download at once. Each finished zip is
+    handed to a separate extraction thread, so extraction overlaps with the
+    downloads still running.
 
-def download_datasets(base_dir: str, genres: list = None):
-    """Download and prepare datasets for specified genres"""
+    Args:
+        base_dir: Directory receiving downloads/ and datasets/
+        genres: Genres to process (default: all)
+        urls: Dataset URL per genre (default: DATASET_URLS)
+        checksums: Expected SHA-256 per genre (default: DATASET_CHECKSUMS)
+        parallel_genres: Genres downloading concurrently
+        connections: Range requests per download
+        session: Requests session shared by all downloads
+
+    Returns:
+        Genres that completed
+    """
+    urls = urls or DATASET_URLS
+    checksums = checksums or DATASET_CHECKSUMS
     base_path = Path(base_dir)
     downloads_path = base_path / "downloads"
     datasets_path = base_path / "datasets"
-    
+
     # Create directories
     downloads_path.mkdir(parents=True, exist_ok=True)
     datasets_path.mkdir(parents=True, exist_ok=True)
-    
+
     # If no genres specified, download all
     if not genres:
-        genres = list(DATASET_URLS.keys())
-    
-    for genre in genres:
-        if genre not in DATASET_URLS:
-            print(f"Warning: No dataset URL found for genre '{genre}'")
-            continue
-        
-        print(f"\nProcessing {genre} dataset...")
-        
-        # Download
+        genres = list(urls.keys())
+
+    if session is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=parallel_genres * connections)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+    def download(genre: str) -> Path:
         zip_path = downloads_path / f"{genre}_dataset.zip"
+        expected = checksums.get(genre)
+        if zip_path.exists() and expected and file_sha256(zip_path) != expected.lower():
+            print(f"Warning: {zip_path} does not match its checksum, downloading again")
+            zip_path.unlink()
         if not zip_path.exists():
             print(f"Downloading {genre} dataset...")
-            download_file(DATASET_URLS[genre], zip_path)
-        
-        # Extract
+            download_file(urls[genre], zip_path, connections=connections,
+                          expected_sha256=expected, session=session)
+        return zip_path
+
+    def extract(genre: str, zip_path: Path):
         genre_path = datasets_path / genre
         if not genre_path.exists():
             print(f"Extracting {genre} dataset...")
             extract_dataset(zip_path, genre_path)
-        
         print(f"Completed processing {genre} dataset")
 
+    completed = []
+    with ThreadPoolExecutor(max_workers=parallel_genres) as download_pool, \
+            ThreadPoolExecutor(max_workers=1) as extract_pool:
+        downloads = {}
+        for genre in genres:
+            if genre not in urls:
+                print(f"Warning: No dataset URL found for genre '{genre}'")
+                continue
+            if (datasets_path / genre).exists():
+                print(f"Completed processing {genre} dataset")
+                completed.append(genre)
+                continue
+            downloads[download_pool.submit(download, genre)] = genre
+
+        extractions = {}
+        for future in as_completed(downloads):
+            genre = downloads[future]
+            try:
+                extractions[extract_pool.submit(extract, genre, future.result())] = genre
+            except Exception as e:
+                print(f"Error downloading {genre} dataset: {str(e)}")
+
+        for future in as_completed(extractions):
+            genre = extractions[future]
+            try:
+                future.result()
+                completed.append(genre)
+            except Exception as e:
+                print(f"Error extracting {genre} dataset: {str(e)}")
+
+    return completed
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Download music datasets by genre")
     parser.add_argument("--base-dir", type=str, required=True,
                       help="Base directory for downloading and extracting datasets")
     parser.add_argument("--genres", type=str, nargs="+",
                       help="Specific genres to download (default: all)")
-    
+    parser.add_argument("--parallel-genres", type=int, default=3,
+                      help="Number of genres downloading at once")
+    parser.add_argument("--connections", type=int, default=4,
+                      help="Parallel range requests per download")
+
     args = parser.parse_args()
-    download_datasets(args.base_dir, args.genres)
+    download_datasets(args.base_dir, args.genres,
+                      parallel_genres=args.parallel_genres,
+                      connections=args.connections)
@@ -0,0 +1,95 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+import torch
+
+CPU_COUNT = os.cpu_count() or 1
+
+# Pool sizes
+IO_WORKERS = int(os.environ.get("IO_WORKERS", 16))
+CPU_WORKERS = int(os.environ.get("CPU_WORKERS", max(2, CPU_COUNT)))
+
+# Maximum number of calls in flight per pipeline stage
+STAGE_LIMITS: Dict[str, int] = {
+    "search": int(os.environ.get("SEARCH_CONCURRENCY", 8)),
+    "download": int(os.environ.get("DOWNLOAD_CONCURRENCY", 4)),
+    "decode": int(os.environ.get("DECODE_CONCURRENCY", max(1, CPU_COUNT // 4))),
+    "inference": int(os.environ.get("INFERENCE_CONCURRENCY", 4)),
+    "mix": int(os.environ.get("MIX_CONCURRENCY", max(1, CPU_COUNT // 4))),
+}
+
+# Network-bound stages wait on sockets; CPU-bound stages spend their time in
+# numpy/librosa/torch kernels that release the GIL, so threads are enough and
+# the loaded models stay shared instead of being copied into every process.
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+
+_STAGE_EXECUTORS = {
+    "search": io_executor,
+    "download": io_executor,
+    "decode": cpu_executor,
+    "inference": cpu_executor,
+    "mix": cpu_executor,
+}
+
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def _stage_semaphore(stage: str) -> asyncio.Semaphore:
+    if stage not in _semaphores:
+        _semaphores[stage] = asyncio.Semaphore(STAGE_LIMITS[stage])
+    return _semaphores[stage]
+
+
+async def run_stage(stage: str, fn: Callable, *args, **kwargs) -> Any:
+    """
+    Run a blocking call for a pipeline stage without blocking the event loop
+
+    Args:
+        stage: One of STAGE_LIMITS; selects the pool and concurrency limit
+        fn: Blocking callable
+        *args, **kwargs: Arguments for fn
+    """
+    if stage not in STAGE_LIMITS:
+        raise ValueError(f"Unknown pipeline stage {stage}")
+
+    async with _stage_semaphore(stage):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _STAGE_EXECUTORS[stage], functools.partial(fn, *args, **kwargs)
+        )
+
+
+_torch_configured = False
+
+
+def configure_torch_threads(num_threads: int = None):
+    """
+    Budget torch's intra-op threads so they don't oversubscribe the cores
+
+    By default torch gets the cores not reserved for decode and mix work
+    running next to it. Only the first call has an effect.
+
+    Args:
+        num_threads: Explicit number of intra-op threads
+    """
+    global _torch_configured
+    if _torch_configured:
+        return
+    _torch_configured = True
+
+    if num_threads is None:
+        num_threads = int(os.environ.get(
+            "TORCH_NUM_THREADS",
+            max(1, CPU_COUNT - STAGE_LIMITS["decode"] - STAGE_LIMITS["mix"])
+        ))
+    torch.set_num_threads(num_threads)
+
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Already fixed once inter-op work has started
+        pass
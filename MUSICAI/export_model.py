@@ -0,0 +1,205 @@
+import argparse
+import inspect
+import os
+import time
+from typing import Dict, Iterable, List
+
+import torch
+from torch._C import _onnx as _C_onnx
+from torch.onnx import symbolic_helper
+
+from services.inference_backends import BACKEND_FILES
+from services.model_registry import ModelRegistry
+
+GENRES = ["Rock", "Electro", "Jazz", "Hip-Hop", "Lo-Fi"]
+
+# Backends that run an exported graph
+EXPORT_BACKENDS = ("torchscript", "onnxruntime")
+
+
+def _onnx_unflatten(g, input, dim, sizes):
+    """
+    aten::unflatten as a Reshape to sizes computed from the input's shape
+
+    nn.MultiheadAttention unflattens its packed q/k/v projection, and the
+    built-in symbolic freezes the sequence length of the traced example,
+    so the exported graph would reject every other length.
+    """
+    rank = symbolic_helper._get_tensor_rank(input)
+    dim = symbolic_helper._get_const(dim, "i", "dim")
+    dim = dim + rank if dim < 0 else dim
+    shape = g.op("Shape", input)
+    parts = [g.op("Cast", sizes, to_i=_C_onnx.TensorProtoDataType.INT64)]
+    if dim > 0:
+        parts.insert(0, g.op("Slice", shape, g.op("Constant", value_t=torch.tensor([0])),
+                             g.op("Constant", value_t=torch.tensor([dim]))))
+    if dim + 1 < rank:
+        parts.append(g.op("Slice", shape, g.op("Constant", value_t=torch.tensor([dim + 1])),
+                          g.op("Constant", value_t=torch.tensor([rank]))))
+    return g.op("Reshape", input, g.op("Concat", *parts, axis_i=0))
+
+
+def export_genre(models_dir: str, genre: str, window_size: int = 65536, opset: int = 17,
+                 backends: Iterable[str] = EXPORT_BACKENDS):
+    """
+    Export a genre's latest.pt to TorchScript (latest.ts) and ONNX (latest.onnx)
+
+    Both graphs are traced with a dynamic batch and sequence-length axis, so
+    they accept any multiple of 8 samples, not only `window_size`. The
+    model takes the same code path for every length, including the blocked
+    attention of local models, so the traced graph holds for all of them.
+
+    Args:
+        models_dir: Directory containing <genre>/latest.pt
+        genre: Genre to export
+        window_size: Sequence length used for tracing
+        opset: ONNX opset version
+        backends: Backends to export for
+    """
+    registry = ModelRegistry(models_dir, [genre])
+    model = registry.get(genre)
+    genre_dir = registry.model_path(genre).parent
+
+    # A batch of 2 keeps tracing from specializing the attention reshapes to batch 1
+    example = (torch.zeros(2, 1, window_size), torch.zeros(2, dtype=torch.long))
+
+    if "torchscript" in backends:
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example, check_trace=False)
+        ts_path = genre_dir / BACKEND_FILES["torchscript"]
+        tmp_path = ts_path.with_suffix(".tmp")
+        traced.save(str(tmp_path))
+        os.replace(tmp_path, ts_path)
+        print(f"Exported {ts_path}")
+
+    if "onnxruntime" not in backends:
+        return
+    onnx_path = genre_dir / BACKEND_FILES["onnxruntime"]
+    tmp_path = onnx_path.with_suffix(".tmp")
+    # Newer torch defaults to the torch.export-based exporter, which cannot
+    # keep the sample axis dynamic through the encoder; use the tracing one
+    options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    torch.onnx.register_custom_op_symbolic("aten::unflatten", _onnx_unflatten, opset)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            example,
+            str(tmp_path),
+            input_names=["audio", "style_idx"],
+            output_names=["output"],
+            dynamic_axes={
+                "audio": {0: "batch", 2: "samples"},
+                "style_idx": {0: "batch"},
+                "output": {0: "batch", 2: "samples"},
+            },
+            opset_version=opset,
+            **options,
+        )
+    os.replace(tmp_path, onnx_path)
+    print(f"Exported {onnx_path}")
+
+
+def check_parity(models_dir: str, genre: str, lengths: List[int], batch_size: int = 2,
+                 atol: float = 1e-4, backends: Iterable[str] = EXPORT_BACKENDS) -> Dict[str, float]:
+    """
+    Compare exported backends against eager PyTorch on random input
+
+    Runs every length in `lengths` so the dynamic sequence axis is exercised.
+
+    Returns:
+        Maximum absolute difference per backend
+
+    Raises:
+        AssertionError if any backend differs by more than `atol`
+    """
+    generator = torch.Generator().manual_seed(0)
+    inputs = [torch.randn(batch_size, 1, length, generator=generator) * 0.1 for length in lengths]
+    style_idx = torch.full((batch_size,), GENRES.index(genre), dtype=torch.long)
+
+    eager = ModelRegistry(models_dir, [genre]).get(genre)
+    with torch.no_grad():
+        references = [eager(x, style_idx) for x in inputs]
+
+    errors = {}
+    for backend in backends:
+        model = ModelRegistry(models_dir, [genre], backend=backend).get(genre)
+        with torch.no_grad():
+            errors[backend] = max(
+                float((model(x, style_idx) - ref).abs().max())
+                for x, ref in zip(inputs, references)
+            )
+
+    failed = {backend: err for backend, err in errors.items() if err > atol}
+    if failed:
+        raise AssertionError(f"Backends differ from eager beyond {atol}: {failed}")
+    return errors
+
+
+def benchmark_backends(models_dir: str, genre: str, window_size: int = 65536,
+                       batch_size: int = 4, repeats: int = 10) -> Dict[str, float]:
+    """
+    Time one batched forward pass per backend
+
+    Returns:
+        Milliseconds per window for each backend
+    """
+    x = torch.randn(batch_size, 1, window_size) * 0.1
+    style_idx = torch.full((batch_size,), GENRES.index(genre), dtype=torch.long)
+
+    timings = {}
+    for backend in BACKEND_FILES:
+        model = ModelRegistry(models_dir, [genre], backend=backend).get(genre)
+        with torch.no_grad():
+            model(x, style_idx)  # warm up
+            start = time.perf_counter()
+            for _ in range(repeats):
+                model(x, style_idx)
+        timings[backend] = 1000.0 * (time.perf_counter() - start) / (repeats * batch_size)
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export genre models to TorchScript and ONNX")
+    parser.add_argument("--models-dir", type=str, required=True,
+                      help="Directory containing <genre>/latest.pt checkpoints")
+    parser.add_argument("--genres", type=str, nargs="+", default=GENRES,
+                      help="Genres to export (default: all)")
+    parser.add_argument("--window-size", type=int, default=65536,
+                      help="Sequence length used for tracing and benchmarking")
+    parser.add_argument("--atol", type=float, default=1e-4,
+                      help="Maximum absolute difference allowed by the parity check")
+    parser.add_argument("--skip-check", action="store_true",
+                      help="Skip the parity check and benchmark")
+
+    args = parser.parse_args()
+
+    failures = 0
+    for genre in args.genres:
+        registry = ModelRegistry(args.models_dir, [genre])
+        if not registry.available(genre):
+            print(f"Warning: No trained model found for {genre}")
+            continue
+
+        print(f"\nExporting {genre}...")
+        export_genre(args.models_dir, genre, args.window_size)
+        if args.skip_check:
+            continue
+
+        try:
+            # Includes a length that is no multiple of a local attention block
+            errors = check_parity(args.models_dir, genre,
+                                  [args.window_size, 2 * args.window_size, args.window_size // 2 + 24],
+                                  atol=args.atol)
+            for backend, err in errors.items():
+                print(f"Parity {backend}: max abs diff {err:.2e}")
+        except AssertionError as e:
+            print(f"Parity check failed for {genre}: {str(e)}")
+            failures += 1
+            continue
+
+        timings = benchmark_backends(args.models_dir, genre, args.window_size)
+        fastest = min(timings, key=timings.get)
+        for backend, ms in timings.items():
+            print(f"{backend:<12}{ms:>10.2f} ms/window{'  <- fastest' if backend == fastest else ''}")
+
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,63 @@
+from pathlib import Path
+
+import numpy as np
+import torch
+
+# Model file each backend loads from a genre directory
+BACKEND_FILES = {
+    "eager": "latest.pt",
+    "torchscript": "latest.ts",
+    "onnxruntime": "latest.onnx",
+}
+
+
+class OnnxRuntimeBackend:
+    def __init__(self, model_path: str, num_threads: int = None):
+        """
+        Run an exported MusicGenerationModel graph with ONNX Runtime
+
+        Called like the eager model: backend(x, style_idx) -> tensor.
+
+        Args:
+            model_path: Path to the .onnx file
+            num_threads: Intra-op threads, defaults to torch's thread budget
+        """
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("The onnxruntime backend requires the onnxruntime package (pip install onnxruntime)")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads or torch.get_num_threads()
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+
+    def __call__(self, x: torch.Tensor, style_idx: torch.Tensor) -> torch.Tensor:
+        (output,) = self.session.run(None, {
+            "audio": x.numpy().astype(np.float32, copy=False),
+            "style_idx": style_idx.numpy().astype(np.int64, copy=False),
+        })
+        return torch.from_numpy(output)
+
+    def eval(self):
+        return self
+
+
+def load_backend(backend: str, model_path: Path):
+    """
+    Load an exported model for a non-eager backend
+
+    Args:
+        backend: "torchscript" or "onnxruntime"
+        model_path: Exported model file
+    """
+    if backend == "torchscript":
+        model = torch.jit.load(str(model_path), map_location="cpu")
+        model.eval()
+        return model
+    if backend == "onnxruntime":
+        return OnnxRuntimeBackend(str(model_path))
+    raise ValueError(f"Unknown inference backend {backend}, expected one of {', '.join(BACKEND_FILES)}")
@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+import torch
+
+
+class _WorkItem:
+    __slots__ = ("window", "future", "enqueued_at")
+
+    def __init__(self, window: np.ndarray):
+        self.window = window
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class InferenceScheduler:
+    def __init__(self, model_provider: Callable[[str], torch.nn.Module],
+                 genre_to_idx: Dict[str, int], max_batch_size: int = 8,
+                 max_wait_ms: float = 5.0):
+        """
+        Dynamic micro-batching scheduler for genre model inference
+
+        Windows submitted by any number of concurrent requests are queued per
+        genre. A single worker thread stacks queued windows of the same genre
+        into one batched forward pass once `max_batch_size` windows are
+        waiting or the oldest one has waited `max_wait_ms`, then routes each
+        output row back to the future of the window it came from.
+
+        Args:
+            model_provider: Callable returning the model for a genre
+            genre_to_idx: Mapping from genre name to style embedding index
+            max_batch_size: Maximum number of windows per forward pass
+            max_wait_ms: Maximum time a window waits for a batch to fill
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+
+        self.model_provider = model_provider
+        self.genre_to_idx = genre_to_idx
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._pending: Dict[Tuple[str, int], deque] = {}
+        self._cond = threading.Condition()
+        self._worker = None
+
+        # Statistics
+        self._batch_sizes = Counter()
+        self._items = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def submit(self, genre: str, window: np.ndarray) -> Future:
+        """
+        Queue one window for inference
+
+        Args:
+            genre: Target genre
+            window: 1-D float32 window of samples
+
+        Returns:
+            Future resolving to the model output for this window
+        """
+        item = _WorkItem(window)
+        with self._cond:
+            self._ensure_worker()
+            self._pending.setdefault((genre, len(window)), deque()).append(item)
+            self._cond.notify()
+        return item.future
+
+    def stats(self) -> Dict:
+        """Return batch-size and queue-wait statistics"""
+        with self._cond:
+            batches = sum(self._batch_sizes.values())
+            return {
+                "batches": batches,
+                "windows": self._items,
+                "mean_batch_size": self._items / batches if batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "mean_queue_wait_ms": 1000.0 * self._wait_total / self._items if self._items else 0.0,
+                "max_queue_wait_ms": 1000.0 * self._wait_max,
+                "queued": sum(len(q) for q in self._pending.values()),
+            }
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            key, batch = self._next_batch()
+            self._execute(key[0], batch)
+
+    def _next_batch(self):
+        """Block until a batch is ready and remove it from the queue"""
+        with self._cond:
+            while True:
+                queues = [(key, q) for key, q in self._pending.items() if q]
+                if not queues:
+                    self._cond.wait()
+                    continue
+
+                # Serve the queue whose oldest window has waited longest
+                key, q = min(queues, key=lambda kq: kq[1][0].enqueued_at)
+                deadline = q[0].enqueued_at + self.max_wait
+                remaining = deadline - time.monotonic()
+                if len(q) < self.max_batch_size and remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+
+                batch = [q.popleft() for _ in range(min(len(q), self.max_batch_size))]
+                now = time.monotonic()
+                for item in batch:
+                    wait = now - item.enqueued_at
+                    self._wait_total += wait
+                    self._wait_max = max(self._wait_max, wait)
+                self._items += len(batch)
+                self._batch_sizes[len(batch)] += 1
+                return key, batch
+
+    def _execute(self, genre: str, batch):
+        """Run one batched forward pass and resolve the batch's futures"""
+        try:
+            model = self.model_provider(genre)
+            x = torch.from_numpy(np.stack([item.window for item in batch])).unsqueeze(1)
+            style_idx = torch.full((len(batch),), self.genre_to_idx[genre], dtype=torch.long)
+            with torch.no_grad():
+                output = model(x, style_idx).reshape(len(batch), -1).numpy()
+        except Exception as e:
+            for item in batch:
+                item.future.set_exception(e)
+            return
+
+        for i, item in enumerate(batch):
+            item.future.set_result(output[i])
@@ -0,0 +1,165 @@
+import asyncio
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class Job:
+    def __init__(self, params: Any):
+        """
+        A unit of background work and its observable state
+
+        Args:
+            params: Request parameters passed to the job runner
+        """
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.status = "queued"
+        self.stage = "queued"
+        self.current: Optional[int] = None
+        self.total: Optional[int] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.finished_at: Optional[float] = None
+        self._manager: Optional["JobManager"] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def report(self, stage: str, current: Optional[int] = None, total: Optional[int] = None):
+        """
+        Report progress; safe to call from worker threads
+
+        Args:
+            stage: Pipeline stage name, e.g. "downloading" or "inferring"
+            current: Units of work done in this stage, if countable
+            total: Total units of work in this stage, if countable
+        """
+        self._manager._update(self, stage=stage, current=current, total=total)
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "current": self.current,
+            "total": self.total,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    def __init__(self, runner: Callable[[Job], Awaitable[Any]], max_queue_size: int = 100,
+                 num_workers: int = 2, retention_seconds: float = 3600.0):
+        """
+        Bounded queue of background jobs served by a fixed pool of workers
+
+        Args:
+            runner: Coroutine function executing a job and returning its result
+            max_queue_size: Maximum number of jobs waiting to run
+            num_workers: Number of jobs running at the same time
+            retention_seconds: How long finished jobs stay queryable
+        """
+        self.runner = runner
+        self.max_queue_size = max_queue_size
+        self.num_workers = num_workers
+        self.retention_seconds = retention_seconds
+
+        self.jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def submit(self, params: Any) -> Job:
+        """Queue a job; must be called from the event loop"""
+        self._start()
+        self._prune()
+
+        job = Job(params)
+        job._manager = self
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Job queue is full ({self.max_queue_size} jobs waiting)")
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._prune()
+        return self.jobs.get(job_id)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def events(self, job: Job) -> AsyncIterator[Dict]:
+        """Yield the job state on every change until the job finishes"""
+        while True:
+            changed = job._changed
+            state = job.to_dict()
+            yield state
+            if job.finished:
+                return
+            await changed.wait()
+
+    def _start(self):
+        if self._workers:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.num_workers)
+        ]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self._set(job, status="running", stage="starting")
+            try:
+                result = await self.runner(job)
+                self._set(job, status="completed", stage="completed", result=result,
+                          current=None, total=None, finished_at=time.time())
+            except Exception as e:
+                self._set(job, status="failed", stage="failed", error=str(e),
+                          finished_at=time.time())
+            finally:
+                self._queue.task_done()
+
+    def _update(self, job: Job, **changes):
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._set(job, **changes)
+        else:
+            self._loop.call_soon_threadsafe(lambda: self._set(job, **changes))
+
+    def _set(self, job: Job, **changes):
+        for name, value in changes.items():
+            setattr(job, name, value)
+        job.updated_at = time.time()
+
+        # Wake everyone waiting on the previous state
+        changed, job._changed = job._changed, asyncio.Event()
+        changed.set()
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
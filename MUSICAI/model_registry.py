@@ -0,0 +1,190 @@
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import torch
+import torch.nn as nn
+from models.music_model import MusicGenerationModel
+from services.precision import PRECISIONS, apply_precision, model_nbytes
+from services.inference_backends import BACKEND_FILES, load_backend
+
+
+class ModelRegistry:
+    def __init__(self, models_dir: str, genres: Iterable[str],
+                 max_resident_bytes: Optional[int] = None,
+                 precision: Union[str, Dict[str, str]] = "fp32",
+                 backend: str = "eager",
+                 model_factory: Callable[..., nn.Module] = MusicGenerationModel):
+        """
+        Lazily loaded, memory-mapped genre models with LRU residency
+
+        A genre's weights are loaded from `<models_dir>/<genre>/latest.pt` the
+        first time the genre is requested. Checkpoints are memory-mapped and
+        assigned to the model without copying, so untouched pages stay on
+        disk and are shared between worker processes through the page cache.
+        When the resident models exceed `max_resident_bytes`, the least
+        recently used ones are dropped. A model is reloaded when its
+        `latest.pt` changes on disk.
+
+        Non-eager backends load the graph exported by export_model.py
+        (`latest.ts` or `latest.onnx`) from the same directory instead.
+
+        Args:
+            models_dir: Directory containing one subdirectory per genre
+            genres: Genres served by this registry
+            max_resident_bytes: Cap on the weight bytes of resident models,
+                or None for no cap
+            precision: Inference precision ("fp32", "int8" or "bf16"), either
+                for all genres or as a per-genre mapping defaulting to fp32;
+                only the eager backend supports reduced precision
+            backend: "eager", "torchscript" or "onnxruntime"
+            model_factory: Callable building an empty model from a
+                checkpoint's model_config keyword arguments
+        """
+        self.models_dir = Path(models_dir)
+        self.genres = list(genres)
+        self.max_resident_bytes = max_resident_bytes
+        self.precision = precision
+        self.backend = backend
+        self.model_factory = model_factory
+
+        # genre -> (file signature, model, weight bytes)
+        self._resident: "OrderedDict[str, Tuple[Tuple[int, int], nn.Module, int]]" = OrderedDict()
+        self._checksums: Dict[str, Tuple[Tuple[int, int], str]] = {}
+        self._lock = threading.Lock()
+        # Loads run outside _lock, one at a time per genre, so a slow load
+        # never blocks requests for models that are already resident
+        self._load_locks = {genre: threading.Lock() for genre in self.genres}
+
+        if backend not in BACKEND_FILES:
+            raise ValueError(f"Unknown inference backend {backend}, expected one of {', '.join(BACKEND_FILES)}")
+        for genre in self.genres:
+            if self.precision_for(genre) not in PRECISIONS:
+                raise ValueError(f"Unknown inference precision {self.precision_for(genre)} for {genre}, "
+                                 f"expected one of {', '.join(PRECISIONS)}")
+        if backend != "eager" and any(self.precision_for(g) != "fp32" for g in self.genres):
+            raise ValueError(f"The {backend} backend only supports fp32 precision")
+
+    def model_path(self, genre: str) -> Path:
+        return self.models_dir / genre.lower() / BACKEND_FILES[self.backend]
+
+    def available(self, genre: str) -> bool:
+        """Whether a trained model exists on disk for a genre"""
+        return genre in self.genres and self.model_path(genre).exists()
+
+    def available_genres(self) -> List[str]:
+        return [genre for genre in self.genres if self.available(genre)]
+
+    def precision_for(self, genre: str) -> str:
+        if isinstance(self.precision, str):
+            return self.precision
+        return self.precision.get(genre, "fp32")
+
+    def resident_genres(self) -> List[str]:
+        """Genres currently loaded, least recently used first"""
+        with self._lock:
+            return list(self._resident.keys())
+
+    def get(self, genre: str) -> nn.Module:
+        """Return the model for a genre, loading or reloading it if needed"""
+        if not self.available(genre):
+            raise ValueError(f"No trained model available for genre {genre}")
+
+        path = self.model_path(genre)
+        signature = self._signature(path)
+        model = self._resident_model(genre, signature)
+        if model is not None:
+            return model
+
+        with self._load_locks[genre]:
+            # Another request may have loaded it while we waited
+            model = self._resident_model(genre, signature)
+            if model is not None:
+                return model
+
+            with self._lock:
+                reloading = genre in self._resident
+            if reloading:
+                print(f"Reloading {genre} model after {path} changed")
+            if self.backend == "eager":
+                model = apply_precision(self._load(path), self.precision_for(genre))
+                size = model_nbytes(model)
+            else:
+                model = load_backend(self.backend, path)
+                size = model_nbytes(model) if isinstance(model, nn.Module) else signature[1]
+
+            with self._lock:
+                self._resident[genre] = (signature, model, size)
+                self._resident.move_to_end(genre)
+                self._evict()
+            return model
+
+    def _resident_model(self, genre: str, signature: Tuple[int, int]) -> Optional[nn.Module]:
+        """The resident model for a genre if it is current, marking it recently used"""
+        with self._lock:
+            entry = self._resident.get(genre)
+            if entry is None or entry[0] != signature:
+                return None
+            self._resident.move_to_end(genre)
+            return entry[1]
+
+    def checksum(self, genre: str) -> str:
+        """SHA-256 of a genre's model file, recomputed only when the file changes"""
+        if not self.available(genre):
+            raise ValueError(f"No trained model available for genre {genre}")
+
+        path = self.model_path(genre)
+        signature = self._signature(path)
+        with self._lock:
+            cached = self._checksums.get(genre)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+
+        with self._lock:
+            self._checksums[genre] = (signature, digest.hexdigest())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _signature(path: Path) -> Tuple[int, int]:
+        stat = path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, path: Path) -> nn.Module:
+        try:
+            state = torch.load(str(path), map_location="cpu", mmap=True, weights_only=True)
+        except (RuntimeError, pickle.UnpicklingError):
+            # Legacy (non-zipfile) checkpoints cannot be memory-mapped
+            print(f"Warning: {path} is not mmap-compatible, loading it into memory")
+            state = torch.load(str(path), map_location="cpu")
+
+        # Training checkpoints wrap the weights, next to the architecture
+        # they were trained with
+        config = {}
+        if "model_state_dict" in state:
+            config = state.get("model_config") or {}
+            state = state["model_state_dict"]
+
+        # Build the module without allocating weights, then adopt the mapped tensors
+        with torch.device("meta"):
+            model = self.model_factory(**config)
+        model.load_state_dict(state, assign=True)
+        model.eval()
+        return model
+
+    def _evict(self):
+        if self.max_resident_bytes is None:
+            return
+        total = sum(entry[2] for entry in self._resident.values())
+        # Never drop the model that was just requested
+        while total > self.max_resident_bytes and len(self._resident) > 1:
+            genre, (_, _, size) = self._resident.popitem(last=False)
+            total -= size
+            print(f"Evicted {genre} model from memory")
@@ -1,52 +1,218 @@
+import functools
+import hashlib
+import json
+import math
 import os
+import resource
+import time
+from contextlib import nullcontext
 import torch
+import torch.distributed as dist
+import torch.nn as nn
 import torchaudio
 from pathlib import Path
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional, Tuple
 import librosa
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from torch.nn.parallel import DistributedDataParallel
 from torch.utils.data import Dataset, DataLoader
+from models.music_model import MusicGenerationModel
+from services.checkpointing import (CheckpointWriter, ResumableSampler, checkpoint_name,
+                                    latest_checkpoint, rng_state, set_rng_state)
+from services.packed_dataset import PackedReader, ShardWriter, compact_dataset, is_packed
+
+METADATA_FILE = "metadata.json"
+
+# Source samples decoded on each side of a window so the resampling filter
+# sees real neighbours instead of zero padding at the window edges
+RESAMPLE_MARGIN = 128
+
+@functools.lru_cache(maxsize=None)
+def get_resampler(orig_sr: int, target_sr: int) -> torchaudio.transforms.Resample:
+    """Resampler for a rate pair; the sinc kernel is computed once per process"""
+    return torchaudio.transforms.Resample(orig_sr, target_sr)
 
 class MusicDataset(Dataset):
-    def __init__(self, audio_dir: str, segment_length: int = 65536):
+    def __init__(self, audio_dir: str, segment_length: int = 65536, sample_rate: int = 44100):
         """
         Dataset for loading music segments
-        
+
+        Reads a packed dataset (see packed_dataset.py) when the directory
+        holds one. Otherwise every WAV file yields one random window per
+        item; only that window is decoded, using frame counts and sample
+        rates from a metadata index (`metadata.json`) that is built once and
+        refreshed for files whose size or modification time changed.
+
         Args:
             audio_dir: Directory containing audio files
             segment_length: Length of audio segments in samples
+            sample_rate: Sample rate of the returned segments
         """
         self.audio_dir = Path(audio_dir)
         self.segment_length = segment_length
-        self.files = list(self.audio_dir.glob("*.wav"))
+        self.sample_rate = sample_rate
+        self.packed = None
+        self.files = []
+        self.metadata = []
+        if is_packed(audio_dir):
+            self.packed = PackedReader(audio_dir)
+            if self.packed.frame_length != segment_length:
+                raise Exception(f"Packed frames are {self.packed.frame_length} samples, "
+                                f"expected {segment_length}")
+        else:
+            self.files = sorted(self.audio_dir.glob("*.wav"))
+            self.metadata = self._load_metadata()
         
     def __len__(self):
+        if self.packed is not None:
+            return len(self.packed)
         return len(self.files)
     
     def __getitem__(self, idx):
-        audio_path = self.files[idx]
-        waveform, sr = torchaudio.load(audio_path)
-        
-        # Convert to mono if stereo
-        if waveform.shape[0] > 1:
-            waveform = torch.mean(waveform, dim=0, keepdim=True)
-        
-        # Ensure consistent sample rate
-        if sr != 44100:
-            resampler = torchaudio.transforms.Resample(sr, 44100)
-            waveform = resampler(waveform)
+        if self.packed is not None:
+            # Zero-copy view of the memory-mapped shard for float32 datasets
+            return torch.from_numpy(self.packed.frame(idx)).unsqueeze(0)
+
+        num_frames, sr = self.metadata[idx]
+        # Length of the file once resampled
+        length = num_frames * self.sample_rate // sr
         
         # Random segment if audio is longer than segment_length
-        if waveform.shape[1] > self.segment_length:
-            start = torch.randint(0, waveform.shape[1] - self.segment_length, (1,))
-            waveform = waveform[:, start:start + self.segment_length]
+        if length > self.segment_length:
+            start = int(torch.randint(0, length - self.segment_length, (1,)))
+            waveform = self._read_window(self.files[idx], sr, start)
         else:
-            # Pad if audio is shorter
+            waveform = self._read_window(self.files[idx], sr, 0)
+        
+        # Pad if audio is shorter
+        if waveform.shape[1] < self.segment_length:
             padding = self.segment_length - waveform.shape[1]
             waveform = torch.nn.functional.pad(waveform, (0, padding))
         
         return waveform
 
+    def _read_window(self, audio_path: Path, sr: int, start: int) -> torch.Tensor:
+        """Decode the segment starting at target-rate sample `start`"""
+        if sr == self.sample_rate:
+            waveform, _ = torchaudio.load(audio_path, frame_offset=start, num_frames=self.segment_length)
+            return torch.mean(waveform, dim=0, keepdim=True)
+
+        # Start the read on a source sample that maps to a whole target
+        # sample, so the resampled window lines up exactly with `start`
+        step = sr // math.gcd(sr, self.sample_rate)
+        src_start = max(0, int(start * sr / self.sample_rate) - RESAMPLE_MARGIN) // step * step
+        src_end = math.ceil((start + self.segment_length) * sr / self.sample_rate) + RESAMPLE_MARGIN
+        waveform, _ = torchaudio.load(audio_path, frame_offset=src_start, num_frames=src_end - src_start)
+
+        # Convert to mono if stereo
+        waveform = torch.mean(waveform, dim=0, keepdim=True)
+
+        # Ensure consistent sample rate
+        waveform = get_resampler(sr, self.sample_rate)(waveform)
+        offset = start - src_start * self.sample_rate // sr
+        return waveform[:, offset:offset + self.segment_length]
+
+    def _load_metadata(self) -> List[Tuple[int, int]]:
+        """(frame count, sample rate) per file, read from the cached index"""
+        index_path = self.audio_dir / METADATA_FILE
+        cached = {}
+        if index_path.exists():
+            with open(index_path) as f:
+                cached = json.load(f)
+
+        index = {}
+        metadata = []
+        for audio_path in self.files:
+            stat = audio_path.stat()
+            entry = cached.get(audio_path.name)
+            if entry is None or (entry["size"], entry["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+                info = torchaudio.info(str(audio_path))
+                entry = {
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "num_frames": info.num_frames,
+                    "sample_rate": info.sample_rate,
+                }
+            index[audio_path.name] = entry
+            metadata.append((entry["num_frames"], entry["sample_rate"]))
+
+        if index != cached:
+            # Per process, since every rank and loader worker may refresh the index
+            tmp_path = index_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(index, f)
+            os.replace(tmp_path, index_path)
+        return metadata
+
+PREPARE_MANIFEST = "prepare_manifest.json"
+PREPARE_STAGES = ("hash", "decode", "resample", "write")
+
+def _prepare_source(source: str, known_hash: Optional[str], sample_rate: int) -> Dict:
+    """
+    Hash, decode and resample one source file in a worker process
+
+    Decoding is skipped when the content hash matches `known_hash`, i.e.
+    only the file's mtime changed.
+    """
+    timings = {}
+    stat = os.stat(source)
+    result = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+              "samples": None, "timings": timings}
+
+    start = time.perf_counter()
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    result["sha256"] = digest.hexdigest()
+    timings["hash"] = time.perf_counter() - start
+    if result["sha256"] == known_hash:
+        return result
+
+    start = time.perf_counter()
+    y, sr = librosa.load(source, sr=None)
+    timings["decode"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if sr != sample_rate:
+        y = librosa.resample(y, orig_sr=sr, target_sr=sample_rate)
+    result["samples"] = y.astype(np.float32, copy=False)
+    timings["resample"] = time.perf_counter() - start
+    return result
+
+LOADER_CONFIG = "loader_config.json"
+
+# DataLoader settings used until benchmark_training.py writes a tuned config
+DEFAULT_LOADER_CONFIG = {
+    "batch_size": 32,
+    "num_workers": 0,
+    "prefetch_factor": 2,
+    "persistent_workers": False,
+    "pin_memory": False,
+}
+
+def distributed_context() -> Tuple[int, int]:
+    """(rank, world size) of this process; (0, 1) outside a process group"""
+    if dist.is_available() and dist.is_initialized():
+        return dist.get_rank(), dist.get_world_size()
+    return 0, 1
+
+def dataloader_kwargs(config: Dict) -> Dict:
+    """DataLoader keyword arguments for a loader config, minus the batch size"""
+    kwargs = {
+        "num_workers": config["num_workers"],
+        # Pinned host memory only helps copies to a GPU
+        "pin_memory": config["pin_memory"] and torch.cuda.is_available(),
+    }
+    if config["num_workers"] > 0:
+        kwargs["prefetch_factor"] = config["prefetch_factor"]
+        kwargs["persistent_workers"] = config["persistent_workers"]
+    return kwargs
+
+# Genre order of the model's style embedding
+STYLE_GENRES = ["rock", "electro", "jazz", "hiphop", "lofi"]
+
 class GenreModelTrainer:
     def __init__(self, base_dir: str):
         """
@@ -62,92 +228,423 @@ class GenreModelTrainer:
         # Create directories
         self.datasets_dir.mkdir(parents=True, exist_ok=True)
         self.models_dir.mkdir(parents=True, exist_ok=True)
+
+        self.loader_config = self.load_loader_config()
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    def load_loader_config(self) -> Dict:
+        """DataLoader settings from <base_dir>/loader_config.json, else the defaults"""
+        config = dict(DEFAULT_LOADER_CONFIG)
+        config_path = self.base_dir / LOADER_CONFIG
+        if config_path.exists():
+            with open(config_path) as f:
+                config.update({k: v for k, v in json.load(f).items() if k in config})
+        return config
+
+    def save_loader_config(self, config: Dict):
+        """Persist DataLoader settings for later training runs"""
+        self.loader_config = {**DEFAULT_LOADER_CONFIG, **config}
+        config_path = self.base_dir / LOADER_CONFIG
+        tmp_path = config_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.loader_config, f, indent=1)
+        os.replace(tmp_path, config_path)
     
-    def prepare_dataset(self, genre: str, source_files: List[str]):
+    def prepare_dataset(self, genre: str, source_files: List[str],
+                        num_workers: Optional[int] = None) -> Dict[str, Dict[str, float]]:
         """
         Prepare a dataset for a specific genre
+
+        Sources are hashed, decoded and resampled in a process pool while
+        this process appends the results to the packed dataset. A manifest
+        (`prepare_manifest.json`) records each source's size, mtime and
+        content hash, so a re-run only processes new or changed files and
+        drops the segments of files no longer listed.
         
         Args:
             genre: Genre name
             source_files: List of paths to source audio files
+            num_workers: Worker processes (default: all cores)
+
+        Returns:
+            Per-stage totals and throughput (bytes or audio seconds per
+            busy second)
         """
         genre_dir = self.datasets_dir / genre
         genre_dir.mkdir(exist_ok=True)
-        
-        for file in source_files:
+        manifest_path = genre_dir / PREPARE_MANIFEST
+        manifest = {}
+        if manifest_path.exists() and is_packed(str(genre_dir)):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+
+        sources = {str(Path(file).resolve()): file for file in source_files}
+        pending = []
+        for source in list(sources):
             try:
-                # Load and preprocess audio
-                y, sr = librosa.load(file, sr=44100)
-                
-                # Split into segments
-                segments = librosa.util.frame(y, frame_length=65536, hop_length=32768)
-                
-                # Save segments
-                for i, segment in enumerate(segments.T):
-                    output_path = genre_dir / f"{Path(file).stem}_segment_{i}.wav"
-                    librosa.output.write_wav(str(output_path), segment, sr)
-                    
-            except Exception as e:
-                print(f"Error processing {file}: {str(e)}")
+                stat = os.stat(source)
+            except OSError as e:
+                print(f"Error processing {sources.pop(source)}: {str(e)}")
+                continue
+            entry = manifest.get(source)
+            if entry is not None and (entry["size"], entry["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            pending.append((source, entry["sha256"] if entry else None))
+
+        stats = {stage: {"seconds": 0.0, "files": 0, "bytes": 0, "audio_seconds": 0.0}
+                 for stage in PREPARE_STAGES}
+        start = time.perf_counter()
+
+        # Each track is stored once; MusicDataset cuts 65536-sample frames
+        # every 32768 samples from the packed shards
+        with ShardWriter(str(genre_dir), sample_rate=44100, frame_length=65536,
+                         hop_length=32768, append=bool(manifest)) as writer:
+            # Deleted sources lose their segments
+            stale = [source for source in manifest if source not in sources]
+            writer.remove(stale)
+            for source in stale:
+                del manifest[source]
+
+            with ProcessPoolExecutor(max_workers=num_workers) as pool:
+                futures = {pool.submit(_prepare_source, source, known_hash, 44100): source
+                           for source, known_hash in pending}
+                for future in as_completed(futures):
+                    source = futures.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"Error processing {sources[source]}: {str(e)}")
+                        writer.remove([source])
+                        manifest.pop(source, None)
+                        continue
+
+                    for stage, seconds in result["timings"].items():
+                        stats[stage]["seconds"] += seconds
+                        stats[stage]["files"] += 1
+                    stats["hash"]["bytes"] += result["size"]
+
+                    # None when only the mtime changed; the old segments stay.
+                    # Popped so finished results don't keep their audio alive
+                    samples = result.pop("samples")
+                    if samples is not None:
+                        write_start = time.perf_counter()
+                        writer.remove([source])
+                        writer.add(samples, source)
+                        stats["write"]["seconds"] += time.perf_counter() - write_start
+                        stats["write"]["files"] += 1
+                        for stage in ("decode", "resample", "write"):
+                            stats[stage]["audio_seconds"] += len(samples) / 44100
+                        del samples
+
+                    manifest[source] = {
+                        "size": result["size"],
+                        "mtime_ns": result["mtime_ns"],
+                        "sha256": result["sha256"],
+                    }
+
+        # Rewrite the shards once most of their samples are stale
+        if writer.dead_fraction() > 0.5:
+            compact_dataset(str(genre_dir))
+
+        tmp_path = manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+
+        elapsed = time.perf_counter() - start
+        print(f"Prepared {genre}: {len(pending)} of {len(sources)} sources needed work, "
+              f"{len(stale)} removed, {elapsed:.1f}s")
+        for stage, totals in stats.items():
+            # Per busy second of the stage, so the slowest stage stands out
+            amount = totals["bytes"] if stage == "hash" else totals["audio_seconds"]
+            totals["throughput"] = amount / totals["seconds"] if totals["seconds"] else 0.0
+            if not totals["files"]:
+                continue
+            rate = (f"{totals['throughput'] / 1024 ** 2:.1f} MiB/s" if stage == "hash"
+                    else f"{totals['throughput']:.1f}x realtime")
+            print(f"  {stage:<9}{totals['files']:>6} files {totals['seconds']:>8.1f}s busy  {rate}")
+        return stats
     
-    def train_genre_model(self, genre: str, epochs: int = 100, batch_size: int = 32):
+    def train_genre_model(self, genre: str, epochs: int = 100, batch_size: Optional[int] = None,
+                          bf16: bool = False, compile_model: bool = False,
+                          accumulation_steps: int = 1, resume: bool = False,
+                          lr_schedule: Optional[str] = None,
+                          checkpoint_every: Optional[int] = None, keep_checkpoints: int = 3,
+                          seed: int = 0,
+                          progress: Optional[Callable[[str, Optional[int], Optional[int]], None]] = None,
+                          model_config: Optional[Dict] = None):
         """
         Train a model for a specific genre
+
+        The fast path is opt-in: bf16 autocast (on CPU or GPU), torch.compile
+        of the training step, and gradient accumulation, which steps the
+        optimizer once every `accumulation_steps` batches so the effective
+        batch size is `batch_size * accumulation_steps`. Losses are summed
+        on the device and read back once per epoch, never per step.
+
+        A checkpoint with the model, optimizer, scheduler, RNG states and
+        position in the epoch is written in the background after every epoch
+        and, with `checkpoint_every`, every that many batches. With `resume`,
+        training continues from the newest checkpoint, sample for sample.
+
+        When called in an initialized torch.distributed process group (see
+        train_distributed.py), every rank trains on its own shard of each
+        epoch and gradients are averaged across ranks, so `batch_size` is per
+        rank. Only rank 0 logs and writes checkpoints; on resume it reads the
+        checkpoint and sends it to the other ranks, so nodes need no shared
+        filesystem.
         
         Args:
             genre: Genre name
             epochs: Number of training epochs
-            batch_size: Batch size for training
+            batch_size: Batch size for training (default: the loader config's)
+            bf16: Run forward and loss under bfloat16 autocast
+            compile_model: Compile the training step with torch.compile
+            accumulation_steps: Batches per optimizer step
+            resume: Continue from the newest checkpoint, if any
+            lr_schedule: None for a constant learning rate, or "cosine"
+            checkpoint_every: Batches between mid-epoch checkpoints
+            keep_checkpoints: Checkpoints retained on disk
+            seed: Seed of the initialization and the shuffle order
+            progress: Called as progress("training", epochs done, epochs)
+                after every epoch
+            model_config: MusicGenerationModel keyword arguments, e.g.
+                {"attention": "local", "window_size": 512}; stored in the
+                checkpoints so load_model rebuilds the same architecture
         """
+        # Fails before any data is read for a genre without a style embedding
+        style_idx = self.style_index(genre)
+        batch_size = batch_size or self.loader_config["batch_size"]
+        rank, world_size = distributed_context()
         dataset = MusicDataset(str(self.datasets_dir / genre))
-        dataloader = DataLoader(dataset, batch_size=batch_size, shuffle=True)
+        sampler = ResumableSampler(dataset, seed=seed, num_replicas=world_size, rank=rank)
+        # The loader draws worker seeds from its own generator, not the global
+        # RNG, so where an epoch starts doesn't shift the model's random stream
+        loader_rng = torch.Generator()
+        loader_rng.manual_seed(seed + rank)
+        dataloader = DataLoader(dataset, batch_size=batch_size, sampler=sampler,
+                                generator=loader_rng, **dataloader_kwargs(self.loader_config))
         
-        # Initialize model (you'll need to implement your specific model architecture)
-        model = self._create_model()
+        torch.manual_seed(seed)
+        net = self._create_model(model_config).to(self.device)
+        model = net
+        if world_size > 1:
+            # Broadcasts rank 0's weights, then all-reduces gradients in backward
+            model = DistributedDataParallel(net)
+            torch.manual_seed(seed + rank)
         optimizer = torch.optim.Adam(model.parameters())
+        scheduler = None
+        if lr_schedule == "cosine":
+            scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=epochs)
+        elif lr_schedule is not None:
+            raise ValueError(f"Unknown learning rate schedule {lr_schedule}")
+        step_fn = torch.compile(self._training_step) if compile_model else self._training_step
+
+        start_epoch, start_batch, start_sample, loss_sum, loss_count = 0, 0, 0, 0.0, 0
+        checkpoint_path, checkpoint = None, None
+        if resume and rank == 0:
+            checkpoint_path = latest_checkpoint(self.models_dir / genre)
+            if checkpoint_path is not None:
+                checkpoint = torch.load(str(checkpoint_path), map_location="cpu", weights_only=False)
+        if world_size > 1:
+            shared = [checkpoint]
+            dist.broadcast_object_list(shared, src=0)
+            checkpoint = shared[0]
+        if checkpoint is not None:
+            net.load_state_dict(checkpoint['model_state_dict'])
+            optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+            if scheduler is not None and checkpoint.get('scheduler_state_dict'):
+                scheduler.load_state_dict(checkpoint['scheduler_state_dict'])
+            # Each rank continues its own random streams when the world size is unchanged
+            old_world_size = checkpoint.get('world_size', 1)
+            rank_state = (checkpoint.get('rank_states') or [checkpoint])[rank] if old_world_size == world_size else None
+            if rank_state is not None:
+                set_rng_state(rank_state['rng_state'])
+                loader_rng.set_state(rank_state['loader_rng_state'])
+                loss_sum, loss_count = rank_state.get('loss_sum', 0.0), rank_state.get('loss_count', 0)
+            else:
+                if rank == 0:
+                    print(f"Warning: Resuming on {world_size} ranks after {old_world_size}, "
+                          f"the sample order will differ from an uninterrupted run")
+                    # The interrupted epoch's loss over all old ranks; the epoch
+                    # log sums over ranks, so only rank 0 carries it
+                    old_states = checkpoint.get('rank_states') or [checkpoint]
+                    loss_sum = sum(state.get('loss_sum', 0.0) for state in old_states)
+                    loss_count = sum(state.get('loss_count', 0) for state in old_states)
+            start_epoch = checkpoint['epoch']
+            start_batch = checkpoint.get('batch') or 0
+            # Skip this rank's share of the samples all ranks had consumed
+            start_sample = start_batch * checkpoint['batch_size'] * old_world_size // world_size
+            if start_batch and checkpoint['batch_size'] != batch_size and rank == 0:
+                print(f"Warning: Resuming with batch size {batch_size} after {checkpoint['batch_size']}")
+            if start_batch:
+                # A mid-epoch checkpoint is named after the epoch it interrupted
+                start_epoch -= 1
+            if rank == 0:
+                print(f"Resuming {genre} from {checkpoint_path.name}")
+        elif resume and rank == 0:
+            print(f"No checkpoint found for {genre}, starting from scratch")
+
+        writer = CheckpointWriter(str(self.models_dir / genre), keep=keep_checkpoints) if rank == 0 else None
+
+        def save(epoch: int, batch: Optional[int], epoch_losses: List[torch.Tensor]):
+            own = {
+                'rng_state': rng_state(),
+                # As of the epoch's start, when the loader drew from it
+                'loader_rng_state': epoch_loader_rng_state if batch is not None else loader_rng.get_state(),
+            }
+            if batch is not None:
+                own['loss_sum'] = loss_sum + (torch.stack(epoch_losses).sum().item() if epoch_losses else 0.0)
+                own['loss_count'] = loss_count + len(epoch_losses)
+            rank_states = None
+            if world_size > 1:
+                # Every rank reaches the same saves, so gathering here cannot deadlock
+                rank_states = [None] * world_size
+                dist.all_gather_object(rank_states, own)
+            if writer is None:
+                return
+            state = {
+                'epoch': epoch,
+                'batch': batch,
+                'model_state_dict': net.state_dict(),
+                'optimizer_state_dict': optimizer.state_dict(),
+                'scheduler_state_dict': scheduler.state_dict() if scheduler is not None else None,
+                **own,
+                'batch_size': batch_size,
+                'seed': seed,
+                'model_config': model_config or {},
+            }
+            if rank_states is not None:
+                state['world_size'] = world_size
+                state['rank_states'] = rank_states
+            writer.save(state, epoch, batch)
         
         # Training loop
-        for epoch in range(epochs):
-            total_loss = 0
-            for batch in dataloader:
-                optimizer.zero_grad()
+        try:
+            for epoch in range(start_epoch, epochs):
+                sampler.set_epoch(epoch)
+                epoch_loader_rng_state = loader_rng.get_state()
+                if start_sample:
+                    sampler.set_start(start_sample)
+                if self.device.type == "cuda":
+                    torch.cuda.reset_peak_memory_stats()
+
+                on_step = None
+                if checkpoint_every:
+                    offset = start_batch
+
+                    def on_step(batches_done: int, epoch_losses: List[torch.Tensor]):
+                        if (offset + batches_done) % checkpoint_every == 0:
+                            save(epoch + 1, offset + batches_done, epoch_losses)
+
+                start = time.perf_counter()
+                losses, steps = self.run_epoch(model, optimizer, dataloader, style_idx,
+                                               step_fn, bf16, accumulation_steps, on_step)
+                # The only host sync of the epoch
+                totals = torch.tensor([loss_sum + (torch.stack(losses).sum().item() if losses else 0.0),
+                                       float(loss_count + len(losses))], dtype=torch.float64)
+                if world_size > 1:
+                    dist.all_reduce(totals)
+                avg_loss = totals[0].item() / max(1.0, totals[1].item())
+                elapsed = time.perf_counter() - start
+                if rank == 0:
+                    print(f"Epoch {epoch+1}/{epochs}, Loss: {avg_loss:.4f}, "
+                          f"{steps / elapsed:.2f} steps/s, "
+                          f"{len(losses) * batch_size * world_size / elapsed:.1f} samples/s, "
+                          f"peak memory {self.peak_memory_bytes() / 2**20:.0f} MiB")
                 
-                # Forward pass (implement your specific training logic)
-                loss = self._training_step(model, batch)
+                if scheduler is not None:
+                    scheduler.step()
+                start_batch, start_sample, loss_sum, loss_count = 0, 0, 0.0, 0
+                save(epoch + 1, None, losses)
+                if progress is not None and rank == 0:
+                    progress("training", epoch + 1, epochs)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def run_epoch(self, model: nn.Module, optimizer: torch.optim.Optimizer, batches,
+                  style_idx: int, step_fn=None, bf16: bool = False,
+                  accumulation_steps: int = 1,
+                  on_step: Optional[Callable[[int, List[torch.Tensor]], None]] = None
+                  ) -> Tuple[List[torch.Tensor], int]:
+        """
+        Train over one pass of `batches`
+
+        A DistributedDataParallel model only all-reduces gradients on the
+        batch that completes an accumulation group.
+
+        Args:
+            on_step: Called after every optimizer step with the number of
+                batches consumed and the losses so far
+
+        Returns:
+            (detached per-batch losses still on the device, optimizer steps)
+        """
+        step_fn = step_fn or self._training_step
+        model.train()
+        losses = []
+        steps = 0
+        pending = 0
+        optimizer.zero_grad(set_to_none=True)
+        distributed = isinstance(model, DistributedDataParallel)
+        for batch in batches:
+            batch = batch.to(self.device, non_blocking=True)
+            defer_sync = distributed and pending + 1 < accumulation_steps
+            with model.no_sync() if defer_sync else nullcontext():
+                with torch.autocast(self.device.type, dtype=torch.bfloat16, enabled=bf16):
+                    loss = step_fn(model, batch, style_idx)
                 
-                # Backward pass
-                loss.backward()
+                # Backward pass; gradients add up until the optimizer steps
+                (loss / accumulation_steps).backward()
+            losses.append(loss.detach())
+            pending += 1
+            if pending == accumulation_steps:
                 optimizer.step()
-                
-                total_loss += loss.item()
-            
-            avg_loss = total_loss / len(dataloader)
-            print(f"Epoch {epoch+1}/{epochs}, Loss: {avg_loss:.4f}")
-            
-            # Save checkpoint
-            if (epoch + 1) % 10 == 0:
-                self._save_checkpoint(model, genre, epoch + 1)
+                optimizer.zero_grad(set_to_none=True)
+                steps += 1
+                pending = 0
+                if on_step is not None:
+                    on_step(len(losses), losses)
+
+        if pending:
+            # Rescale the gradients of a short final group to a mean over its batches
+            world_size = dist.get_world_size() if distributed else 1
+            for param in model.parameters():
+                if param.grad is not None:
+                    if distributed:
+                        # The group ended under no_sync, so its gradients were never reduced
+                        dist.all_reduce(param.grad)
+                    param.grad.mul_(accumulation_steps / (pending * world_size))
+            optimizer.step()
+            optimizer.zero_grad(set_to_none=True)
+            steps += 1
+        return losses, steps
+
+    def peak_memory_bytes(self) -> int:
+        """Peak device memory on GPU, peak resident set size on CPU"""
+        if self.device.type == "cuda":
+            return torch.cuda.max_memory_allocated()
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    @staticmethod
+    def style_index(genre: str) -> int:
+        """Style embedding index of a genre, in AudioProcessor's genre order"""
+        key = genre.lower().replace("-", "")
+        if key not in STYLE_GENRES:
+            raise ValueError(f"Unknown genre {genre}, expected one of {', '.join(STYLE_GENRES)}")
+        return STYLE_GENRES.index(key)
     
-    def _create_model(self):
-        """Create the model architecture (implement your specific architecture)"""
-        # This is a placeholder - implement your actual model architecture
-        raise NotImplementedError("Implement your model architecture")
+    def _create_model(self, config: Optional[Dict] = None):
+        """Create the model architecture"""
+        return MusicGenerationModel(**(config or {}))
     
-    def _training_step(self, model, batch):
-        """Implement your specific training logic"""
-        # This is a placeholder - implement your actual training step
-        raise NotImplementedError("Implement your training step")
+    def _training_step(self, model, batch, style_idx: int = 0):
+        """Reconstruction loss of the model in a genre's style"""
+        style = torch.full((batch.shape[0],), style_idx, dtype=torch.long, device=batch.device)
+        output = model(batch, style)
+        return torch.nn.functional.mse_loss(output.float(), batch)
     
-    def _save_checkpoint(self, model, genre: str, epoch: int):
-        """Save a model checkpoint"""
-        checkpoint_path = self.models_dir / genre / f"checkpoint_epoch_{epoch}.pt"
-        checkpoint_path.parent.mkdir(exist_ok=True)
-        
-        torch.save({
-            'epoch': epoch,
-            'model_state_dict': model.state_dict(),
-        }, str(checkpoint_path))
-
     def load_model(self, genre: str, epoch: int = None):
         """
         Load a trained model for a specific genre
@@ -159,17 +656,17 @@ class GenreModelTrainer:
         genre_dir = self.models_dir / genre
         if not epoch:
             # Find latest checkpoint
-            checkpoints = list(genre_dir.glob("checkpoint_epoch_*.pt"))
-            if not checkpoints:
+            checkpoint_path = latest_checkpoint(genre_dir)
+            if checkpoint_path is None:
                 raise ValueError(f"No checkpoints found for genre {genre}")
-            checkpoint_path = max(checkpoints, key=lambda p: int(p.stem.split('_')[-1]))
         else:
-            checkpoint_path = genre_dir / f"checkpoint_epoch_{epoch}.pt"
+            checkpoint_path = genre_dir / checkpoint_name(epoch)
         
         if not checkpoint_path.exists():
             raise ValueError(f"Checkpoint {checkpoint_path} not found")
         
-        model = self._create_model()
-        checkpoint = torch.load(str(checkpoint_path))
+        # Full checkpoints hold RNG states, which weights_only loading rejects
+        checkpoint = torch.load(str(checkpoint_path), map_location="cpu", weights_only=False)
+        model = self._create_model(checkpoint.get('model_config'))
         model.load_state_dict(checkpoint['model_state_dict'])
         return model
@@ -1,13 +1,44 @@
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
+
+ATTENTION_MODES = ["full", "local"]
 
 class MusicGenerationModel(nn.Module):
     def __init__(self, 
                  input_size: int = 256,
                  hidden_size: int = 512,
                  num_layers: int = 4,
-                 dropout: float = 0.1):
+                 dropout: float = 0.1,
+                 attention: str = "full",
+                 window_size: int = 512,
+                 downsample: int = 1):
+        """
+        Convolutional encoder/decoder around a style-conditioned transformer
+
+        The encoder turns every 8 samples into one token. With "full"
+        attention every token attends to every other, so time and memory
+        grow quadratically with the input length. "local" attention splits
+        the tokens into blocks of `window_size` and attends within blocks
+        only; every second layer shifts the blocks by half a window so
+        information crosses block borders. Its cost grows linearly with the
+        input length, and it uses the same weights as full attention.
+        `downsample` adds a strided convolution that merges that many tokens
+        before the transformer, and a matching transposed convolution after.
+
+        Args:
+            attention: "full" or "local"
+            window_size: Tokens per block for local attention
+            downsample: Extra token reduction before the transformer (1 for none)
+        """
         super().__init__()
+        if attention not in ATTENTION_MODES:
+            raise ValueError(f"Unknown attention {attention}, expected one of {', '.join(ATTENTION_MODES)}")
+        if window_size < 2 or downsample < 1:
+            raise ValueError("window_size must be at least 2 and downsample at least 1")
+        self.attention = attention
+        self.window_size = window_size
+        self.downsample = downsample
         
         # Encoder
         self.encoder = nn.Sequential(
@@ -22,6 +53,14 @@ class MusicGenerationModel(nn.Module):
             nn.MaxPool1d(2),
         )
         
+        # Optional strided stage, created only when used so default checkpoints load unchanged
+        if downsample > 1:
+            self.token_downsample = nn.Conv1d(128, 128, kernel_size=downsample, stride=downsample)
+            self.token_upsample = nn.ConvTranspose1d(128, 128, kernel_size=downsample, stride=downsample)
+        
+        # Project encoder features plus style onto the transformer width
+        self.input_projection = nn.Linear(128 + hidden_size, hidden_size)
+        
         # Transformer layers
         encoder_layer = nn.TransformerEncoderLayer(
             d_model=hidden_size,
@@ -34,6 +73,9 @@ class MusicGenerationModel(nn.Module):
             num_layers=num_layers
         )
         
+        # Back to the decoder's channel count
+        self.output_projection = nn.Conv1d(hidden_size, 128, kernel_size=1)
+        
         # Decoder
         self.decoder = nn.Sequential(
             nn.ConvTranspose1d(128, 64, kernel_size=4, stride=2, padding=1),
@@ -52,6 +94,10 @@ class MusicGenerationModel(nn.Module):
         
         # Encode
         x = self.encoder(x)  # [batch_size, 128, sequence_length/8]
+        num_tokens = x.size(-1)
+        if self.downsample > 1:
+            x = F.pad(x, (0, -num_tokens % self.downsample))
+            x = self.token_downsample(x)  # [batch_size, 128, sequence_length/8/downsample]
         
         # Reshape for transformer
         x = x.permute(2, 0, 1)  # [sequence_length/8, batch_size, 128]
@@ -62,18 +108,51 @@ class MusicGenerationModel(nn.Module):
         
         # Combine features with style
         x = torch.cat([x, style], dim=-1)  # [sequence_length/8, batch_size, 128 + hidden_size]
+        x = self.input_projection(x)  # [sequence_length/8, batch_size, hidden_size]
         
         # Transform
-        x = self.transformer(x)  # [sequence_length/8, batch_size, hidden_size]
+        # Local models always take the blocked path, even for inputs of one
+        # block or less, so a traced graph is correct for every length
+        if self.attention == "local":
+            x = self._local_transformer(x)
+        else:
+            x = self.transformer(x)  # [sequence_length/8, batch_size, hidden_size]
         
         # Reshape for decoder
         x = x.permute(1, 2, 0)  # [batch_size, hidden_size, sequence_length/8]
+        x = self.output_projection(x)  # [batch_size, 128, sequence_length/8]
+        if self.downsample > 1:
+            x = self.token_upsample(x)[..., :num_tokens]
         
         # Decode
         x = self.decoder(x)  # [batch_size, 1, sequence_length]
         
         return x
     
+    def _local_transformer(self, x):
+        """Run the transformer layers with attention restricted to blocks of window_size tokens"""
+        for i, layer in enumerate(self.transformer.layers):
+            x = self._blocked(layer, x, self.window_size // 2 if i % 2 else 0)
+        return x
+    
+    def _blocked(self, layer: nn.Module, x, offset: int):
+        # Pad so that blocks start `offset` tokens before the first token,
+        # fold the blocks into the batch, and mask the padding
+        length, batch, hidden = x.shape
+        window = self.window_size
+        end = -(offset + length) % window
+        x = F.pad(x, (0, 0, 0, 0, offset, end))  # [num_blocks * window, batch_size, hidden_size]
+        num_blocks = x.size(0) // window
+        x = x.view(num_blocks, window, batch, hidden).transpose(0, 1).reshape(window, num_blocks * batch, hidden)
+        
+        padding = torch.ones(num_blocks * window, dtype=torch.bool, device=x.device)
+        padding[offset:offset + length] = False
+        padding = padding.view(num_blocks, 1, window).expand(num_blocks, batch, window).reshape(-1, window)
+        
+        x = layer(x, src_key_padding_mask=padding)  # [window_size, num_blocks * batch_size, hidden_size]
+        x = x.reshape(window, num_blocks, batch, hidden).transpose(0, 1).reshape(num_blocks * window, batch, hidden)
+        return x[offset:offset + length]
+    
     def generate(self, input_sequence, style_idx, max_length=65536):
         """Generate a new sequence in the specified style"""
         self.eval()
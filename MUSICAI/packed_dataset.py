@@ -0,0 +1,349 @@
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import librosa
+import numpy as np
+
+INDEX_FILE = "index.json"
+# Entries of datasets written before index.json named its entries file
+ENTRIES_FILE = "entries.npy"
+
+# One row per stored signal: which shard, where it starts and how long it is
+ENTRY_DTYPE = np.dtype([
+    ("shard", np.int32),
+    ("offset", np.int64),
+    ("length", np.int64),
+    ("source", np.int32),
+])
+
+DTYPES = {"float32": np.float32, "int16": np.int16}
+
+
+def is_packed(path: str) -> bool:
+    """Whether a directory holds a packed dataset"""
+    return (Path(path) / INDEX_FILE).exists()
+
+
+class ShardWriter:
+    def __init__(self, out_dir: str, sample_rate: int = 44100, dtype: str = "float32",
+                 frame_length: int = 65536, hop_length: int = 32768,
+                 shard_bytes: int = 1024 ** 3, append: bool = False):
+        """
+        Write audio into large raw sample shards plus an index
+
+        Every added signal is stored once, contiguously, in the current
+        shard file (`shard_0000_00000.bin`, ...). An entries file maps each
+        signal to (shard, offset, length, source) and `index.json` holds the
+        format metadata, source names and the name of the entries file.
+        Training frames are cut from the stored signals by the reader using
+        `frame_length` and `hop_length`, so overlapping frames are not
+        duplicated on disk.
+
+        The index is written on close. Every close writes a new entries file
+        (`entries_000001.npy`, ...) and then swaps in `index.json`, which is
+        the single commit point. Replacing a dataset writes its shards under
+        a new generation prefix. The old shards and entries files are only
+        deleted after the swap, so an interrupted write leaves the previous
+        dataset intact and readable.
+
+        Args:
+            out_dir: Dataset directory
+            sample_rate: Sample rate of the added audio
+            dtype: "float32" (readable without conversion) or "int16" (half the size)
+            frame_length: Samples per training frame
+            hop_length: Samples between the starts of consecutive frames
+            shard_bytes: Size at which a new shard is started
+            append: Add to an existing dataset instead of replacing it
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown sample dtype {dtype}, expected one of {', '.join(DTYPES)}")
+
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.shard_bytes = shard_bytes
+        self.meta = {
+            "version": 1,
+            "dtype": dtype,
+            "sample_rate": sample_rate,
+            "frame_length": frame_length,
+            "hop_length": hop_length,
+            "generation": 0,
+            "revision": 0,
+            "entries": None,
+            "shards": [],
+            "sources": [],
+        }
+        self.entries: List[Tuple[int, int, int, int]] = []
+        self._replace = not (append and is_packed(out_dir))
+
+        if not self._replace:
+            meta, entries = read_index(out_dir)
+            if (meta["dtype"], meta["sample_rate"]) != (dtype, sample_rate):
+                raise Exception(f"Cannot append {dtype} at {sample_rate} Hz to a "
+                                f"{meta['dtype']} dataset at {meta['sample_rate']} Hz")
+            self.meta = meta
+            self.meta.setdefault("generation", 0)
+            self.meta.setdefault("revision", 0)
+            self.entries = [tuple(int(v) for v in row) for row in entries]
+        elif is_packed(out_dir):
+            # Never reuse the names the current index points at
+            meta = read_meta(out_dir)
+            self.meta["generation"] = meta.get("generation", 0) + 1
+            self.meta["revision"] = meta.get("revision", 0)
+
+        self._file = None
+        self._shard_samples = 0
+
+    def add(self, samples: np.ndarray, source: str) -> int:
+        """
+        Append a mono signal
+
+        Args:
+            samples: Float samples in [-1, 1], or samples already in the
+                storage dtype
+            source: Name of the file the samples came from
+
+        Returns:
+            Index of the new entry
+        """
+        itemsize = np.dtype(DTYPES[self.meta["dtype"]]).itemsize
+        if self._file is None or self._shard_samples * itemsize >= self.shard_bytes:
+            self._next_shard()
+
+        if samples.dtype == DTYPES[self.meta["dtype"]]:
+            data = np.ascontiguousarray(samples)
+        elif self.meta["dtype"] == "int16":
+            data = (np.clip(samples, -1.0, 1.0) * 32767.0).astype(np.int16)
+        else:
+            data = np.ascontiguousarray(samples, dtype=np.float32)
+
+        self._file.write(data.tobytes())
+        shard = len(self.meta["shards"]) - 1
+        self.entries.append((shard, self._shard_samples, len(data), self._source_id(source)))
+        self._shard_samples += len(data)
+        self.meta["shards"][shard]["samples"] = self._shard_samples
+        return len(self.entries) - 1
+
+    def remove(self, sources: Iterable[str]) -> int:
+        """
+        Drop the entries of the given sources from the index
+
+        Their samples stay in the shards until the dataset is compacted.
+
+        Returns:
+            Number of entries removed
+        """
+        sources = set(sources)
+        removed = {i for i, name in enumerate(self.meta["sources"]) if name in sources}
+        kept = [entry for entry in self.entries if entry[3] not in removed]
+        count = len(self.entries) - len(kept)
+        self.entries = kept
+        return count
+
+    def dead_fraction(self) -> float:
+        """Share of shard samples no longer referenced by any entry"""
+        total = sum(shard["samples"] for shard in self.meta["shards"])
+        live = sum(entry[2] for entry in self.entries)
+        return 1.0 - live / total if total else 0.0
+
+    def close(self):
+        """Flush the open shard and write the index"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+        # A fresh entries file, so the one the current index names is untouched
+        self.meta["revision"] += 1
+        self.meta["entries"] = f"entries_{self.meta['revision']:06d}.npy"
+        with open(self.out_dir / self.meta["entries"], "wb") as f:
+            np.save(f, np.array(self.entries, dtype=ENTRY_DTYPE))
+
+        # Swapping in the index publishes the shards and entries at once
+        tmp_path = self.out_dir / (INDEX_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.meta, f, indent=1)
+        os.replace(tmp_path, self.out_dir / INDEX_FILE)
+
+        # Files of the previous index or of interrupted writes
+        for stale in self.out_dir.glob("entries*.npy"):
+            if stale.name != self.meta["entries"]:
+                stale.unlink()
+        if self._replace:
+            current = {shard["file"] for shard in self.meta["shards"]}
+            for stale in self.out_dir.glob("shard_*.bin"):
+                if stale.name not in current:
+                    stale.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _next_shard(self):
+        if self._file is not None:
+            self._file.close()
+        name = f"shard_{self.meta['generation']:04d}_{len(self.meta['shards']):05d}.bin"
+        self.meta["shards"].append({"file": name, "samples": 0})
+        self._file = open(self.out_dir / name, "wb")
+        self._shard_samples = 0
+
+    def _source_id(self, source: str) -> int:
+        sources = self.meta["sources"]
+        if not sources or sources[-1] != source:
+            sources.append(source)
+        return len(sources) - 1
+
+
+def read_meta(path: str) -> Dict:
+    """Metadata of a packed dataset"""
+    with open(Path(path) / INDEX_FILE) as f:
+        return json.load(f)
+
+
+def read_index(path: str, retries: int = 3) -> Tuple[Dict, np.ndarray]:
+    """Return (metadata, entries) of a packed dataset"""
+    path = Path(path)
+    for attempt in range(retries):
+        meta = read_meta(str(path))
+        try:
+            return meta, np.load(path / (meta.get("entries") or ENTRIES_FILE))
+        except FileNotFoundError:
+            # A writer published a newer index and deleted these entries
+            if attempt == retries - 1:
+                raise
+
+
+class PackedReader:
+    def __init__(self, path: str):
+        """
+        Random access to the frames of a packed dataset
+
+        Shards are opened lazily as copy-on-write memory maps, so float32
+        frames are returned as views of the page cache without copying and
+        can be wrapped with torch.from_numpy. int16 shards are converted to
+        float32 on read. Open maps are not pickled, so a reader can be sent
+        to DataLoader worker processes.
+
+        Args:
+            path: Dataset directory written by ShardWriter
+        """
+        self.path = Path(path)
+        self.meta, self.entries = read_index(path)
+        self.sample_rate = self.meta["sample_rate"]
+        self.frame_length = self.meta["frame_length"]
+        self.hop_length = self.meta["hop_length"]
+        self.sources = self.meta["sources"]
+
+        # Frame i starts `frame_starts[i]` samples into entry `frame_entries[i]`;
+        # signals shorter than a frame contribute one zero-padded frame
+        lengths = self.entries["length"]
+        counts = np.maximum(1, 1 + (lengths - self.frame_length) // self.hop_length)
+        self.frame_entries = np.repeat(np.arange(len(self.entries)), counts)
+        first_frame = np.cumsum(counts) - counts
+        self.frame_starts = (np.arange(len(self.frame_entries)) - first_frame[self.frame_entries]) * self.hop_length
+
+        self._maps: Dict[int, np.memmap] = {}
+
+    def __len__(self):
+        return len(self.frame_entries)
+
+    def frame(self, idx: int) -> np.ndarray:
+        """Samples of frame `idx` as float32, zero-padded to frame_length"""
+        entry = self.entries[self.frame_entries[idx]]
+        start = int(self.frame_starts[idx])
+        length = min(self.frame_length, int(entry["length"]) - start)
+        offset = int(entry["offset"]) + start
+        samples = self._shard(int(entry["shard"]))[offset:offset + length]
+
+        if samples.dtype == np.int16:
+            samples = samples.astype(np.float32) / 32768.0
+        if length < self.frame_length:
+            samples = np.pad(samples, (0, self.frame_length - length))
+        return samples
+
+    def source(self, idx: int) -> str:
+        return self.sources[int(self.entries[self.frame_entries[idx]]["source"])]
+
+    def _shard(self, shard: int) -> np.memmap:
+        data = self._maps.get(shard)
+        if data is None:
+            info = self.meta["shards"][shard]
+            data = np.memmap(self.path / info["file"], dtype=DTYPES[self.meta["dtype"]],
+                             mode="c", shape=(info["samples"],))
+            self._maps[shard] = data
+        return data
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_maps"] = {}
+        return state
+
+
+def compact_dataset(path: str) -> int:
+    """
+    Rewrite a packed dataset keeping only the samples its index references
+
+    Returns:
+        Bytes reclaimed
+    """
+    path = Path(path)
+    reader = PackedReader(str(path))
+    before = sum((path / shard["file"]).stat().st_size for shard in reader.meta["shards"])
+
+    # The new generation is written next to the old one, which stays
+    # readable until the writer swaps in the new index
+    writer = ShardWriter(str(path), reader.sample_rate, reader.meta["dtype"],
+                         reader.frame_length, reader.hop_length)
+    for shard, offset, length, source in reader.entries:
+        writer.add(reader._shard(int(shard))[offset:offset + length], reader.sources[source])
+    del reader
+    writer.close()
+    after = sum((path / shard["file"]).stat().st_size for shard in writer.meta["shards"])
+    return before - after
+
+
+def convert_directory(audio_dir: str, out_dir: str, sample_rate: int = 44100,
+                      dtype: str = "float32", frame_length: int = 65536,
+                      hop_length: Optional[int] = None, pattern: str = "*.wav") -> int:
+    """
+    Pack a directory of audio files, e.g. an old per-segment WAV dataset
+
+    Each file becomes one entry. The hop defaults to the frame length, so
+    pre-cut segments map to exactly one frame each.
+
+    Returns:
+        Number of files packed
+    """
+    files = sorted(Path(audio_dir).glob(pattern))
+    with ShardWriter(out_dir, sample_rate, dtype, frame_length,
+                     hop_length or frame_length) as writer:
+        for file in files:
+            try:
+                y, _ = librosa.load(str(file), sr=sample_rate)
+                writer.add(y, file.name)
+            except Exception as e:
+                print(f"Error processing {file}: {str(e)}")
+    return len(files)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack an audio directory into a sharded training dataset")
+    parser.add_argument("--input", type=str, required=True,
+                      help="Directory of audio files to convert")
+    parser.add_argument("--output", type=str, required=True,
+                      help="Directory for the packed dataset (may equal --input)")
+    parser.add_argument("--dtype", type=str, default="float32", choices=list(DTYPES),
+                      help="Sample storage type")
+    parser.add_argument("--pattern", type=str, default="*.wav",
+                      help="Glob selecting the files to convert")
+    parser.add_argument("--hop-length", type=int, default=None,
+                      help="Frame hop (default: frame length, one frame per pre-cut segment)")
+
+    args = parser.parse_args()
+    count = convert_directory(args.input, args.output, dtype=args.dtype,
+                              hop_length=args.hop_length, pattern=args.pattern)
+    print(f"Packed {count} files into {args.output}")
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import librosa
+import numpy as np
+
+
+class PCMCache:
+    def __init__(self, cache_dir: str, max_bytes: int):
+        """
+        Cache of decoded, resampled audio stored as memory-mapped .npy files
+
+        Entries are keyed by the SHA-256 of the source file's content and the
+        sample rate, so renamed or re-downloaded copies of the same audio
+        share an entry. Cached PCM is returned as a read-only memory map;
+        callers that need to modify it must copy. When the cache exceeds
+        `max_bytes`, the least recently used entries are deleted. The
+        directory is created on the first write.
+
+        Args:
+            cache_dir: Directory holding the .npy files
+            max_bytes: Disk budget for the cache
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+        # (path, size, mtime_ns) -> content hash, so unchanged files are hashed once
+        self._hashes: Dict[Tuple[str, int, int], str] = {}
+        # key -> [lock, holders]; an entry lives only while someone holds or waits for it
+        self._key_locks: Dict[str, List] = {}
+        self._lock = threading.Lock()
+
+    def content_hash(self, path: str) -> str:
+        """SHA-256 of a file's content, memoized by path, size and mtime"""
+        stat = os.stat(path)
+        signature = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._hashes.get(signature)
+        if cached is not None:
+            return cached
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+
+        with self._lock:
+            self._hashes[signature] = digest.hexdigest()
+        return digest.hexdigest()
+
+    def load(self, path: str, sr: Optional[int] = 44100) -> Tuple[np.ndarray, int]:
+        """
+        Decode an audio file to mono float32, reading through the cache
+
+        Args:
+            path: Source audio file
+            sr: Target sample rate, or None for the file's native rate
+
+        Returns:
+            (read-only memory-mapped samples, sample rate)
+        """
+        if sr is None:
+            sr = librosa.get_samplerate(path)
+
+        key = f"{self.content_hash(path)}_{sr}"
+        entry = self.cache_dir / f"{key}.npy"
+
+        # Concurrent misses for the same entry decode once
+        with self._key_lock(key):
+            if entry.exists():
+                os.utime(entry)
+            else:
+                y, _ = librosa.load(path, sr=sr)
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(prefix=f"{key}.", suffix=".tmp", dir=str(self.cache_dir))
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        np.save(f, y.astype(np.float32, copy=False))
+                    os.replace(tmp_path, entry)
+                except BaseException:
+                    os.remove(tmp_path)
+                    raise
+                self._evict(keep=entry)
+
+            return np.load(str(entry), mmap_mode="r"), sr
+
+    @contextmanager
+    def _key_lock(self, key: str):
+        """Hold the lock of one cache entry, dropping it once nobody needs it"""
+        with self._lock:
+            slot = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del self._key_locks[key]
+
+    def _evict(self, keep: Path):
+        entries = []
+        for path in self.cache_dir.glob("*.npy"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                # Existing memory maps stay valid after unlink
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+pcm_cache = PCMCache(
+    os.environ.get("PCM_CACHE_DIR", "cache/pcm"),
+    int(os.environ.get("PCM_CACHE_MAX_BYTES", 4 * 1024 ** 3))
+)
@@ -0,0 +1,73 @@
+from typing import Dict
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+PRECISIONS = ("fp32", "int8", "bf16")
+
+
+class AutocastInference(nn.Module):
+    def __init__(self, model: nn.Module, dtype: torch.dtype = torch.bfloat16):
+        """
+        Run a model under CPU autocast and return fp32 outputs
+
+        Args:
+            model: Model to wrap
+            dtype: Autocast compute dtype
+        """
+        super().__init__()
+        self.model = model
+        self.dtype = dtype
+
+    def forward(self, x, style_idx):
+        with torch.autocast("cpu", dtype=self.dtype):
+            output = self.model(x, style_idx)
+        return output.float()
+
+
+def apply_precision(model: nn.Module, precision: str) -> nn.Module:
+    """
+    Prepare an eval-mode model for inference at the given precision
+
+    Args:
+        model: fp32 model
+        precision: "fp32", "int8" (dynamic quantization of the linear layers)
+            or "bf16" (autocast)
+    """
+    if precision == "fp32":
+        return model
+    if precision == "int8":
+        # In place, so memory-mapped fp32 weights are not copied first
+        return torch.ao.quantization.quantize_dynamic(
+            model, {nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+    if precision == "bf16":
+        return AutocastInference(model, torch.bfloat16).eval()
+    raise ValueError(f"Unknown precision {precision}, expected one of {', '.join(PRECISIONS)}")
+
+
+def model_nbytes(model: nn.Module) -> int:
+    """Bytes held by a model's weights, including packed quantized weights"""
+    def nbytes(value):
+        if isinstance(value, torch.Tensor):
+            return value.numel() * value.element_size()
+        if isinstance(value, (tuple, list)):
+            return sum(nbytes(v) for v in value)
+        return 0
+
+    return sum(nbytes(value) for value in model.state_dict().values())
+
+
+def compare_outputs(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    """
+    Accuracy of a reduced-precision output against the fp32 reference
+
+    Returns:
+        Dict with the signal-to-noise ratio in dB and the mean absolute error
+    """
+    error = reference - candidate
+    noise = float(np.sum(error ** 2))
+    signal = float(np.sum(reference ** 2))
+    snr = float("inf") if noise == 0 else float(10.0 * np.log10(max(signal, 1e-20) / noise))
+    return {"snr_db": snr, "mae": float(np.mean(np.abs(error)))}
@@ -1,16 +1,76 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Iterator, List, Optional
 import asyncio
+import json
+import os
+import tempfile
+import threading
+import numpy as np
 from services.youtube import YouTubeService
 from services.audio_processor import AudioProcessor
 from services.voice_synthesizer import VoiceSynthesizer
+from services.track_mixer import TrackMixer
+from services.result_cache import RemixResultCache
+from services.jobs import Job, JobManager, QueueFullError
+from services.executors import io_executor, run_stage
+from services.precision import PRECISIONS
+from services.streaming import pcm16_bytes, wav_stream_header
 from pathlib import Path
 
+# Disk budget for cached remixes in static/output
+REMIX_CACHE_MAX_BYTES = int(os.environ.get("REMIX_CACHE_MAX_BYTES", 5 * 1024 ** 3))
+OUTPUT_DIR = Path("static/output")
+
+# Downloaded source audio, kept apart from the served remixes under its own budget
+SOURCE_CACHE_DIR = Path(os.environ.get("SOURCE_CACHE_DIR", "cache/sources"))
+SOURCE_CACHE_MAX_BYTES = int(os.environ.get("SOURCE_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+# Memory cap for resident genre models (unlimited when unset)
+MODEL_CACHE_MAX_BYTES = os.environ.get("MODEL_CACHE_MAX_BYTES")
+
+# Inference backend: eager, torchscript or onnxruntime
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "eager")
+
+# Inference precision per genre: fp32, int8 or bf16; MODEL_PRECISION_<GENRE>
+# (e.g. MODEL_PRECISION_HIP_HOP) overrides MODEL_PRECISION
+def _env_precision(genre: str) -> str:
+    """Precision configured for a genre, validated so a typo fails at startup"""
+    name = f"MODEL_PRECISION_{genre.upper().replace('-', '_')}"
+    precision = os.environ.get(name, os.environ.get("MODEL_PRECISION", "fp32"))
+    if precision not in PRECISIONS:
+        raise ValueError(f"Invalid {name if name in os.environ else 'MODEL_PRECISION'} {precision}, "
+                         f"expected one of {', '.join(PRECISIONS)}")
+    return precision
+
+MODEL_PRECISION = {genre: _env_precision(genre) for genre in AudioProcessor.get_supported_genres()}
+
+# Background remix jobs
+REMIX_JOB_QUEUE_SIZE = int(os.environ.get("REMIX_JOB_QUEUE_SIZE", 100))
+REMIX_JOB_WORKERS = int(os.environ.get("REMIX_JOB_WORKERS", 2))
+REMIX_JOB_RETENTION_SECONDS = float(os.environ.get("REMIX_JOB_RETENTION_SECONDS", 3600))
+
+# YouTube search and video info caching; YOUTUBE_CACHE_PATH persists it in SQLite
+YOUTUBE_CACHE_TTL = float(os.environ.get("YOUTUBE_CACHE_TTL", 600))
+YOUTUBE_CACHE_STALE_TTL = float(os.environ.get("YOUTUBE_CACHE_STALE_TTL", 6 * 3600))
+YOUTUBE_CACHE_PATH = os.environ.get("YOUTUBE_CACHE_PATH")
+
 router = APIRouter()
-youtube_service = YouTubeService()
-audio_processor = AudioProcessor()
+youtube_service = YouTubeService(
+    cache_ttl=YOUTUBE_CACHE_TTL,
+    cache_stale_ttl=YOUTUBE_CACHE_STALE_TTL,
+    cache_path=YOUTUBE_CACHE_PATH
+)
+audio_processor = AudioProcessor(
+    max_resident_bytes=int(MODEL_CACHE_MAX_BYTES) if MODEL_CACHE_MAX_BYTES else None,
+    precision=MODEL_PRECISION,
+    backend=MODEL_BACKEND
+)
 voice_synthesizer = VoiceSynthesizer()
+track_mixer = TrackMixer(voice_synthesizer)
+remix_cache = RemixResultCache(str(OUTPUT_DIR), REMIX_CACHE_MAX_BYTES)
+source_cache = RemixResultCache(str(SOURCE_CACHE_DIR), SOURCE_CACHE_MAX_BYTES)
 
 class SearchQuery(BaseModel):
     query: str
@@ -30,52 +90,243 @@ async def search_videos(query: SearchQuery):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/remix")
+@router.get("/search/stats")
+async def get_search_stats():
+    return youtube_service.cache_stats()
+
+@router.post("/remix", status_code=202)
 async def create_remix(request: RemixRequest):
+    if not audio_processor.has_model(request.genre):
+        raise HTTPException(status_code=400, detail=f"No trained model available for genre {request.genre}")
+
     try:
-        # Create output directory
-        output_dir = Path("static/output")
-        output_dir.mkdir(parents=True, exist_ok=True)
-
-        # Download the video audio
-        video_path = await youtube_service.download_audio(
-            request.video_id,
-            str(output_dir / f"{request.video_id}.mp3")
-        )
+        job = remix_jobs.submit(request)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
-        # Generate remix
-        remix_path = await audio_processor.create_remix(
-            video_path,
-            request.genre,
-            str(output_dir / f"{request.video_id}_{request.genre}_remix.mp3")
-        )
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}",
+        "events_url": f"/api/jobs/{job.id}/events"
+    }
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = remix_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    job = remix_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        async for state in remix_jobs.events(job):
+            yield f"data: {json.dumps(state)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _run_remix_job(job: Job) -> str:
+    """Job runner for /api/remix; returns the URL of the remixed audio"""
+    request = job.params
+    key = await _remix_key(request.video_id, request.genre, request.lyrics, request.voice_style)
+    remix_path = await remix_cache.get_or_create(key, lambda: _render_remix(request, key, job.report))
+
+    # Return the URL to the remixed audio
+    relative_path = str(Path(remix_path).relative_to(Path("static")))
+    return f"/static/{relative_path}"
+
+async def _remix_key(video_id: str, genre: str, lyrics: Optional[str], voice_style: Optional[str]) -> str:
+    # Hashing a model file is blocking I/O, so it stays off the event loop
+    checksum = await run_stage("decode", audio_processor.model_checksum, genre)
+    return remix_cache.make_key(
+        video_id=video_id,
+        genre=genre,
+        lyrics=lyrics,
+        voice_style=voice_style,
+        model=checksum,
+        precision=audio_processor.model_precision(genre),
+        backend=MODEL_BACKEND
+    )
+
+async def _download_source(video_id: str) -> str:
+    """Downloaded audio of a video, shared by renders and evicted within its budget"""
+    return await source_cache.get_or_create(
+        video_id,
+        lambda: youtube_service.download_audio(video_id, str(SOURCE_CACHE_DIR / video_id))
+    )
+
+remix_jobs = JobManager(
+    _run_remix_job,
+    max_queue_size=REMIX_JOB_QUEUE_SIZE,
+    num_workers=REMIX_JOB_WORKERS,
+    retention_seconds=REMIX_JOB_RETENTION_SECONDS
+)
+
+@router.get("/remix/stream")
+async def stream_remix(video_id: str, genre: str):
+    """
+    Stream a remix as WAV while it renders
+
+    Audio is sent window by window as inference finishes, and the complete
+    file is stored in static/output for later cache hits.
+    """
+    if not audio_processor.has_model(genre):
+        raise HTTPException(status_code=400, detail=f"No trained model available for genre {genre}")
 
-        # Add vocals if provided
-        if request.lyrics and request.voice_style:
-            vocals_path = await voice_synthesizer.generate_vocals(
-                request.lyrics,
-                request.voice_style,
-                str(output_dir),
-                tempo=audio_processor.get_tempo(remix_path),
-                key=audio_processor.get_key(remix_path)
-            )
-            
-            # Mix vocals with remix
-            final_path = str(output_dir / f"{request.video_id}_{request.genre}_final.mp3")
-            await audio_processor.mix_tracks(
-                [remix_path, vocals_path],
-                [0.7, 0.3],  # Mix ratios
-                final_path
-            )
-            remix_path = final_path
-
-        # Return the URL to the remixed audio
-        relative_path = str(Path(remix_path).relative_to(Path("static")))
-        return {"url": f"/static/{relative_path}"}
+    try:
+        key = await _remix_key(video_id, genre, None, None)
+        cached_path = remix_cache.get(key)
+        if cached_path is not None:
+            return FileResponse(cached_path, media_type="audio/wav")
 
+        OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        y, sr = await audio_processor.load_audio(await _download_source(video_id))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    output_path = OUTPUT_DIR / f"{video_id}_{genre}_{key[:16]}.wav"
+    # A partial file per stream, so concurrent streams of one key never share it
+    fd, partial_path = tempfile.mkstemp(prefix=f"{output_path.stem}.", suffix=".partial.wav",
+                                        dir=str(OUTPUT_DIR))
+    os.close(fd)
+    render = _StreamRender(audio_processor.render_blocks(y, sr, genre, Path(partial_path)),
+                           Path(partial_path))
+
+    async def audio_stream():
+        completed = False
+        try:
+            yield wav_stream_header(sr)
+            while True:
+                block = await run_stage("inference", render.step)
+                if block is None:
+                    break
+                yield pcm16_bytes(block)
+            completed = True
+        finally:
+            if completed:
+                os.replace(partial_path, output_path)
+                remix_cache.put(key, str(output_path))
+            else:
+                # Client went away or rendering failed
+                render.cancel()
+
+    return StreamingResponse(audio_stream(), media_type="audio/wav")
+
+class _StreamRender:
+    def __init__(self, blocks: Iterator[np.ndarray], partial_path: Path):
+        """
+        A streamed render whose blocks are produced on worker threads
+
+        A disconnected client cannot close the generator while a worker is
+        still inside it, so cancel() only flags the render and leaves closing
+        the generator and deleting the partial file to a worker that waits
+        for the in-flight block.
+
+        Args:
+            blocks: Generator from AudioProcessor.render_blocks
+            partial_path: File the generator writes
+        """
+        self.blocks = blocks
+        self.partial_path = partial_path
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    def step(self) -> Optional[np.ndarray]:
+        """Next block, or None once the render is finished or cancelled"""
+        with self._lock:
+            if self._cancelled.is_set():
+                return None
+            return next(self.blocks, None)
+
+    def cancel(self):
+        """Stop rendering after the current block and drop the partial file"""
+        self._cancelled.set()
+        io_executor.submit(self._discard)
+
+    def _discard(self):
+        with self._lock:
+            self.blocks.close()
+            if self.partial_path.exists():
+                os.remove(self.partial_path)
+
+def _no_progress(stage: str, current: Optional[int] = None, total: Optional[int] = None):
+    pass
+
+async def _render_remix(request: RemixRequest, key: str, progress=_no_progress) -> str:
+    """Download, remix and optionally add vocals, returning the final file path"""
+    # Create output directory
+    output_dir = OUTPUT_DIR
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Download the video audio
+    progress("downloading")
+    video_path = await _download_source(request.video_id)
+    intermediates = []
+
+    # Intermediates are named after the cache key, so concurrent renders of
+    # the same video and genre with other parameters never share a file
+    name = f"{request.video_id}_{request.genre}_{key[:16]}"
+
+    # Generate remix
+    remix_path = await audio_processor.generate_remix(
+        video_path,
+        request.genre,
+        str(output_dir),
+        progress,
+        output_name=f"{name}_remix.wav"
+    )
+
+    # Add vocals if provided
+    if request.lyrics and request.voice_style:
+        progress("synthesizing vocals")
+        # One analysis pass; the second lookup is served from the cache
+        tempo = await run_stage("decode", audio_processor.get_tempo, remix_path)
+        musical_key = await run_stage("decode", audio_processor.get_key, remix_path)
+        vocals_path = await voice_synthesizer.generate_vocals(
+            request.lyrics,
+            request.voice_style,
+            str(output_dir),
+            tempo=tempo,
+            key=musical_key,
+            output_name=f"{name}_vocals.wav"
+        )
+        intermediates += [remix_path, vocals_path]
+
+        # Mix vocals with remix
+        progress("mixing")
+        final_path = str(output_dir / f"{name}_final.wav")
+        await track_mixer.mix_tracks(
+            [remix_path, vocals_path],
+            [0.7, 0.3],  # Mix ratios
+            str(output_dir),
+            output_path=final_path
+        )
+        remix_path = final_path
+
+    # Store the result under its cache key so different parameters never collide
+    cached_path = output_dir / f"{name}{Path(remix_path).suffix}"
+    os.replace(remix_path, cached_path)
+
+    # Drop per-request intermediates; the downloaded source stays in source_cache
+    for path in intermediates:
+        if os.path.exists(path):
+            os.remove(path)
+
+    return str(cached_path)
+
 @router.get("/genres")
 async def get_genres():
     return {"genres": audio_processor.get_supported_genres()}
+
+@router.get("/inference/stats")
+async def get_inference_stats():
+    return audio_processor.get_inference_stats()
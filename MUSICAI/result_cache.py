@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+# Seconds a cache hit may wait before its new recency is written to the index
+INDEX_SAVE_DELAY = float(os.environ.get("REMIX_CACHE_INDEX_SAVE_DELAY", 5.0))
+
+
+class RemixResultCache:
+    def __init__(self, output_dir: str, max_bytes: int):
+        """
+        Content-addressed cache of rendered remixes
+
+        Entries map a cache key to a file in `output_dir` and are kept in
+        least-recently-used order. When the cached files exceed `max_bytes`,
+        the least recently used ones are deleted. The index is stored next to
+        the files so cached results survive restarts.
+
+        Args:
+            output_dir: Directory holding the rendered files
+            max_bytes: Disk budget for all cached files
+        """
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.index_path = self.output_dir / ".remix_cache.json"
+
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._save_timer: Optional[threading.Timer] = None
+        self._load_index()
+
+    @staticmethod
+    def make_key(**parts) -> str:
+        """Build a cache key from everything that determines the rendered output"""
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached file for a key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if not Path(entry["path"]).exists():
+                # Removed behind our back
+                del self._entries[key]
+                self._schedule_save()
+                return None
+            self._entries.move_to_end(key)
+            # Hits only change the eviction order, so their writes are batched
+            # on a timer thread instead of blocking the event loop per request
+            self._schedule_save()
+            return entry["path"]
+
+    def put(self, key: str, path: str):
+        """Record a rendered file and evict old entries to stay within budget"""
+        size = os.path.getsize(path)
+        with self._lock:
+            self._entries[key] = {"path": str(path), "size": size}
+            self._entries.move_to_end(key)
+            self._evict()
+            self._save_index()
+
+    async def get_or_create(self, key: str, render: Callable[[], Awaitable[str]]) -> str:
+        """
+        Return the cached file for a key, rendering it on a miss
+
+        Concurrent calls with the same key share a single render.
+
+        Args:
+            key: Cache key from make_key
+            render: Coroutine function producing the file path
+        """
+        path = self.get(key)
+        if path is not None:
+            return path
+
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            path = await render()
+            self.put(key, path)
+            future.set_result(path)
+            return path
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so lone failures are not logged twice
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry["size"] for entry in self._entries.values())
+
+    def _evict(self):
+        total = sum(entry["size"] for entry in self._entries.values())
+        # Always keep the most recent entry, even if it alone exceeds the budget
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            total -= entry["size"]
+            try:
+                os.remove(entry["path"])
+            except FileNotFoundError:
+                pass
+
+    def _load_index(self):
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable remix cache index: {str(e)}")
+            return
+        for key, entry in entries:
+            if Path(entry["path"]).exists():
+                self._entries[key] = entry
+
+    def _schedule_save(self):
+        """Save the index after INDEX_SAVE_DELAY, once for all changes until then"""
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(INDEX_SAVE_DELAY, self._flush_index)
+            # Losing a pending save at exit only loses recency, never entries
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _flush_index(self):
+        with self._lock:
+            self._save_timer = None
+            self._save_index()
+
+    def _save_index(self):
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(list(self._entries.items()), f)
+        os.replace(tmp_path, self.index_path)
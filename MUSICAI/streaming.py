@@ -0,0 +1,29 @@
+import struct
+
+import numpy as np
+
+# Placeholder RIFF/data sizes for a stream whose length is unknown up front;
+# players treat 0xFFFFFFFF as "read until the connection closes"
+_UNKNOWN_SIZE = 0xFFFFFFFF
+
+
+def wav_stream_header(sample_rate: int, channels: int = 1) -> bytes:
+    """
+    Header for a 16-bit PCM WAV stream of unknown length
+
+    Args:
+        sample_rate: Sample rate in Hz
+        channels: Number of interleaved channels
+    """
+    block_align = channels * 2
+    return b"".join([
+        b"RIFF", struct.pack("<I", _UNKNOWN_SIZE), b"WAVE",
+        b"fmt ", struct.pack("<IHHIIHH", 16, 1, channels, sample_rate,
+                             sample_rate * block_align, block_align, 16),
+        b"data", struct.pack("<I", _UNKNOWN_SIZE),
+    ])
+
+
+def pcm16_bytes(block: np.ndarray) -> bytes:
+    """Convert float samples in [-1, 1] to little-endian 16-bit PCM"""
+    return (np.clip(block, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
@@ -0,0 +1,123 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services import download_datasets
+from services.download_datasets import download_file
+
+PAYLOAD = os.urandom(10 * 1024 + 123)
+SEGMENT_SIZE = 1024
+
+
+class RangeServer:
+    """Local HTTP server for PAYLOAD that honours single byte ranges"""
+
+    def __init__(self):
+        self.requested = []
+        self.fail_from = None
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _headers(self, status: int, length: int, start: int = 0):
+                self.send_response(status)
+                self.send_header('Content-Length', str(length))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('ETag', '"payload"')
+                if status == 206:
+                    self.send_header('Content-Range', f'bytes {start}-{start + length - 1}/{len(PAYLOAD)}')
+                self.end_headers()
+
+            def do_HEAD(self):
+                self._headers(200, len(PAYLOAD))
+
+            def do_GET(self):
+                start, end = self.headers['Range'].split('=')[1].split('-')
+                start, end = int(start), int(end)
+                server.requested.append(start)
+                if server.fail_from is not None and start >= server.fail_from:
+                    self.send_error(503)
+                    return
+                self._headers(206, end - start + 1, start)
+                self.wfile.write(PAYLOAD[start:end + 1])
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}/dataset.zip'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(download_datasets, 'SEGMENT_SIZE', SEGMENT_SIZE)
+    monkeypatch.setattr(download_datasets.time, 'sleep', lambda seconds: None)
+    server = RangeServer()
+    yield server
+    server.close()
+
+
+def test_ranged_download(server, tmp_path):
+    target = tmp_path / 'dataset.zip'
+    download_file(server.url, target, connections=3)
+
+    assert target.read_bytes() == PAYLOAD
+    assert sorted(server.requested) == list(range(0, len(PAYLOAD), SEGMENT_SIZE))
+    assert not (tmp_path / 'dataset.zip.part').exists()
+    assert not (tmp_path / 'dataset.zip.part.json').exists()
+
+
+def test_resume_fetches_only_missing_segments(server, tmp_path):
+    target = tmp_path / 'dataset.zip'
+    server.fail_from = 5 * SEGMENT_SIZE
+    with pytest.raises(Exception):
+        download_file(server.url, target, connections=1)
+
+    with open(tmp_path / 'dataset.zip.part.json') as f:
+        assert sorted(json.load(f)['done']) == [0, 1, 2, 3, 4]
+
+    server.fail_from = None
+    server.requested.clear()
+    download_file(server.url, target, connections=2)
+
+    assert target.read_bytes() == PAYLOAD
+    assert sorted(server.requested) == list(range(5 * SEGMENT_SIZE, len(PAYLOAD), SEGMENT_SIZE))
+
+
+@pytest.mark.parametrize('part', [None, b'', b'x' * 10])
+def test_state_without_matching_part_is_reset(server, tmp_path, part):
+    target = tmp_path / 'dataset.zip'
+    server.fail_from = 5 * SEGMENT_SIZE
+    with pytest.raises(Exception):
+        download_file(server.url, target, connections=1)
+
+    # The part file is gone or truncated but its state still lists segments
+    part_path = tmp_path / 'dataset.zip.part'
+    if part is None:
+        part_path.unlink()
+    else:
+        part_path.write_bytes(part)
+
+    server.fail_from = None
+    download_file(server.url, target, connections=2)
+
+    assert target.read_bytes() == PAYLOAD
+
+
+def test_checksum_mismatch_discards_download(server, tmp_path):
+    target = tmp_path / 'dataset.zip'
+    with pytest.raises(Exception, match='Checksum mismatch'):
+        download_file(server.url, target, expected_sha256='0' * 64)
+
+    assert not target.exists()
+    assert not (tmp_path / 'dataset.zip.part').exists()
+    assert not (tmp_path / 'dataset.zip.part.json').exists()
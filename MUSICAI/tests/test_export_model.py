@@ -0,0 +1,53 @@
+import importlib.util
+
+import pytest
+import torch
+
+from models.music_model import MusicGenerationModel
+from services.export_model import check_parity, export_genre
+
+# Samples per token of the encoder
+TOKEN = 8
+WINDOW = 16
+
+CONFIGS = {
+    "full": {"hidden_size": 32, "num_layers": 2, "attention": "full"},
+    "local": {"hidden_size": 32, "num_layers": 2, "attention": "local",
+              "window_size": WINDOW, "downsample": 2},
+}
+
+# Traced at 4 local windows; checked at twice that and at a length that is
+# no multiple of a window
+TRACE_LENGTH = 4 * WINDOW * TOKEN
+LENGTHS = [TRACE_LENGTH, 2 * TRACE_LENGTH, 37 * TOKEN]
+
+
+def _onnx_available() -> bool:
+    return all(importlib.util.find_spec(name) for name in ("onnx", "onnxruntime"))
+
+
+@pytest.fixture(params=list(CONFIGS))
+def models_dir(request, tmp_path):
+    torch.manual_seed(0)
+    config = CONFIGS[request.param]
+    model = MusicGenerationModel(**config)
+    (tmp_path / "rock").mkdir()
+    torch.save({"epoch": 1, "model_state_dict": model.state_dict(), "model_config": config},
+               str(tmp_path / "rock" / "latest.pt"))
+    return str(tmp_path)
+
+
+def test_torchscript_parity(models_dir):
+    export_genre(models_dir, "Rock", window_size=TRACE_LENGTH, backends=["torchscript"])
+    errors = check_parity(models_dir, "Rock", LENGTHS, backends=["torchscript"])
+    assert errors["torchscript"] <= 1e-4
+
+
+@pytest.mark.skipif(not _onnx_available(), reason="onnx and onnxruntime are required")
+def test_onnxruntime_parity(models_dir):
+    try:
+        export_genre(models_dir, "Rock", window_size=TRACE_LENGTH, backends=["onnxruntime"])
+    except Exception as e:
+        pytest.skip(f"ONNX exporter unavailable: {str(e).splitlines()[0]}")
+    errors = check_parity(models_dir, "Rock", LENGTHS, backends=["onnxruntime"])
+    assert errors["onnxruntime"] <= 1e-4
@@ -0,0 +1,83 @@
+import copy
+import shutil
+
+import numpy as np
+import pytest
+import torch
+
+from models.music_model import MusicGenerationModel
+from services.benchmark_training import check_training_parity
+from services.checkpointing import checkpoint_name
+from services.model_trainer import GenreModelTrainer, MusicDataset
+from services.packed_dataset import ShardWriter
+
+FRAME = 65536
+# Small enough to train a few steps on a CPU in seconds
+SMALL_MODEL = {"hidden_size": 32, "num_layers": 2, "dropout": 0.0,
+               "attention": "local", "window_size": 64, "downsample": 4}
+
+
+class SmallTrainer(GenreModelTrainer):
+    def _create_model(self, config=None):
+        return MusicGenerationModel(**{**SMALL_MODEL, **(config or {})})
+
+
+def _make_base_dir(path, sources: int = 4, frames_per_source: int = 2):
+    rng = np.random.default_rng(0)
+    with ShardWriter(str(path / "datasets" / "rock"), frame_length=FRAME, hop_length=FRAME) as writer:
+        for i in range(sources):
+            t = np.arange(FRAME * frames_per_source) / 44100
+            signal = 0.3 * np.sin(2 * np.pi * (110 + 55 * i) * t) + 0.05 * rng.standard_normal(len(t))
+            writer.add(signal.astype(np.float32), f"source_{i}.wav")
+    return path
+
+
+@pytest.fixture
+def trainer(tmp_path):
+    return SmallTrainer(str(_make_base_dir(tmp_path)))
+
+
+def test_accumulated_micro_batches_match_full_batch(trainer):
+    dataset = MusicDataset(str(trainer.datasets_dir / "rock"))
+    batch = torch.stack([dataset[i] for i in range(4)])
+
+    torch.manual_seed(0)
+    full = trainer._create_model()
+    accumulated = copy.deepcopy(full)
+    style_idx = trainer.style_index("rock")
+
+    trainer.run_epoch(full, torch.optim.SGD(full.parameters(), lr=0.1), [batch], style_idx)
+    trainer.run_epoch(accumulated, torch.optim.SGD(accumulated.parameters(), lr=0.1),
+                      list(batch.chunk(4)), style_idx, accumulation_steps=4)
+
+    for (name, a), b in zip(full.named_parameters(), accumulated.parameters()):
+        assert torch.allclose(a, b, rtol=1e-4, atol=1e-6), name
+
+
+def test_check_training_parity_with_accumulation(trainer):
+    result = check_training_parity(trainer, "rock", num_steps=3, batch_size=4, bf16=False,
+                                   accumulation_steps=2, rtol=1e-3)
+    assert len(result["fast_losses"]) == 3
+    assert result["max_rel_diff"] <= 1e-3
+
+
+def test_mid_epoch_resume_matches_uninterrupted_run(tmp_path):
+    uninterrupted = SmallTrainer(str(_make_base_dir(tmp_path / "a")))
+    uninterrupted.train_genre_model("rock", epochs=2, batch_size=2, checkpoint_every=1,
+                                    keep_checkpoints=100)
+
+    # Start over from a checkpoint two batches into the second epoch
+    resumed_dir = _make_base_dir(tmp_path / "b")
+    (resumed_dir / "models" / "rock").mkdir(parents=True)
+    mid_epoch = checkpoint_name(2, 2)
+    shutil.copy(tmp_path / "a" / "models" / "rock" / mid_epoch,
+                resumed_dir / "models" / "rock" / mid_epoch)
+    SmallTrainer(str(resumed_dir)).train_genre_model("rock", epochs=2, batch_size=2, resume=True)
+
+    expected = torch.load(str(tmp_path / "a" / "models" / "rock" / checkpoint_name(2)),
+                          weights_only=False)["model_state_dict"]
+    actual = torch.load(str(resumed_dir / "models" / "rock" / checkpoint_name(2)),
+                        weights_only=False)["model_state_dict"]
+    for name, tensor in expected.items():
+        assert torch.equal(tensor, actual[name]), name
+
@@ -1,18 +1,119 @@
+import functools
+import math
+import os
+import tempfile
 import torch
 import librosa
 import numpy as np
 from pathlib import Path
-from typing import List, Dict
+from typing import Iterator, List, Dict, Optional
 import soundfile as sf
+from scipy import signal
 from .voice_synthesizer import VoiceSynthesizer
+from .executors import run_stage
+from .pcm_cache import pcm_cache
+from .audio_analysis import audio_analyzer
+
+# Samples per track read, resampled and mixed at a time
+MIX_BLOCK_SIZE = int(os.environ.get("MIX_BLOCK_SIZE", 65536))
+
+@functools.lru_cache(maxsize=None)
+def polyphase_filter(up: int, down: int) -> np.ndarray:
+    """
+    Anti-aliasing filter for resampling by up/down, split into its phases
+
+    Same design as scipy.signal.resample_poly. Row p holds the taps applied
+    to consecutive input samples, newest first, for outputs of phase p.
+    """
+    half_len = 10 * max(up, down)
+    taps = signal.firwin(2 * half_len + 1, 1.0 / max(up, down), window=("kaiser", 5.0)) * up
+    taps = np.pad(taps, (0, -len(taps) % up))
+    return np.ascontiguousarray(taps.reshape(-1, up).T, dtype=np.float32)
+
+class StreamResampler:
+    def __init__(self, orig_sr: int, target_sr: int):
+        """
+        Polyphase resampler fed one block at a time
+
+        Keeps the input samples the filter still needs between blocks, so
+        concatenated outputs match resampling the whole signal at once.
+        """
+        divisor = math.gcd(orig_sr, target_sr)
+        self.up = target_sr // divisor
+        self.down = orig_sr // divisor
+        self.phases = polyphase_filter(self.up, self.down)
+        self.num_taps = self.phases.shape[1]
+        self.delay = 10 * max(self.up, self.down)
+        
+        # Input buffer starting at absolute sample `self.start`; zeros before the signal
+        self.buffer = np.zeros(self.num_taps, dtype=np.float32)
+        self.start = -self.num_taps
+        self.consumed = 0
+        self.produced = 0
+        
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Resample the next block; output lags the input by the filter's reach"""
+        self.buffer = np.concatenate([self.buffer, block.astype(np.float32, copy=False)])
+        self.consumed += len(block)
+        return self._emit(self._available(self.consumed))
+    
+    def flush(self) -> np.ndarray:
+        """Output still owed for the samples seen so far"""
+        total = -(-self.consumed * self.up // self.down)
+        self.buffer = np.concatenate([self.buffer, np.zeros(self.num_taps, dtype=np.float32)])
+        return self._emit(total)
+    
+    def _available(self, consumed: int) -> int:
+        # Output n needs input up to (n * down + delay) // up
+        return max(self.produced, -(-(consumed * self.up - self.delay) // self.down))
+    
+    def _emit(self, end: int) -> np.ndarray:
+        n = np.arange(self.produced, end)
+        position = n * self.down + self.delay
+        newest, phase = position // self.up - self.start, position % self.up
+        windows = newest[:, None] - np.arange(self.num_taps)[None, :]
+        output = np.einsum("ij,ij->i", self.phases[phase], self.buffer[windows])
+        self.produced = end
+        
+        # Drop input no longer reachable by the next output
+        keep_from = (end * self.down + self.delay) // self.up - self.num_taps + 1 - self.start
+        keep_from = max(0, min(keep_from, len(self.buffer)))
+        self.buffer = self.buffer[keep_from:]
+        self.start += keep_from
+        return output.astype(np.float32, copy=False)
+
+def _track_rate(path: str) -> int:
+    try:
+        return sf.info(path).samplerate
+    except RuntimeError:
+        return librosa.get_samplerate(path)
+
+def _track_blocks(path: str, sr: int, block_size: int) -> Iterator[np.ndarray]:
+    """Mono float32 blocks of a track at `sr`"""
+    try:
+        f = sf.SoundFile(path)
+    except RuntimeError:
+        # Formats libsndfile can't read are decoded once into the memory-mapped cache
+        y, _ = pcm_cache.load(path, sr=sr)
+        for start in range(0, len(y), block_size):
+            yield np.array(y[start:start + block_size], dtype=np.float32)
+        return
+    
+    with f:
+        resampler = StreamResampler(f.samplerate, sr) if f.samplerate != sr else None
+        for block in f.blocks(blocksize=block_size, dtype="float32", always_2d=True):
+            mono = block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+            yield resampler.process(mono) if resampler is not None else mono
+        if resampler is not None:
+            yield resampler.flush()
 
 class TrackMixer:
-    def __init__(self):
+    def __init__(self, voice_synth: Optional[VoiceSynthesizer] = None):
         """Initialize track mixer with voice synthesizer"""
-        self.voice_synth = VoiceSynthesizer()
+        self.voice_synth = voice_synth or VoiceSynthesizer()
         
     async def mix_tracks(self, track_paths: List[str], mix_ratios: List[float], 
-                        output_dir: str) -> str:
+                        output_dir: str, output_path: Optional[str] = None) -> str:
         """
         Mix multiple tracks together with specified ratios
         
@@ -20,6 +121,22 @@ class TrackMixer:
             track_paths: List of paths to audio files
             mix_ratios: List of mixing ratios (should sum to 1.0)
             output_dir: Directory to save mixed track
+            output_path: WAV file to write instead of <output_dir>/mixed_track.wav
+        """
+        return await run_stage("mix", self._mix_tracks, track_paths, mix_ratios, output_dir,
+                               output_path)
+
+    def _mix_tracks(self, track_paths: List[str], mix_ratios: List[float],
+                    output_dir: str, output_path: Optional[str] = None,
+                    block_size: int = MIX_BLOCK_SIZE) -> str:
+        """
+        Blocking implementation of mix_tracks
+
+        Tracks are read, resampled to the first track's rate and summed
+        `block_size` samples at a time into a float WAV next to the output,
+        while the peak is tracked. A second pass over that file applies the
+        peak normalization and writes the final 16-bit WAV, so memory stays
+        proportional to the block size and number of tracks, not their length.
         """
         if len(track_paths) != len(mix_ratios):
             raise ValueError("Number of tracks must match number of mix ratios")
@@ -27,37 +144,54 @@ class TrackMixer:
         if not np.isclose(sum(mix_ratios), 1.0):
             raise ValueError("Mix ratios must sum to 1.0")
         
-        # Load and process each track
-        mixed = None
-        sr = None
+        # Set sample rate from first track
+        sr = _track_rate(track_paths[0])
+        sources = [_track_blocks(path, sr, block_size) for path in track_paths]
+        pending = [np.zeros(0, dtype=np.float32) for _ in track_paths]
+        active = [True] * len(track_paths)
         
-        for track_path, ratio in zip(track_paths, mix_ratios):
-            # Load audio
-            y, current_sr = librosa.load(track_path, sr=None)
-            
-            # Set sample rate from first track
-            if sr is None:
-                sr = current_sr
-            elif current_sr != sr:
-                y = librosa.resample(y, orig_sr=current_sr, target_sr=sr)
+        output_path = Path(output_path) if output_path else Path(output_dir) / "mixed_track.wav"
+        # Unique per call, so concurrent mixes into one directory never share it
+        fd, unnormalized_path = tempfile.mkstemp(suffix=".mixing.wav", dir=str(output_path.parent))
+        os.close(fd)
+        unnormalized_path = Path(unnormalized_path)
+        peak = 0.0
+        try:
+            with sf.SoundFile(str(unnormalized_path), "w", samplerate=sr, channels=1,
+                              subtype="FLOAT") as out:
+                while any(active) or any(len(p) for p in pending):
+                    # Top every track up to one block; shorter tracks end in silence
+                    for i, source in enumerate(sources):
+                        while active[i] and len(pending[i]) < block_size:
+                            block = next(source, None)
+                            if block is None:
+                                active[i] = False
+                            elif len(block):
+                                pending[i] = np.concatenate([pending[i], block])
+                    
+                    length = max(min(len(p), block_size) for p in pending)
+                    if length == 0:
+                        break
+                    mixed = np.zeros(length, dtype=np.float32)
+                    for i, ratio in enumerate(mix_ratios):
+                        take = pending[i][:length]
+                        mixed[:len(take)] += take * ratio
+                        pending[i] = pending[i][len(take):]
+                    peak = max(peak, float(np.abs(mixed).max()))
+                    out.write(mixed)
             
-            # Initialize or add to mix
-            if mixed is None:
-                mixed = y * ratio
-            else:
-                # Pad shorter track with zeros
-                if len(y) > len(mixed):
-                    mixed = np.pad(mixed, (0, len(y) - len(mixed)))
-                else:
-                    y = np.pad(y, (0, len(mixed) - len(y)))
-                mixed += y * ratio
-        
-        # Normalize
-        mixed = librosa.util.normalize(mixed)
-        
-        # Save mixed track
-        output_path = Path(output_dir) / "mixed_track.wav"
-        sf.write(str(output_path), mixed, sr)
+            # Normalize to the peak, like librosa.util.normalize
+            gain = 1.0 / peak if peak > 0 else 1.0
+            with sf.SoundFile(str(unnormalized_path)) as mixed_file, \
+                    sf.SoundFile(str(output_path), "w", samplerate=sr, channels=1,
+                                 subtype="PCM_16") as out:
+                for block in mixed_file.blocks(blocksize=block_size, dtype="float32"):
+                    out.write(block * gain)
+        finally:
+            for source in sources:
+                source.close()
+            if unnormalized_path.exists():
+                os.remove(unnormalized_path)
         
         return str(output_path)
     
@@ -80,10 +214,9 @@ class TrackMixer:
                 output_dir
             )
             
-            # Analyze tempo and key of mixed track
-            y, sr = librosa.load(mixed_track)
-            tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-            key = self._estimate_key(y, sr)
+            # Analyze tempo and key of mixed track in one cached pass
+            analysis = await run_stage("decode", audio_analyzer.analyze, mixed_track)
+            tempo, key = analysis["tempo"], analysis["key"]
             
             # Generate vocals
             vocals_path = await self.voice_synth.generate_vocals(
@@ -105,18 +238,3 @@ class TrackMixer:
             
         except Exception as e:
             raise Exception(f"Error creating track: {str(e)}")
-    
-    def _estimate_key(self, y: np.ndarray, sr: int) -> str:
-        """Estimate the musical key of an audio track"""
-        # Extract chromagram
-        chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
-        
-        # Average over time
-        chroma_avg = np.mean(chroma, axis=1)
-        
-        # Find the strongest pitch class
-        key_idx = np.argmax(chroma_avg)
-        
-        # Map to musical key (C, C#, D, etc.)
-        keys = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-        return keys[key_idx]
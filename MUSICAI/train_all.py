@@ -1,11 +1,29 @@
 import argparse
 from pathlib import Path
-import shutil
+from services.checkpointing import latest_checkpoint, promote_checkpoint
 from services.model_trainer import GenreModelTrainer
+from services.training_orchestrator import train_genres_parallel
 import torch
 
-def train_all_genres(data_dir: str, output_dir: str, epochs: int = 100):
-    """Train models for all genres"""
+def publish_model(trainer: GenreModelTrainer, genre: str, output_path: Path):
+    """Publish the newest checkpoint's weights of a genre to the output directory"""
+    source = latest_checkpoint(trainer.models_dir / genre)
+    if source is None:
+        raise Exception(f"No checkpoint written for {genre}")
+    target = output_path / genre.lower() / "latest.pt"
+    
+    # Replaced atomically; serving processes may have the old file mapped
+    promote_checkpoint(source, target)
+    print(f"Successfully trained and saved model for {genre} from {source.name}")
+
+def train_all_genres(data_dir: str, output_dir: str, epochs: int = 100, resume: bool = False,
+                     parallel: int = 1, status_path: str = None):
+    """
+    Train models for all genres
+
+    With `parallel` above 1, genres train concurrently in worker processes
+    that share the machine's cores (see training_orchestrator).
+    """
     data_path = Path(data_dir)
     output_path = Path(output_dir)
     
@@ -14,6 +32,23 @@ def train_all_genres(data_dir: str, output_dir: str, epochs: int = 100):
     
     # Train each genre
     genres = ["rock", "electro", "jazz", "hiphop", "lofi"]
+    
+    if parallel > 1:
+        available = [genre for genre in genres if (data_path / genre).exists()]
+        for genre in sorted(set(genres) - set(available), key=genres.index):
+            print(f"No dataset found for {genre}, skipping...")
+        states = train_genres_parallel(str(data_path), available, parallel, status_path,
+                                       epochs=epochs, resume=resume)
+        for genre, state in states.items():
+            if state != "done":
+                print(f"Error training model for {genre}: see {status_path or data_path / 'training_status.json'}")
+                continue
+            try:
+                publish_model(trainer, genre, output_path)
+            except Exception as e:
+                print(f"Error training model for {genre}: {str(e)}")
+        return
+    
     for genre in genres:
         print(f"\nTraining model for {genre}...")
         genre_data = data_path / genre
@@ -24,17 +59,8 @@ def train_all_genres(data_dir: str, output_dir: str, epochs: int = 100):
             
         try:
             # Train the model
-            trainer.train_genre_model(genre, epochs=epochs)
-            
-            # Copy the trained model to the output directory
-            genre_output = output_path / genre.lower()
-            genre_output.mkdir(parents=True, exist_ok=True)
-            
-            source = data_path / "models" / genre / f"checkpoint_epoch_{epochs}.pt"
-            target = genre_output / "latest.pt"
-            
-            shutil.copy2(str(source), str(target))
-            print(f"Successfully trained and saved model for {genre}")
+            trainer.train_genre_model(genre, epochs=epochs, resume=resume)
+            publish_model(trainer, genre, output_path)
             
         except Exception as e:
             print(f"Error training model for {genre}: {str(e)}")
@@ -48,6 +74,12 @@ if __name__ == "__main__":
                       help="Directory to save trained models")
     parser.add_argument("--epochs", type=int, default=100,
                       help="Number of training epochs")
+    parser.add_argument("--resume", action="store_true",
+                      help="Continue each genre from its newest checkpoint")
+    parser.add_argument("--parallel", type=int, default=1,
+                      help="Genres training at once in separate processes")
+    parser.add_argument("--status-file", type=str, default=None,
+                      help="JSON training status file for --parallel (default: <data-dir>/training_status.json)")
     
     args = parser.parse_args()
     
@@ -55,4 +87,5 @@ if __name__ == "__main__":
     if not torch.cuda.is_available():
         print("Warning: CUDA not available, training will be slow!")
     
-    train_all_genres(args.data_dir, args.output_dir, args.epochs)
+    train_all_genres(args.data_dir, args.output_dir, args.epochs, args.resume,
+                     args.parallel, args.status_file)
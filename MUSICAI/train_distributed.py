@@ -0,0 +1,113 @@
+import argparse
+import os
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from services.model_trainer import GenreModelTrainer
+from services.training_orchestrator import available_cores, split_cores
+
+
+def init_process_group(rank: int, world_size: int, master_addr: str = "127.0.0.1",
+                       master_port: int = 29500, backend: str = "gloo",
+                       cores: Optional[List[int]] = None):
+    """
+    Join the training process group
+
+    With `cores`, the process is pinned to them and torch's thread pools
+    are sized to match, so ranks sharing a node don't oversubscribe it.
+    """
+    if cores:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+        torch.set_num_threads(len(cores))
+    dist.init_process_group(backend, init_method=f"tcp://{master_addr}:{master_port}",
+                            rank=rank, world_size=world_size, timeout=timedelta(minutes=30))
+
+
+def _rank_worker(local_rank: int, node_rank: int, nproc_per_node: int, nnodes: int,
+                 master_addr: str, master_port: int, backend: str,
+                 core_slots: List[List[int]], base_dir: str, genre: str, train_kwargs: Dict):
+    rank = node_rank * nproc_per_node + local_rank
+    init_process_group(rank, nnodes * nproc_per_node, master_addr, master_port, backend,
+                       core_slots[local_rank])
+    try:
+        trainer = GenreModelTrainer(base_dir)
+        if torch.cuda.is_available() and backend == "nccl":
+            torch.cuda.set_device(local_rank)
+            trainer.device = torch.device("cuda", local_rank)
+        trainer.train_genre_model(genre, **train_kwargs)
+    finally:
+        dist.destroy_process_group()
+
+
+def train_distributed(base_dir: str, genre: str, nproc_per_node: int = 2, nnodes: int = 1,
+                      node_rank: int = 0, master_addr: str = "127.0.0.1",
+                      master_port: int = 29500, backend: str = "gloo", **train_kwargs):
+    """
+    Train one genre data-parallel over several processes and nodes
+
+    Starts `nproc_per_node` ranks on this node. For several nodes, run the
+    same command on each with its own `node_rank` and the address of node
+    0 as `master_addr`. The node's cores are split evenly between its ranks.
+
+    Args:
+        base_dir: Base directory with datasets/ and models/ (on every node)
+        genre: Genre to train
+        nproc_per_node: Ranks started on this node
+        nnodes: Nodes taking part
+        node_rank: Index of this node
+        master_addr: Address of node 0
+        master_port: Free TCP port on node 0
+        backend: "gloo" for CPUs, "nccl" for one GPU per rank
+        **train_kwargs: Passed to GenreModelTrainer.train_genre_model
+    """
+    core_slots = split_cores(available_cores(), nproc_per_node)
+    if len(core_slots) < nproc_per_node:
+        print(f"Warning: {nproc_per_node} ranks share {len(core_slots)} cores")
+        core_slots = [core_slots[i % len(core_slots)] for i in range(nproc_per_node)]
+    mp.spawn(_rank_worker, nprocs=nproc_per_node, join=True,
+             args=(node_rank, nproc_per_node, nnodes, master_addr, master_port, backend,
+                   core_slots, base_dir, genre, train_kwargs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train one genre model data-parallel over several processes")
+    parser.add_argument("--base-dir", type=str, required=True,
+                      help="Base directory containing datasets and for saving models")
+    parser.add_argument("--genre", type=str, required=True,
+                      help="Genre to train")
+    parser.add_argument("--epochs", type=int, default=100,
+                      help="Number of training epochs")
+    parser.add_argument("--batch-size", type=int, default=None,
+                      help="Batch size per rank (default: the loader config's)")
+    parser.add_argument("--nproc-per-node", type=int, default=2,
+                      help="Ranks started on this node")
+    parser.add_argument("--nnodes", type=int, default=1,
+                      help="Nodes taking part")
+    parser.add_argument("--node-rank", type=int, default=0,
+                      help="Index of this node")
+    parser.add_argument("--master-addr", type=str, default="127.0.0.1",
+                      help="Address of node 0")
+    parser.add_argument("--master-port", type=int, default=29500,
+                      help="Free TCP port on node 0")
+    parser.add_argument("--backend", type=str, default="gloo", choices=["gloo", "nccl"],
+                      help="torch.distributed backend")
+    parser.add_argument("--resume", action="store_true",
+                      help="Continue from the newest checkpoint")
+    parser.add_argument("--attention", type=str, default="full", choices=["full", "local"],
+                      help="Transformer attention: full, or local within fixed windows (linear in length)")
+    parser.add_argument("--attention-window", type=int, default=512,
+                      help="Tokens per window for local attention")
+    parser.add_argument("--downsample", type=int, default=1,
+                      help="Extra strided token reduction before the transformer")
+
+    args = parser.parse_args()
+    train_distributed(args.base_dir, args.genre, args.nproc_per_node, args.nnodes,
+                      args.node_rank, args.master_addr, args.master_port, args.backend,
+                      epochs=args.epochs, batch_size=args.batch_size, resume=args.resume,
+                      model_config={"attention": args.attention, "window_size": args.attention_window,
+                                    "downsample": args.downsample})
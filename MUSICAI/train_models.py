@@ -2,10 +2,20 @@ import argparse
 from pathlib import Path
 import torch
 from services.model_trainer import GenreModelTrainer
+from services.training_orchestrator import train_genres_parallel
 from models.music_model import MusicGenerationModel
 
-def train_genre_models(base_dir: str, genres: list = None, epochs: int = 100):
-    """Train models for each genre"""
+def train_genre_models(base_dir: str, genres: list = None, epochs: int = 100,
+                       bf16: bool = False, compile_model: bool = False,
+                       accumulation_steps: int = 1, resume: bool = False,
+                       parallel: int = 1, status_path: str = None,
+                       model_config: dict = None):
+    """
+    Train models for each genre
+
+    With `parallel` above 1, genres train concurrently in worker processes
+    that share the machine's cores (see training_orchestrator).
+    """
     base_path = Path(base_dir)
     
     # Initialize trainer
@@ -15,6 +25,24 @@ def train_genre_models(base_dir: str, genres: list = None, epochs: int = 100):
     if not genres:
         genres = [d.name for d in (base_path / "datasets").iterdir() if d.is_dir()]
     
+    if parallel > 1:
+        available = []
+        for genre in genres:
+            if (base_path / "datasets" / genre).exists():
+                available.append(genre)
+            else:
+                print(f"Warning: No dataset found for genre '{genre}'")
+        states = train_genres_parallel(base_dir, available, parallel, status_path,
+                                       epochs=epochs, bf16=bf16, compile_model=compile_model,
+                                       accumulation_steps=accumulation_steps, resume=resume,
+                                       model_config=model_config)
+        for genre, state in states.items():
+            if state == "done":
+                print(f"Successfully trained model for {genre}")
+            else:
+                print(f"Error training model for {genre}: see the training status file")
+        return
+    
     for genre in genres:
         print(f"\nTraining model for {genre}...")
         
@@ -26,7 +54,10 @@ def train_genre_models(base_dir: str, genres: list = None, epochs: int = 100):
         
         try:
             # Train model
-            trainer.train_genre_model(genre, epochs=epochs)
+            trainer.train_genre_model(genre, epochs=epochs, bf16=bf16,
+                                      compile_model=compile_model,
+                                      accumulation_steps=accumulation_steps,
+                                      resume=resume, model_config=model_config)
             print(f"Successfully trained model for {genre}")
             
         except Exception as e:
@@ -40,6 +71,28 @@ if __name__ == "__main__":
                       help="Specific genres to train (default: all available)")
     parser.add_argument("--epochs", type=int, default=100,
                       help="Number of training epochs")
+    parser.add_argument("--bf16", action="store_true",
+                      help="Train under bfloat16 autocast")
+    parser.add_argument("--compile", action="store_true",
+                      help="Compile the training step with torch.compile")
+    parser.add_argument("--accumulation-steps", type=int, default=1,
+                      help="Batches per optimizer step (effective batch = batch size x steps)")
+    parser.add_argument("--resume", action="store_true",
+                      help="Continue each genre from its newest checkpoint")
+    parser.add_argument("--attention", type=str, default="full", choices=["full", "local"],
+                      help="Transformer attention: full, or local within fixed windows (linear in length)")
+    parser.add_argument("--attention-window", type=int, default=512,
+                      help="Tokens per window for local attention")
+    parser.add_argument("--downsample", type=int, default=1,
+                      help="Extra strided token reduction before the transformer")
+    parser.add_argument("--parallel", type=int, default=1,
+                      help="Genres training at once in separate processes")
+    parser.add_argument("--status-file", type=str, default=None,
+                      help="JSON training status file for --parallel (default: <base-dir>/training_status.json)")
     
     args = parser.parse_args()
-    train_genre_models(args.base_dir, args.genres, args.epochs)
+    train_genre_models(args.base_dir, args.genres, args.epochs, args.bf16,
+                       args.compile, args.accumulation_steps, args.resume,
+                       args.parallel, args.status_file,
+                       {"attention": args.attention, "window_size": args.attention_window,
+                        "downsample": args.downsample})
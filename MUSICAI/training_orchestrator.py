@@ -0,0 +1,222 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+import traceback
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def available_cores() -> List[int]:
+    """CPU ids this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def split_cores(cores: List[int], slots: int) -> List[List[int]]:
+    """Split cores into `slots` contiguous groups whose sizes differ by at most one"""
+    slots = max(1, min(slots, len(cores)))
+    size, extra = divmod(len(cores), slots)
+    groups, start = [], 0
+    for i in range(slots):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(cores[start:end])
+        start = end
+    return groups
+
+
+class _QueueStream:
+    """File-like object forwarding complete lines to the orchestrator"""
+
+    def __init__(self, events, genre: str):
+        self.events = events
+        self.genre = genre
+        self._buffer = ""
+
+    def write(self, text: str) -> int:
+        self._buffer += text
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            if line.strip():
+                self.events.put((self.genre, "log", line))
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def _train_worker(genre: str, base_dir: str, cores: List[int], train_kwargs: Dict, events):
+    """Train one genre in a worker process pinned to `cores`"""
+    sys.stdout = sys.stderr = _QueueStream(events, genre)
+    try:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+
+        # Imported after pinning so torch sizes its pools for this process only
+        import torch
+        from services.model_trainer import GenreModelTrainer
+
+        torch.set_num_threads(len(cores))
+        torch.set_num_interop_threads(1)
+
+        def progress(stage: str, current: Optional[int], total: Optional[int]):
+            events.put((genre, "progress", {"stage": stage, "current": current, "total": total}))
+
+        trainer = GenreModelTrainer(base_dir)
+        trainer.train_genre_model(genre, progress=progress, **train_kwargs)
+        events.put((genre, "done", None))
+    except BaseException:
+        events.put((genre, "failed", traceback.format_exc()))
+    finally:
+        sys.stdout.flush()
+
+
+class TrainingOrchestrator:
+    def __init__(self, base_dir: str, genres: List[str], max_parallel: Optional[int] = None,
+                 status_path: Optional[str] = None, **train_kwargs):
+        """
+        Train several genres at once, one pinned worker process per genre
+
+        The available cores are split evenly between `max_parallel` slots.
+        Each worker is pinned to its slot's cores with CPU affinity and sets
+        torch's thread count to match, so concurrent trainings don't
+        oversubscribe the machine. When a genre finishes, the next pending
+        genre takes over its cores. Worker output is printed to this
+        console prefixed by genre, and the state of every genre is kept in
+        a JSON status file. A failed or crashed genre is recorded and the
+        others keep training.
+
+        Args:
+            base_dir: Base directory with datasets/ and models/
+            genres: Genres to train
+            max_parallel: Concurrent genres (default: one per genre, capped by cores)
+            status_path: JSON status file (default: <base_dir>/training_status.json)
+            **train_kwargs: Passed to GenreModelTrainer.train_genre_model
+        """
+        self.base_dir = base_dir
+        self.genres = list(genres)
+        self.cores = available_cores()
+        self.max_parallel = max(1, min(max_parallel or len(self.genres), len(self.genres), len(self.cores)))
+        self.status_path = Path(status_path or Path(base_dir) / "training_status.json")
+        self.train_kwargs = train_kwargs
+        self.status = {
+            "started_at": time.time(),
+            "updated_at": time.time(),
+            "genres": {genre: {"state": "pending"} for genre in self.genres},
+        }
+
+    def run(self) -> Dict[str, str]:
+        """
+        Train all genres and wait for them
+
+        Returns:
+            Final state ("done" or "failed") per genre
+        """
+        ctx = mp.get_context("spawn")
+        events = ctx.Queue()
+        free_slots = split_cores(self.cores, self.max_parallel)
+        pending = list(self.genres)
+        running: Dict[str, tuple] = {}
+
+        try:
+            while pending or running:
+                while pending and free_slots:
+                    genre, cores = pending.pop(0), free_slots.pop(0)
+                    process = ctx.Process(target=_train_worker, name=f"train-{genre}",
+                                          args=(genre, self.base_dir, cores, self.train_kwargs, events))
+                    process.start()
+                    running[genre] = (process, cores)
+                    self._update(genre, state="running", pid=process.pid, cores=cores,
+                                 started_at=time.time())
+                    print(f"[{genre}] started on cores {cores[0]}-{cores[-1]}")
+
+                self._drain(events, timeout=1.0)
+
+                for genre, (process, cores) in list(running.items()):
+                    if process.is_alive() and self.status["genres"][genre]["state"] == "running":
+                        continue
+                    process.join()
+                    # A worker's queued messages are flushed before it exits
+                    self._drain(events)
+                    if self.status["genres"][genre]["state"] == "running":
+                        # Died without reporting, e.g. killed for running out of memory
+                        self._update(genre, state="failed", finished_at=time.time(),
+                                     error=f"Worker exited with code {process.exitcode}")
+                        print(f"[{genre}] failed: worker exited with code {process.exitcode}")
+                    del running[genre]
+                    free_slots.append(cores)
+        except KeyboardInterrupt:
+            for genre, (process, _) in running.items():
+                process.terminate()
+                process.join()
+                self._update(genre, state="failed", finished_at=time.time(), error="Interrupted")
+            raise
+
+        return {genre: info["state"] for genre, info in self.status["genres"].items()}
+
+    def _drain(self, events, timeout: Optional[float] = None):
+        """Handle every queued worker message, waiting up to `timeout` for the first"""
+        try:
+            message = events.get(timeout=timeout) if timeout else events.get_nowait()
+            while True:
+                self._handle(*message)
+                message = events.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _handle(self, genre: str, kind: str, payload):
+        if kind == "log":
+            print(f"[{genre}] {payload}")
+            self.status["genres"][genre]["last_log"] = payload
+        elif kind == "progress":
+            self._update(genre, epoch=payload["current"], epochs=payload["total"])
+        elif kind == "done":
+            self._update(genre, state="done", finished_at=time.time())
+            print(f"[{genre}] finished")
+        elif kind == "failed":
+            self._update(genre, state="failed", finished_at=time.time(), error=payload)
+            print(f"[{genre}] failed:\n{payload}")
+
+    def _update(self, genre: str, **fields):
+        self.status["genres"][genre].update(fields)
+        self.status["updated_at"] = time.time()
+        self.status_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.status_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.status, f, indent=1)
+        os.replace(tmp_path, self.status_path)
+
+
+def train_genres_parallel(base_dir: str, genres: List[str], max_parallel: Optional[int] = None,
+                          status_path: Optional[str] = None, **train_kwargs) -> Dict[str, str]:
+    """Train genres in parallel worker processes; returns the final state per genre"""
+    return TrainingOrchestrator(base_dir, genres, max_parallel, status_path, **train_kwargs).run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train genre models in parallel processes")
+    parser.add_argument("--base-dir", type=str, required=True,
+                      help="Base directory containing datasets and for saving models")
+    parser.add_argument("--genres", type=str, nargs="+",
+                      default=["rock", "electro", "jazz", "hiphop", "lofi"],
+                      help="Genres to train")
+    parser.add_argument("--epochs", type=int, default=100,
+                      help="Number of training epochs")
+    parser.add_argument("--parallel", type=int, default=None,
+                      help="Genres training at once (default: all, capped by cores)")
+    parser.add_argument("--status-file", type=str, default=None,
+                      help="JSON status file (default: <base-dir>/training_status.json)")
+    parser.add_argument("--resume", action="store_true",
+                      help="Continue each genre from its newest checkpoint")
+
+    args = parser.parse_args()
+    states = train_genres_parallel(args.base_dir, args.genres, args.parallel, args.status_file,
+                                   epochs=args.epochs, resume=args.resume)
+    failed = [genre for genre, state in states.items() if state != "done"]
+    if failed:
+        print(f"Failed genres: {', '.join(failed)}")
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from services.executors import io_executor
+
+
+class TTLCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 600.0,
+                 stale_ttl: float = 3600.0, persist_path: Optional[str] = None,
+                 table: str = "cache"):
+        """
+        Thread-safe LRU cache with expiry and stale-while-revalidate
+
+        Entries younger than `ttl` are fresh. Entries between `ttl` and
+        `stale_ttl` are returned immediately while a single background
+        refresh replaces them. Older entries count as misses. Values must be
+        JSON-serializable when persistence is enabled.
+
+        Args:
+            max_entries: Maximum number of entries kept in memory
+            ttl: Seconds an entry stays fresh
+            stale_ttl: Seconds an entry may still be served while refreshing
+            persist_path: Optional SQLite file that survives restarts
+            table: Table name inside the SQLite file
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.table = table
+
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Any] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if persist_path:
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            self._load()
+
+    def get(self, key: str) -> Optional[Tuple[Any, bool]]:
+        """Return (value, fresh) for a servable entry, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            age = time.time() - stored_at
+            if age > self.stale_ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value, age <= self.ttl
+
+    def set(self, key: str, value: Any):
+        stored_at = time.time()
+        with self._lock:
+            self._entries[key] = (value, stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                if self._db is not None:
+                    self._db.execute(f"DELETE FROM {self.table} WHERE key = ?", (evicted,))
+            if self._db is not None:
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), stored_at)
+                )
+                self._db.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return a cached value, fetching it on a miss
+
+        Concurrent misses for the same key share one fetch; stale entries
+        are returned at once and refreshed in the background.
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            value, fresh = entry
+            if not fresh and key not in self._inflight:
+                refresh = asyncio.ensure_future(self._fetch(key, fetch))
+                refresh.add_done_callback(lambda f: self._log_refresh_error(key, f))
+                self._inflight[key] = refresh
+            return value
+
+        if key not in self._inflight:
+            self._inflight[key] = asyncio.ensure_future(self._fetch(key, fetch))
+        return await asyncio.shield(self._inflight[key])
+
+    def get_or_fetch_sync(self, key: str, fetch: Callable[[], Any]) -> Any:
+        """Blocking variant of get_or_fetch; stale entries refresh on the I/O pool"""
+        entry = self._lookup(key)
+        if entry is not None:
+            value, fresh = entry
+            if not fresh:
+                with self._lock:
+                    refresh = key not in self._inflight
+                    if refresh:
+                        self._inflight[key] = True
+                if refresh:
+                    io_executor.submit(self._refresh_sync, key, fetch)
+            return value
+
+        value = fetch()
+        self.set(key, value)
+        return value
+
+    def _lookup(self, key: str) -> Optional[Tuple[Any, bool]]:
+        entry = self.get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            elif entry[1]:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+        return entry
+
+    async def _fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch()
+            self.set(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def _refresh_sync(self, key: str, fetch: Callable[[], Any]):
+        try:
+            self.set(key, fetch())
+        except Exception as e:
+            # Keep serving the stale entry
+            print(f"Cache refresh error for {key}: {str(e)}")
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    @staticmethod
+    def _log_refresh_error(key: str, future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Cache refresh error for {key}: {str(future.exception())}")
+
+    def _load(self):
+        cutoff = time.time() - self.stale_ttl
+        rows = self._db.execute(
+            f"SELECT key, value, stored_at FROM {self.table} WHERE stored_at >= ? "
+            "ORDER BY stored_at DESC LIMIT ?",
+            (cutoff, self.max_entries)
+        ).fetchall()
+        for key, value, stored_at in reversed(rows):
+            self._entries[key] = (json.loads(value), stored_at)
+        self._db.execute(f"DELETE FROM {self.table} WHERE stored_at < ?", (cutoff,))
+        self._db.commit()
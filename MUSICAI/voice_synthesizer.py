@@ -3,7 +3,7 @@ from pathlib import Path
 import numpy as np
 from gtts import gTTS
 import pyttsx3
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 class VoiceSynthesizer:
     def __init__(self):
@@ -24,7 +24,8 @@ class VoiceSynthesizer:
         return ['male_1', 'male_2', 'female_1', 'female_2', 'gtts']
     
     async def generate_vocals(self, lyrics: str, voice_style: str, output_path: str, 
-                            tempo: float = 120.0, key: str = "C") -> str:
+                            tempo: float = 120.0, key: str = "C",
+                            output_name: Optional[str] = None) -> str:
         """
         Generate vocals from lyrics using specified voice style
         
@@ -34,8 +35,9 @@ class VoiceSynthesizer:
             output_path: Path to save the generated audio
             tempo: Tempo in BPM (only affects pyttsx3 voices)
             key: Musical key (not used in this implementation)
+            output_name: File name within output_path (default: vocals_<style>.wav)
         """
-        output_file = Path(output_path) / f"vocals_{voice_style}.wav"
+        output_file = Path(output_path) / (output_name or f"vocals_{voice_style}.wav")
         output_file.parent.mkdir(parents=True, exist_ok=True)
         
         try:
@@ -1,82 +1,217 @@
+import asyncio
+import queue
+import threading
 import yt_dlp
+import numpy as np
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+from services.executors import run_stage
+from services.pcm_cache import pcm_cache
+from services.ttl_cache import TTLCache
+
+class YoutubeDLPool:
+    def __init__(self, opts: Dict, size: int):
+        """
+        Pool of reusable extractor instances sharing one set of options
+
+        A YoutubeDL instance is not safe for concurrent use, so each one is
+        lent to a single thread at a time. Instances are created lazily.
+
+        Args:
+            opts: Options for every instance
+            size: Maximum number of instances
+        """
+        self.opts = opts
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self):
+        """Borrow an extractor, blocking while all `size` instances are in use"""
+        with self._lock:
+            create = self._idle.empty() and self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                ydl = yt_dlp.YoutubeDL(self.opts)
+            except BaseException:
+                # Give the slot back so a failed construction does not shrink the pool
+                with self._lock:
+                    self._created -= 1
+                raise
+        else:
+            ydl = self._idle.get()
+        try:
+            yield ydl
+        finally:
+            self._idle.put(ydl)
 
 class YouTubeService:
-    def __init__(self):
+    def __init__(self, transcode: bool = False, extractor_pool_size: int = 4,
+                 cache_ttl: float = 600.0, cache_stale_ttl: float = 6 * 3600.0,
+                 cache_max_entries: int = 4096, cache_path: Optional[str] = None):
+        """
+        Args:
+            transcode: Re-encode downloads to 192k MP3 instead of keeping the
+                native bestaudio stream (opus/m4a)
+            extractor_pool_size: Reusable extractors for search and video info
+            cache_ttl: Seconds search results and video info stay fresh
+            cache_stale_ttl: Seconds expired entries are still served while
+                they refresh in the background
+            cache_max_entries: Entries kept per cache
+            cache_path: Optional SQLite file persisting both caches
+        """
         self.ydl_opts = {
             'format': 'bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }],
             'quiet': True,
             'no_warnings': True
         }
+        if transcode:
+            self.ydl_opts['postprocessors'] = [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': '192',
+            }]
 
-    async def search_videos(self, query: str, max_results: int = 5) -> List[Dict]:
-        """Search for videos on YouTube"""
         search_opts = {
             **self.ydl_opts,
             'extract_flat': True,
             'force_generic_extractor': True,
             'default_search': 'ytsearch'
         }
+        self._search_pool = YoutubeDLPool(search_opts, extractor_pool_size)
+        self._info_pool = YoutubeDLPool(self.ydl_opts, extractor_pool_size)
 
-        with yt_dlp.YoutubeDL(search_opts) as ydl:
-            try:
-                # Perform the search
-                results = ydl.extract_info(f'ytsearch{max_results}:{query}', download=False)
-                
-                # Process results
-                videos = []
-                if 'entries' in results:
-                    for entry in results['entries']:
-                        if entry:
-                            videos.append({
-                                'id': entry['id'],
-                                'title': entry['title'],
-                                'thumbnail': entry.get('thumbnail', ''),
-                                'channel': entry.get('uploader', 'Unknown')
-                            })
-                return videos
-            except Exception as e:
-                print(f"Search error: {str(e)}")
-                return []
+        self.search_cache = TTLCache(cache_max_entries, cache_ttl, cache_stale_ttl,
+                                     cache_path, table="youtube_search")
+        self.info_cache = TTLCache(cache_max_entries, cache_ttl, cache_stale_ttl,
+                                   cache_path, table="youtube_info")
+
+        # video_id -> in-flight download shared by concurrent callers
+        self._downloads: Dict[str, asyncio.Future] = {}
+
+    async def search_videos(self, query: str, max_results: int = 5) -> List[Dict]:
+        """Search for videos on YouTube"""
+        # Identical searches share a cache entry regardless of case and spacing
+        key = f"{max_results}:{' '.join(query.lower().split())}"
+        try:
+            return await self.search_cache.get_or_fetch(
+                key, lambda: run_stage("search", self._search_videos, query, max_results)
+            )
+        except Exception as e:
+            print(f"Search error: {str(e)}")
+            return []
+
+    def _search_videos(self, query: str, max_results: int) -> List[Dict]:
+        """Blocking implementation of search_videos"""
+        with self._search_pool.acquire() as ydl:
+            # Perform the search
+            results = ydl.extract_info(f'ytsearch{max_results}:{query}', download=False)
+
+            # Process results
+            videos = []
+            if 'entries' in results:
+                for entry in results['entries']:
+                    if entry:
+                        videos.append({
+                            'id': entry['id'],
+                            'title': entry['title'],
+                            'thumbnail': entry.get('thumbnail', ''),
+                            'channel': entry.get('uploader', 'Unknown')
+                        })
+            return videos
+
+    def cache_stats(self) -> Dict:
+        """Hit/miss counters of the search and video info caches"""
+        return {
+            "search": self.search_cache.stats(),
+            "video_info": self.info_cache.stats()
+        }
 
     async def download_audio(self, video_id: str, output_path: str) -> str:
-        """Download audio from a YouTube video"""
+        """
+        Download audio from a YouTube video
+
+        The file keeps the extension of the downloaded stream, so the
+        returned path may differ from `output_path` in its suffix.
+        Concurrent calls for the same video share one download.
+
+        Args:
+            video_id: YouTube video id
+            output_path: Target path; its suffix is replaced by the stream's
+
+        Returns:
+            Path of the downloaded file
+        """
+        download = self._downloads.get(video_id)
+        if download is None:
+            download = asyncio.ensure_future(
+                run_stage("download", self._download_audio, video_id, output_path)
+            )
+            self._downloads[video_id] = download
+            download.add_done_callback(lambda _: self._downloads.pop(video_id, None))
+
+        # A cancelled waiter must not cancel the download for everyone else
+        return await asyncio.shield(download)
+
+    async def download_pcm(self, video_id: str, output_path: str,
+                           sr: int = 44100) -> Tuple[np.ndarray, int]:
+        """
+        Download audio and decode it straight to mono float32 PCM
+
+        Args:
+            video_id: YouTube video id
+            output_path: Target path for the downloaded stream
+            sr: Output sample rate
+
+        Returns:
+            (samples, sample rate), read through the shared decode cache
+        """
+        path = await self.download_audio(video_id, output_path)
+        return await run_stage("decode", pcm_cache.load, path, sr)
+
+    def _download_audio(self, video_id: str, output_path: str) -> str:
+        """Blocking implementation of download_audio"""
         # Ensure output directory exists
         Path(output_path).parent.mkdir(parents=True, exist_ok=True)
         
-        # Set output template
+        # Set output template; the stream decides the extension
         download_opts = {
             **self.ydl_opts,
-            'outtmpl': output_path
+            'outtmpl': str(Path(output_path).with_suffix('')) + '.%(ext)s'
         }
 
         try:
             with yt_dlp.YoutubeDL(download_opts) as ydl:
                 # Download the video
                 url = f'https://www.youtube.com/watch?v={video_id}'
-                ydl.download([url])
-                return output_path
+                info = ydl.extract_info(url, download=True)
+                downloads = info.get('requested_downloads') or []
+                if downloads and downloads[0].get('filepath'):
+                    return downloads[0]['filepath']
+                return ydl.prepare_filename(info)
         except Exception as e:
             raise Exception(f"Download error: {str(e)}")
 
     def get_video_info(self, video_id: str) -> Dict:
         """Get information about a specific video"""
-        with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-            try:
-                url = f'https://www.youtube.com/watch?v={video_id}'
-                info = ydl.extract_info(url, download=False)
-                return {
-                    'id': info['id'],
-                    'title': info['title'],
-                    'thumbnail': info.get('thumbnail', ''),
-                    'channel': info.get('uploader', 'Unknown'),
-                    'duration': info.get('duration', 0)
-                }
-            except Exception as e:
-                raise Exception(f"Error getting video info: {str(e)}")
+        try:
+            return self.info_cache.get_or_fetch_sync(video_id, lambda: self._get_video_info(video_id))
+        except Exception as e:
+            raise Exception(f"Error getting video info: {str(e)}")
+
+    def _get_video_info(self, video_id: str) -> Dict:
+        with self._info_pool.acquire() as ydl:
+            url = f'https://www.youtube.com/watch?v={video_id}'
+            info = ydl.extract_info(url, download=False)
+            return {
+                'id': info['id'],
+                'title': info['title'],
+                'thumbnail': info.get('thumbnail', ''),
+                'channel': info.get('uploader', 'Unknown'),
+                'duration': info.get('duration', 0)
+            }